@@ -1,63 +1,905 @@
 from flask_cors import CORS
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, has_app_context, Response, stream_with_context
 import whisper
+import torch
 import os
 import spacy
 import uuid
 import requests  # 用于与 PHP 后端通信
-from pydub import AudioSegment
+import io
+import wave
+import subprocess
+import tempfile
+import numpy as np
 from flask_sqlalchemy import SQLAlchemy
 import langdetect
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import dateparser
 from dateparser.search import search_dates
 import re
 import pytz
+import functools
+import json
+import logging
+import bisect
+from contextlib import contextmanager
+import base64
+import hmac
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import time
+import threading
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+# ---------------- 日志 ----------------
+# LOG_LEVEL：DEBUG / INFO（默认）/ WARNING / ERROR，OFF 表示完全关闭。
+# 识别文本、分类概率等大块内容只在 DEBUG 级别输出；级别关闭时 log_event 直接返回，不做任何格式化。
+# LOG_FORMAT=json 时每行一个 JSON 对象，默认为 “事件名 key=value ...” 文本。
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+
+logger = logging.getLogger("whisper_app")
+
+
+class _KeyValueFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(
+                f"{key}={json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (str, dict, list)) else value}"
+                for key, value in fields.items()
+            )
+        return line
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"ts": self.formatTime(record), "level": record.levelname, "event": record.getMessage(),
+                 **getattr(record, "fields", {})}
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _configure_logging():
+    logger.propagate = False
+    if LOG_LEVEL == "OFF":
+        logger.setLevel(logging.CRITICAL + 1)
+        return
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        handler.setFormatter(_JsonFormatter())
+    else:
+        handler.setFormatter(_KeyValueFormatter("%(asctime)s %(levelname)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+
+
+_configure_logging()
+
+
+def log_event(level, event, exc_info=False, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+
+# ---------------- 分阶段耗时 / Prometheus 指标 ----------------
+# 每个请求在 g.trace 中记录各阶段耗时（同时写入响应头 Server-Timing），并累计到直方图，
+# 由 GET /metrics 以 Prometheus 文本格式输出。指标按进程统计：多个 gunicorn worker 时
+# 每次抓取只看到其中一个 worker，需要全量数据时用 WEB_CONCURRENCY=1 或分别抓取各 worker。
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}  # 标签值 ➜ [各桶计数（最后一个为 +Inf）, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in series:
+            label_str = ",".join(f'{k}="{v}"' for k, v in zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_str},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {total}")
+            lines.append(f"{self.name}_count{{{label_str}}} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("whisper_app_stage_seconds", "Duration of each request stage.", ("endpoint", "stage"))
+REQUEST_SECONDS = Histogram("whisper_app_request_seconds", "End-to-end request duration.",
+                            ("endpoint", "method", "status"))
+
+
+def record_stage(stage, seconds):
+    # 请求内记到 g.trace；异步任务回调在 app_context 中执行，同样有 g
+    if has_app_context():
+        endpoint = g.get("trace_endpoint", "unknown")
+        trace = g.get("trace")
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + seconds
+    else:
+        endpoint = "unknown"
+    STAGE_SECONDS.observe(seconds, endpoint, stage)
 
 
-def download_models():
+@contextmanager
+def trace_stage(stage):
+    started = time.perf_counter()
     try:
-        spacy.load("zh_core_web_sm")
-    except:
-        os.system("python -m spacy download zh_core_web_sm")
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
 
+def start_trace(endpoint):
+    g.trace_endpoint = endpoint
+    g.trace = {}
+    g.trace_started = time.perf_counter()
+
+
+def trace_summary():
+    return {stage: round(seconds * 1000, 2) for stage, seconds in g.get("trace", {}).items()}
+
+
+# ---------------- Whisper 推理后端 ----------------
+# WHISPER_BACKEND 选择实现，对外接口相同（transcribe / decode_batch）：
+#   torch（默认）     openai-whisper 原版 PyTorch，fp32
+#   torch-int8        同一模型，线性层做 PyTorch 动态 int8 量化（仅 CPU，无额外依赖）
+#   ctranslate2       faster-whisper（CTranslate2）int8 推理，需要另外 pip install faster-whisper
+# WHISPER_THREADS：推理使用的 intra-op 线程数；默认按 CPU 核数平分给 gunicorn 的各个 worker
+# （WEB_CONCURRENCY），避免多个 worker 各自开满线程互相抢占。
+WHISPER_MODEL_NAME = os.environ.get("WHISPER_MODEL", "tiny")
+WHISPER_BACKEND = os.environ.get("WHISPER_BACKEND", "torch")
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+WHISPER_THREADS = int(os.environ.get("WHISPER_THREADS", 0)) or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+
+
+class TorchWhisperBackend:
+    name = "torch"
+
+    def __init__(self, model_name, threads=WHISPER_THREADS):
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # 已经有并行任务跑过时不能再设置
+        self.model = self._prepare(whisper.load_model(model_name, device="cpu"))
+
+    def _prepare(self, model):
+        return model
+
+    def transcribe(self, audio, **options):
+        # 返回 {"text", "segments": [{"start", "end", "text"}, ...], ...}
+        options.setdefault("fp16", False)
+        return self.model.transcribe(audio, **options)
+
+    def decode_batch(self, audios, language=None, initial_prompt=None, **options):
+        # 每段 ≤30 秒，一次前向解码整批；只用 temperature=0，不做回退
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels) for audio in audios
+        ]).to(self.model.device)
+        results = whisper.decode(self.model, mels,
+                                 whisper.DecodingOptions(language=language, prompt=initial_prompt, fp16=False))
+        return [r.text for r in results]
+
+
+class Int8WhisperBackend(TorchWhisperBackend):
+    name = "torch-int8"
+
+    def _prepare(self, model):
+        # whisper.model.Linear 是 nn.Linear 的子类，quantize_dynamic 只按精确类型匹配，先换成 nn.Linear
+        for module in list(model.modules()):
+            for child_name, child in module.named_children():
+                if type(child) is whisper.model.Linear:
+                    linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                    linear.load_state_dict(child.state_dict())
+                    setattr(module, child_name, linear)
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class CTranslate2WhisperBackend:
+    name = "ctranslate2"
+
+    def __init__(self, model_name, threads=WHISPER_THREADS):
+        from faster_whisper import WhisperModel  # 可选依赖，只在选用该后端时导入
+
+        self.model = WhisperModel(model_name, device="cpu", compute_type="int8", cpu_threads=threads)
+
+    def transcribe(self, audio, initial_prompt=None, condition_on_previous_text=True, **options):
+        segments, info = self.model.transcribe(audio, initial_prompt=initial_prompt,
+                                               condition_on_previous_text=condition_on_previous_text,
+                                               beam_size=options.pop("beam_size", 5), **options)
+        segments = [{"start": seg.start, "end": seg.end, "text": seg.text} for seg in segments]
+        return {"text": "".join(seg["text"] for seg in segments), "segments": segments,
+                "language": info.language}
+
+    def decode_batch(self, audios, **options):
+        return [self.transcribe(audio, **options)["text"] for audio in audios]
+
+
+WHISPER_BACKENDS = {
+    "torch": TorchWhisperBackend,
+    "torch-int8": Int8WhisperBackend,
+    "ctranslate2": CTranslate2WhisperBackend,
+}
+
+
+def load_whisper_backend(backend=WHISPER_BACKEND, model_name=WHISPER_MODEL_NAME, threads=WHISPER_THREADS):
+    if backend not in WHISPER_BACKENDS:
+        raise ValueError(f"Unknown WHISPER_BACKEND {backend!r}, expected one of {sorted(WHISPER_BACKENDS)}")
+    _startup_report["whisper"] = {"backend": backend, "model": model_name, "threads": threads}
+    return WHISPER_BACKENDS[backend](model_name, threads)
+
+
+# ---------------- CPU 密集阶段限流 ----------------
+# gunicorn 使用 gthread worker（见 gunicorn.conf.py）：每个进程持有一份模型，用多个线程接请求，
+# 等 PHP 登录、等 SQLite 锁这类 I/O 只占一个线程，不再占住整个带模型的进程。
+# Whisper / spaCy / dateparser 这些 CPU 阶段则通过 cpu_stage() 限制同时运行的线程数（CPU_SLOTS），
+# 多出来的请求排队等待，等待时间记为 cpu_wait 阶段。同一线程内嵌套的 cpu_stage 只占一个名额。
+# 取舍：一次 Whisper 解码只占一个名额，却会用满 WHISPER_THREADS 个 intra-op 线程。CPU_SLOTS 默认
+# 为 WHISPER_THREADS - 1，解码进行时还能并行跑 WHISPER_THREADS - 2 个轻阶段（各约一个核），
+# 比等于 WHISPER_THREADS 时少超订一个核，轻请求又不必整体排在解码后面；
+# CPU_SLOTS=1 则完全不超订，代价是轻阶段要等当前解码结束。
+CPU_SLOTS = int(os.environ.get("CPU_SLOTS", 0)) or max(1, WHISPER_THREADS - 1)
+
+
+class CpuLimiter:
+    def __init__(self, slots):
+        self.slots = slots
+        self._semaphore = threading.BoundedSemaphore(slots)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"acquired": 0, "waiting": 0, "in_use": 0, "wait_seconds": 0.0}
+
+    @contextmanager
+    def slot(self):
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                yield 0.0
+            finally:
+                self._local.depth = depth
+            return
+
+        with self._lock:
+            self.stats["waiting"] += 1
+        started = time.perf_counter()
+        self._semaphore.acquire()
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.stats["waiting"] -= 1
+            self.stats["in_use"] += 1
+            self.stats["acquired"] += 1
+            self.stats["wait_seconds"] += waited
+        self._local.depth = 1
+        try:
+            yield waited
+        finally:
+            self._local.depth = 0
+            with self._lock:
+                self.stats["in_use"] -= 1
+            self._semaphore.release()
+
+    def info(self):
+        with self._lock:
+            return {"slots": self.slots, **self.stats, "wait_seconds": round(self.stats["wait_seconds"], 3)}
+
+
+cpu_limiter = CpuLimiter(CPU_SLOTS)
+
+
+@contextmanager
+def cpu_stage(stage):
+    with cpu_limiter.slot() as waited:
+        if waited:
+            record_stage("cpu_wait", waited)
+        with trace_stage(stage):
+            yield
+
+
+# ---------------- 模型注册表 ----------------
+# 请求路径只用到 Whisper 和两个 textcat 模型（*_core_web_sm 从未使用，不再加载/下载）。
+# MODEL_LOADING=eager（默认）：导入时加载全部模型；配合 gunicorn preload（见 gunicorn.conf.py）
+#   在 master 进程中加载一次，fork 后各 worker 以写时复制方式共享权重。
+# MODEL_LOADING=lazy：首次使用时才加载，适合单进程开发。
+MODEL_LOADING = os.environ.get("MODEL_LOADING", "eager")
+
+_model_loaders = {
+    "whisper": lambda: load_whisper_backend(),
+    "nlp_zh": lambda: spacy.load("models/zh_text_categorizer_model"),
+    "nlp_en": lambda: spacy.load("models/en_text_categorizer_model"),
+}
+_models = {}
+_models_lock = threading.RLock()  # 加载器内部可能再调用 get_model
+_startup_report = {"pid": os.getpid(), "mode": MODEL_LOADING, "models": {}}
+
+
+def memory_usage_mb():
+    # RSS 以及与其他进程共享的部分（Linux 下读取 smaps_rollup）
+    usage = {}
     try:
-        spacy.load("en_core_web_sm")
-    except:
-        os.system("python -m spacy download en_core_web_sm")
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    usage[key.lower()] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+        usage["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {k: round(v, 1) for k, v in usage.items()}
+
+
+def get_model(name):
+    model = _models.get(name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                started = time.perf_counter()
+                model = _model_loaders[name]()
+                _models[name] = model
+                _startup_report["models"][name] = {
+                    "load_seconds": round(time.perf_counter() - started, 3),
+                    "rss_mb_after": memory_usage_mb().get("rss"),
+                }
+                log_event(logging.INFO, "model_loaded", model=name,
+                          seconds=_startup_report["models"][name]["load_seconds"])
+    return model
+
 
-download_models()
+def get_nlp(language):
+    return get_model("nlp_zh" if language == "zh" else "nlp_en")
 
-nlp_zh = spacy.load("models/zh_text_categorizer_model")
-nlp_en = spacy.load("models/en_text_categorizer_model")
 
+def load_all_models():
+    started = time.perf_counter()
+    for name in _model_loaders:
+        get_model(name)
+    _startup_report["load_all_seconds"] = round(time.perf_counter() - started, 3)
 
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///memo.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", 'sqlite:///memo.db')
+# 每个 worker 的连接池；内存 SQLite 用单连接池，不接受这些参数
+if app.config['SQLALCHEMY_DATABASE_URI'] not in ("sqlite://", "sqlite:///:memory:"):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+    }
 db = SQLAlchemy(app)
 CORS(app)
 
-# Load Whisper model
-model = whisper.load_model("tiny")
+# ---------------- SQLite 连接参数 ----------------
+# 多个 gunicorn worker 同时写同一个库：WAL 下读写互不阻塞，写事务之间靠 busy_timeout 排队等待，
+# 而不是立即报 "database is locked"；synchronous=NORMAL 在 WAL 下只在检查点时 fsync，掉电最多丢最近几个事务。
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 10000))
+SQLITE_CACHE_MB = int(os.environ.get("SQLITE_CACHE_MB", 16))
+
+
+def _configure_sqlite_connection(dbapi_conn, connection_record):
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    for pragma in (f"journal_mode={SQLITE_JOURNAL_MODE}", f"synchronous={SQLITE_SYNCHRONOUS}",
+                   f"busy_timeout={SQLITE_BUSY_TIMEOUT_MS}", f"cache_size={-SQLITE_CACHE_MB * 1024}",
+                   "temp_store=MEMORY"):
+        dbapi_conn.execute(f"PRAGMA {pragma}")
+
+
+@app.before_request
+def _begin_request_trace():
+    start_trace(request.endpoint or "unknown")
+
+
+@app.after_request
+def _finish_request_trace(response):
+    started = g.get("trace_started")
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    REQUEST_SECONDS.observe(elapsed, g.trace_endpoint, request.method, str(response.status_code))
+    stages = trace_summary()
+    if stages:
+        response.headers["Server-Timing"] = ", ".join(f"{stage};dur={ms}" for stage, ms in stages.items())
+    log_event(logging.INFO, "request", endpoint=g.trace_endpoint, method=request.method,
+              status=response.status_code, duration_ms=round(elapsed * 1000, 2),
+              **({"stages": stages} if stages else {}))
+    return response
+
 
 class Memo(db.Model):
     __tablename__ = 'memo'
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String(500), nullable=False)
     category = db.Column(db.String(100), nullable=False)
-    timestamp = db.Column(db.String(100), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
     userID = db.Column(db.Integer, nullable=True)
+    # 最后修改时间，供客户端增量同步（since）使用
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    # 按用户 + 时间范围查询 / 排序走 (userID, timestamp)；不分用户的按日期查询走 timestamp
+    __table_args__ = (
+        db.Index("ix_memo_user_timestamp", "userID", "timestamp"),
+        db.Index("ix_memo_timestamp", "timestamp"),
+        db.Index("ix_memo_user_updated", "userID", "updated_at"),
+    )
+
+
+# 客户端和旧数据里的时间有多种写法（只有日期 / 日期+时间 / ISO），统一解析成 datetime
+# ISO 写法自己解析，不依赖 datetime.fromisoformat：3.10（runtime.txt）不认 "Z" 后缀和 3 / 6 位以外的小数秒，
+# 3.11 起又接受更多写法，同一输入在不同 Python 上结果不同。
+# 带时区（Z / ±HH:MM / ±HHMM，如 JS toISOString() 的输出）的换算成服务器本地时间后去掉时区，与其他无时区的时间一致。
+_ISO_TIMESTAMP_RE = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,9}))?)?)?"
+    r"\s*(Z|[+-]\d{2}(?::?\d{2})?)?",
+    re.IGNORECASE,
+)
+MEMO_TIME_FORMATS = ["%Y/%m/%d %H:%M:%S", "%Y/%m/%d"]
+
+
+def _parse_iso_timestamp(value):
+    match = _ISO_TIMESTAMP_RE.fullmatch(value)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    try:
+        dt = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0),
+                      int((fraction or "0")[:6].ljust(6, "0")))
+    except ValueError:
+        return None  # 2 月 30 日、25 点之类
+    if zone is None:
+        return dt
+    if zone.upper() == "Z":
+        offset = timedelta(0)
+    else:
+        digits = zone[1:].replace(":", "")
+        offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:] or 0))
+        if zone[0] == "-":
+            offset = -offset
+    try:
+        return dt.replace(tzinfo=timezone(offset)).astimezone().replace(tzinfo=None)
+    except (ValueError, OverflowError):
+        return None  # 偏移超过 24 小时，或换算后超出 datetime 范围
+
+
+def parse_memo_timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        return None  # JSON 里的数字、列表等
+    value = value.strip()
+    dt = _parse_iso_timestamp(value)
+    if dt is not None:
+        return dt
+    for fmt in MEMO_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def format_memo_timestamp(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def day_range(day):
+    # [当天 00:00, 次日 00:00)
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1)
+
+
+def _migrate_string_timestamps(conn):
+    # SQLite 不能直接修改列类型：旧表改名 ➜ 按新定义建表 ➜ 逐行解析时间后批量写入 ➜ 删除旧表（有解析失败的行时只删掉其余行）
+    rows = conn.exec_driver_sql('SELECT id, text, category, timestamp, "userID" FROM memo').fetchall()
+    conn.exec_driver_sql("ALTER TABLE memo RENAME TO memo_legacy")
+    Memo.__table__.create(conn)
+    converted = []
+    unparseable = []
+    for memo_id, text, category, timestamp, user_id in rows:
+        dt = parse_memo_timestamp(timestamp) or dateparser.parse(timestamp or "")
+        if dt is None:
+            log_event(logging.WARNING, "memo_timestamp_unparseable", memo_id=memo_id, timestamp=timestamp)
+            unparseable.append(memo_id)
+            dt = datetime(1970, 1, 1)  # 备忘录照常保留，原始时间字符串留在 memo_legacy 中
+        converted.append({"id": memo_id, "text": text, "category": category,
+                          "timestamp": dt.replace(tzinfo=None), "userID": user_id})
+    if converted:
+        conn.execute(Memo.__table__.insert(), converted)
+    if unparseable:
+        # 只保留时间解析失败的原始行，供人工核对后修正
+        conn.execute(db.text("DELETE FROM memo_legacy WHERE id NOT IN :ids").bindparams(
+            db.bindparam("ids", expanding=True)), {"ids": unparseable})
+    else:
+        conn.exec_driver_sql("DROP TABLE memo_legacy")
+    log_event(logging.INFO, "memo_migration_done", memos=len(converted), unparseable=len(unparseable))
+
+
+def ensure_memo_schema():
+    # 旧库按需补齐到当前表结构；新库由 create_all 直接建好，不做任何事
+    with db.engine.begin() as conn:
+        columns = {row[1]: row[2].upper() for row in conn.exec_driver_sql("PRAGMA table_info(memo)")}
+        if columns.get("timestamp", "").startswith("VARCHAR"):
+            # timestamp 为 VARCHAR、没有索引 ➜ 重建整张表
+            _migrate_string_timestamps(conn)
+        elif "updated_at" not in columns:
+            # 已有的备忘录以迁移时刻作为修改时间
+            conn.exec_driver_sql(
+                "ALTER TABLE memo ADD COLUMN updated_at DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00.000000'"
+            )
+            conn.execute(Memo.__table__.update().values(updated_at=datetime.now()))
+        for index in Memo.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        if memo_fts_enabled(conn):
+            ensure_memo_fts(conn)
+        if db.engine.dialect.name == "sqlite":
+            ensure_memo_day_versions(conn)
+            ensure_memo_changes(conn)
+
+
+# ---------------- 备忘录全文索引 ----------------
+# memo_fts 是 FTS5 表（rowid = memo.id），text 列保存 memo_fts_text(userID, text)：
+# 每个汉字单独成一个 token，英文 / 数字按单词成 token，且每个 token 都加上 "u<userID>_" 前缀。
+# 这样每个用户的 token 各自有一份倒排列表，查询只读该用户的命中，不受其他用户数据量影响；
+# 关键词按短语（相邻 token）匹配，对中文等同于子串匹配；英文按单词匹配，不区分大小写。
+# 分词在 Python 中完成，触发器只用纯 SQL：memo 的增改只把 id 记进 memo_fts_pending，删除直接删掉索引行，
+# 因此 sqlite3 命令行、管理脚本、备份恢复等任何写入方都不受影响；
+# 查询 memo_fts 之前先由 refresh_memo_fts() 把待索引的备忘录分词写入，批量 SQL 增删改也会同步。
+_CJK = "\u3400-\u9fff\uf900-\ufaff"
+_CJK_CHAR_RE = re.compile(f"[{_CJK}]")
+_CJK_RUN_RE = re.compile(f"[{_CJK}]+|[^\\W{_CJK}]+")
+_FTS_TOKEN_RE = re.compile(f"[{_CJK}]|[^\\W{_CJK}]+")
+
+# 和 sqlite_master.sql 中保存的原文比较，定义变了就重建
+_MEMO_FTS_SCHEMA = {
+    "memo_fts": "CREATE VIRTUAL TABLE memo_fts USING fts5(text, tokenize=\"unicode61 tokenchars '_'\")",
+    "memo_fts_pending": "CREATE TABLE memo_fts_pending (memo_id INTEGER PRIMARY KEY)",
+    "memo_fts_ai": "CREATE TRIGGER memo_fts_ai AFTER INSERT ON memo BEGIN "
+                   "INSERT OR IGNORE INTO memo_fts_pending(memo_id) VALUES (new.id); END",
+    "memo_fts_ad": "CREATE TRIGGER memo_fts_ad AFTER DELETE ON memo BEGIN "
+                   "DELETE FROM memo_fts WHERE rowid = old.id; "
+                   "DELETE FROM memo_fts_pending WHERE memo_id = old.id; END",
+    "memo_fts_au": "CREATE TRIGGER memo_fts_au AFTER UPDATE OF text, userID ON memo BEGIN "
+                   "INSERT OR IGNORE INTO memo_fts_pending(memo_id) VALUES (new.id); END",
+}
+_memo_fts_state = {}
+
+
+def memo_fts_text(user_id, text):
+    prefix = f"u{'' if user_id is None else user_id}_"
+    return " ".join(prefix + token for token in _FTS_TOKEN_RE.findall(text or ""))
+
+
+def memo_fts_query(user_id, keyword):
+    # 整个关键词作为一个 FTS5 短语；不含任何字词时返回 None
+    text = memo_fts_text(user_id, keyword)
+    return f'"{text}"' if text else None
+
+
+def memo_fts_search_query(user_id, query):
+    # 搜索词拆成英文单词和汉字二元组（单个汉字保留本身），任一命中即可，由 bm25 按命中多少排序
+    terms = []
+    for run in _CJK_RUN_RE.findall(query):
+        if _CJK_CHAR_RE.match(run) and len(run) > 1:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    if not terms:
+        return None
+    return " OR ".join(memo_fts_query(user_id, term) for term in dict.fromkeys(terms))
+
+
+def memo_fts_enabled(conn=None):
+    # 只有 SQLite 且编译了 FTS5 时使用全文索引，否则关键词退回 LIKE 子串匹配
+    if db.engine.dialect.name != "sqlite":
+        return False
+    if conn is None:
+        return _memo_fts_state.get("enabled", False)
+    if "enabled" not in _memo_fts_state:
+        options = {row[0] for row in conn.exec_driver_sql("PRAGMA compile_options")}
+        _memo_fts_state["enabled"] = "ENABLE_FTS5" in options
+    return _memo_fts_state["enabled"]
+
+
+def ensure_memo_fts(conn):
+    existing = dict(conn.execute(
+        db.text("SELECT name, sql FROM sqlite_master WHERE name IN :names").bindparams(
+            db.bindparam("names", expanding=True)),
+        {"names": list(_MEMO_FTS_SCHEMA)},
+    ).fetchall())
+    if all(existing.get(name) == sql for name, sql in _MEMO_FTS_SCHEMA.items()):
+        refresh_memo_fts(conn)
+        return
+    # 新建、表定义变化或触发器缺失（例如 memo 表被重建过）时，整体重建索引
+    for name in _MEMO_FTS_SCHEMA:
+        if name.startswith("memo_fts_a"):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS memo_fts")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS memo_fts_pending")
+    for sql in _MEMO_FTS_SCHEMA.values():
+        conn.exec_driver_sql(sql)
+    conn.exec_driver_sql("INSERT INTO memo_fts_pending(memo_id) SELECT id FROM memo")
+    refresh_memo_fts(conn)
+    log_event(logging.INFO, "memo_fts_rebuilt")
+
+
+def refresh_memo_fts(conn):
+    # 把触发器记下的待索引备忘录分词后写入 memo_fts；没有待索引的备忘录时只是一次读
+    if conn.exec_driver_sql("SELECT 1 FROM memo_fts_pending LIMIT 1").first() is None:
+        return
+    # 第一条就是写语句：拿到写锁后再读待索引列表，多个进程同时刷新也不会漏掉或重复
+    conn.exec_driver_sql("DELETE FROM memo_fts WHERE rowid IN (SELECT memo_id FROM memo_fts_pending)")
+    rows = conn.exec_driver_sql(
+        "SELECT memo.id, memo.userID, memo.text FROM memo_fts_pending JOIN memo ON memo.id = memo_fts_pending.memo_id"
+    ).fetchall()
+    if rows:
+        conn.exec_driver_sql("INSERT INTO memo_fts(rowid, text) VALUES (?, ?)",
+                             [(memo_id, memo_fts_text(user_id, text)) for memo_id, user_id, text in rows])
+    conn.exec_driver_sql("DELETE FROM memo_fts_pending")
+
+
+def sync_memo_fts():
+    # 查询 memo_fts 前调用；用单独的事务提交，不混进请求的 session
+    with db.engine.begin() as conn:
+        refresh_memo_fts(conn)
+
+
+# ---------------- 按天的数据版本 ----------------
+# memo_day_version 记录每个 (userID, 日期) 的版本号，memo 上的触发器在同一事务中递增：
+# 任何写入路径（单条 / 批量保存、删除、迁移、其他进程）都会让受影响的那几天换一个新版本号，
+# 日视图缓存（见 day_view_cache）把版本号放进键里，旧条目自然不再被读到，无需跨进程通知。
+# 首次插入的版本号取当前毫秒时间戳，表被重建后也不会与之前的版本号重复。
+_NOW_MS_SQL = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+_DAY_VERSION_BUMP = ("INSERT INTO memo_day_version (userID, day, version) "
+                     "SELECT {row}.userID, date({row}.timestamp), " + _NOW_MS_SQL + " WHERE {row}.userID IS NOT NULL "
+                     "ON CONFLICT (userID, day) DO UPDATE SET version = version + 1;")
+_MEMO_DAY_VERSION_SCHEMA = {
+    "memo_day_version": "CREATE TABLE memo_day_version (userID INTEGER NOT NULL, day TEXT NOT NULL, "
+                        "version INTEGER NOT NULL, PRIMARY KEY (userID, day))",
+    "memo_day_version_ai": "CREATE TRIGGER memo_day_version_ai AFTER INSERT ON memo BEGIN "
+                           + _DAY_VERSION_BUMP.format(row="new") + " END",
+    "memo_day_version_ad": "CREATE TRIGGER memo_day_version_ad AFTER DELETE ON memo BEGIN "
+                           + _DAY_VERSION_BUMP.format(row="old") + " END",
+    "memo_day_version_au": "CREATE TRIGGER memo_day_version_au AFTER UPDATE ON memo BEGIN "
+                           + _DAY_VERSION_BUMP.format(row="old") + " "
+                           + _DAY_VERSION_BUMP.format(row="new") + " END",
+}
+
+
+def ensure_memo_day_versions(conn):
+    existing = dict(conn.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE name LIKE 'memo_day_version%'"
+    ).fetchall())
+    if all(existing.get(name) == sql for name, sql in _MEMO_DAY_VERSION_SCHEMA.items()):
+        return
+    for name in _MEMO_DAY_VERSION_SCHEMA:
+        if name != "memo_day_version":
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS memo_day_version")
+    for sql in _MEMO_DAY_VERSION_SCHEMA.values():
+        conn.exec_driver_sql(sql)
+    # 已有数据的每一天都给一个新版本号
+    conn.exec_driver_sql(
+        "INSERT INTO memo_day_version (userID, day, version) "
+        f"SELECT DISTINCT userID, date(timestamp), {_NOW_MS_SQL} FROM memo WHERE userID IS NOT NULL"
+    )
+    log_event(logging.INFO, "memo_day_versions_rebuilt")
+
+
+# ---------------- 增量同步的修改序号 ----------------
+# memo_change 为每条备忘录记录最近一次修改的序号 seq（AUTOINCREMENT，只增不复用），由 memo 上的触发器分配。
+# SQLite 同一时刻只有一个写事务，seq 在拿到写锁之后才分配，所以提交顺序与 seq 顺序一致：
+# 读到某个 seq 时，比它小的 seq 都已提交，客户端按 seq 续传不会漏掉等锁较久的写入。
+# （updated_at 在 Python 里赋值、在拿到写锁之前，先取时间的写入可能晚于更大的 updated_at 提交。）
+# 删除（以及改到别的用户名下）的备忘录保留一行 deleted = 1 的墓碑，增量同步据此通知客户端删掉本地副本；
+# 墓碑一条备忘录只占一行，不清理。
+# 表重建时 seq 从当前毫秒时间戳 × 1000 起，之前发出的令牌都小于新序号，客户端会全量同步一次。
+_MEMO_CHANGE_RECORD = ("DELETE FROM memo_change WHERE memo_id = {row}.id AND userID IS {row}.userID; "
+                       "INSERT INTO memo_change (memo_id, userID, deleted) VALUES ({row}.id, {row}.userID, {deleted});")
+_MEMO_CHANGE_SCHEMA = {
+    "memo_change": "CREATE TABLE memo_change (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                   "memo_id INTEGER NOT NULL, userID INTEGER, deleted INTEGER NOT NULL DEFAULT 0)",
+    "memo_change_user_seq": "CREATE INDEX memo_change_user_seq ON memo_change (userID, seq)",
+    "memo_change_memo": "CREATE INDEX memo_change_memo ON memo_change (memo_id)",
+    "memo_change_ai": "CREATE TRIGGER memo_change_ai AFTER INSERT ON memo BEGIN "
+                      + _MEMO_CHANGE_RECORD.format(row="new", deleted=0) + " END",
+    "memo_change_au": "CREATE TRIGGER memo_change_au AFTER UPDATE ON memo BEGIN "
+                      + _MEMO_CHANGE_RECORD.format(row="old", deleted=1) + " "
+                      + _MEMO_CHANGE_RECORD.format(row="new", deleted=0) + " END",
+    "memo_change_ad": "CREATE TRIGGER memo_change_ad AFTER DELETE ON memo BEGIN "
+                      + _MEMO_CHANGE_RECORD.format(row="old", deleted=1) + " END",
+}
+
+
+def ensure_memo_changes(conn):
+    existing = dict(conn.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE name LIKE 'memo_change%'"
+    ).fetchall())
+    if all(existing.get(name) == sql for name, sql in _MEMO_CHANGE_SCHEMA.items()):
+        return
+    for name, sql in _MEMO_CHANGE_SCHEMA.items():
+        if sql.startswith("CREATE TRIGGER"):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS memo_change")  # 连同索引
+    for sql in _MEMO_CHANGE_SCHEMA.values():
+        conn.exec_driver_sql(sql)
+    conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'memo_change'")
+    conn.exec_driver_sql(f"INSERT INTO sqlite_sequence (name, seq) VALUES ('memo_change', {_NOW_MS_SQL} * 1000)")
+    conn.exec_driver_sql("INSERT INTO memo_change (memo_id, userID) SELECT id, userID FROM memo ORDER BY updated_at, id")
+    log_event(logging.INFO, "memo_changes_rebuilt")
+
+
+@app.cli.command("migrate-memos")
+def migrate_memos_command():
+    """把 instance/memo.db 迁移到当前的 Memo 表结构。"""
+    ensure_memo_schema()
+
 
 with app.app_context():
+    db.event.listen(db.engine, "connect", _configure_sqlite_connection)
     db.create_all()
+    ensure_memo_schema()
 
+# 音频默认只在内存中解码；KEEP_UPLOADS=1 时仍把上传文件和解码后的 WAV 写入 uploads/ 方便调试
 UPLOAD_FOLDER = "uploads"
-if not os.path.exists(UPLOAD_FOLDER):
+KEEP_UPLOADS = os.environ.get("KEEP_UPLOADS", "0") == "1"
+if KEEP_UPLOADS and not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-# API 地址为 PHP 后端地址，您可以根据需要修改
-PHP_API_URL = 'https://dcs5604.com/wanqiao/login.php'
+# API 地址为 PHP 后端地址，您可以根据需要修改（也可用环境变量指向本地替身服务做测试）
+PHP_API_URL = os.environ.get("PHP_API_URL", 'https://dcs5604.com/wanqiao/login.php')
+
+# ---------------- PHP 登录代理 ----------------
+# 复用连接池（keep-alive）、设置连接/读取超时和有限重试；验证成功的账号在短时间内直接命中缓存
+# （键为加盐哈希，不保存明文密码）；后端连续失败时熔断一段时间，直接快速失败。
+AUTH_POOL_SIZE = int(os.environ.get("AUTH_POOL_SIZE", 10))
+AUTH_CONNECT_TIMEOUT = float(os.environ.get("AUTH_CONNECT_TIMEOUT", 3))
+AUTH_READ_TIMEOUT = float(os.environ.get("AUTH_READ_TIMEOUT", 10))
+AUTH_RETRIES = int(os.environ.get("AUTH_RETRIES", 2))
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 1024))
+AUTH_BREAKER_THRESHOLD = int(os.environ.get("AUTH_BREAKER_THRESHOLD", 5))
+AUTH_BREAKER_COOLDOWN = float(os.environ.get("AUTH_BREAKER_COOLDOWN", 30))
+
+
+class AuthBackendUnavailable(Exception):
+    """熔断中，未请求 PHP 后端。"""
+
+
+class PhpAuthClient:
+    def __init__(self, url, pool_size=AUTH_POOL_SIZE, timeout=(AUTH_CONNECT_TIMEOUT, AUTH_READ_TIMEOUT),
+                 retries=AUTH_RETRIES, cache_ttl=AUTH_CACHE_TTL, cache_size=AUTH_CACHE_SIZE,
+                 breaker_threshold=AUTH_BREAKER_THRESHOLD, breaker_cooldown=AUTH_BREAKER_COOLDOWN):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=retries, connect=retries, read=retries, backoff_factor=0.2,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset({"POST"}),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._salt = os.environ.get("AUTH_CACHE_SALT", "").encode() or os.urandom(16)
+
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "cache_hits": 0, "backend_errors": 0, "short_circuited": 0}
+
+    def _cache_key(self, username, password):
+        return hmac.new(self._salt, f"{username}\0{password}".encode(), hashlib.sha256).hexdigest()
+
+    def _cached(self, key):
+        with self._lock:
+            expires = self._cache.get(key)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._cache[key]
+                return False
+            self._cache.move_to_end(key)
+            return True
+
+    def _remember(self, key):
+        with self._lock:
+            self._cache[key] = time.monotonic() + self.cache_ttl
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _record(self, ok):
+        with self._lock:
+            if ok:
+                self._failures = 0
+                return
+            self._failures += 1
+            self.stats["backend_errors"] += 1
+            if self._failures >= self.breaker_threshold:
+                self._open_until = time.monotonic() + self.breaker_cooldown
+                log_event(logging.WARNING, "auth_breaker_open", cooldown_seconds=self.breaker_cooldown)
+
+    @staticmethod
+    def _error_message(response):
+        try:
+            message = response.json().get("message")
+        except (ValueError, AttributeError):
+            message = None
+        return message or "Invalid credentials"
+
+    def verify(self, username, password):
+        """返回 (是否通过, 失败原因)；后端不可用时抛出 AuthBackendUnavailable 或 requests 异常。"""
+        key = self._cache_key(username, password)
+        if self._cached(key):
+            self._count("cache_hits")
+            return True, None
+
+        if time.monotonic() < self._open_until:
+            self._count("short_circuited")
+            raise AuthBackendUnavailable()
+
+        self._count("requests")
+        try:
+            response = self.session.post(self.url, data={'username': username, 'password': password},
+                                         timeout=self.timeout)
+            if 400 <= response.status_code < 500:
+                # 4xx（如用户名或密码错误时的 401/403）说明后端正常工作，不计入熔断
+                self._record(ok=True)
+                return False, self._error_message(response)
+            response.raise_for_status()  # 只有连接错误、超时和 5xx 计入熔断
+            response_data = response.json()
+        except (requests.exceptions.RequestException, ValueError):
+            self._record(ok=False)
+            raise
+        self._record(ok=True)
+
+        if response_data.get("success"):
+            self._remember(key)
+            return True, None
+        return False, response_data.get("message", "Invalid credentials")
+
+    def breaker_state(self):
+        return "open" if time.monotonic() < self._open_until else "closed"
+
+
+auth_client = PhpAuthClient(PHP_API_URL)
+
 
 # 模拟登录功能（通过 PHP 后端验证）
 @app.route("/api/login", methods=["POST"])
@@ -65,129 +907,527 @@ def login():
     data = request.get_json()
     username = data.get("username")
     password = data.get("password")
-    print("Login attempt with:", username, password)
+    log_event(logging.DEBUG, "login_attempt", username=username)
 
     try:
-        # 发送请求到 PHP 后端验证用户登录
-        response = requests.post(PHP_API_URL, data={'username': username, 'password': password})
-
-        # 如果请求成功，处理响应
-        response.raise_for_status()  # 确保请求成功（状态码为 200）
-
-        # 获取 PHP 后端的响应
-        response_data = response.json()
-
-        if response_data.get("success"):
+        ok, message = auth_client.verify(username, password)
+        if ok:
             return jsonify({"success": True})
         else:
-            return jsonify({"success": False, "message": response_data.get("message", "Invalid credentials")}), 401
+            return jsonify({"success": False, "message": message}), 401
 
+    except AuthBackendUnavailable:
+        return jsonify({"success": False, "message": "Server error"}), 503
     except requests.exceptions.RequestException as e:
         # 捕获请求异常
-        print("Login request error:", e)
+        log_event(logging.ERROR, "login_backend_error", error=str(e))
         return jsonify({"success": False, "message": "Server error"}), 500
     except Exception as e:
         # 捕获其他异常
-        print("Login error:", e)
+        log_event(logging.ERROR, "login_error", exc_info=True)
         return jsonify({"success": False, "message": "Server error"}), 500
 
+# ---------------- 语言判定 ----------------
+# 先按文字统计：汉字与拉丁字母（约 4 个字母折合 1 个汉字的信息量）哪一方占明显多数即可定论；
+# 只有混排且难分主次时才交给 langdetect（固定随机种子，结果可复现）。
+# 结果按文本缓存在有界 LRU 中，同一请求内多处调用只会真正判定一次。
+LANG_CACHE_SIZE = int(os.environ.get("LANG_CACHE_SIZE", 4096))
+_HAN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+_LATIN_RE = re.compile(r"[A-Za-z]")
+
+
+def _init_langdetect():
+    # 预先加载语言 profile，避免第一次请求时才初始化
+    langdetect.DetectorFactory.seed = 0
+    langdetect.detector_factory.init_factory()
+    return langdetect.detector_factory._factory
+
+
+_model_loaders["langdetect"] = _init_langdetect
+
+
+@functools.lru_cache(maxsize=LANG_CACHE_SIZE)
 def detect_language(text):
+    # 返回 'zh' / 'en'；没有任何汉字或字母时返回 None
+    han = len(_HAN_RE.findall(text))
+    latin = len(_LATIN_RE.findall(text)) / 4
+    if not han and not latin:
+        return None
+    if han >= 2 * latin:
+        return "zh"
+    if latin >= 2 * han:
+        return "en"
+
+    get_model("langdetect")
     try:
         lang = langdetect.detect(text)
-        return lang  # 返回语言代码，如 'en' 或 'zh'
     except langdetect.lang_detect_exception.LangDetectException:
-        return None  # 如果无法检测到语言，返回 None
+        lang = None
+    if lang and lang.startswith("zh"):
+        return "zh"
+    if lang == "en":
+        return "en"
+    return "zh" if han >= latin else "en"
 
 def categorize_text(text, threshold=0.5):
-    language = detect_language(text)
-
-    if language == 'zh':
-        doc = nlp_zh(text)
-    elif language == 'en':
-        doc = nlp_en(text)
-    else:
+    analysis = analyze(text)
+    if analysis.language is None:
         return "Others"
 
-    if doc and doc.cats:
-        print("Classification probabilities:", doc.cats)
-        category, prob = max(doc.cats.items(), key=lambda item: item[1])
-        print(f"Category: {category}, Probability: {prob}")
-        if category in ["Study", "Work", "Daily"] and prob >= threshold:
-            return category
-        else:
-            return "Others"  # 分类概率低或者类别不在预定义范围内
-    return "Others"  # 如果没有符合条件的分类，则返回 Unknown
+    category, prob = analysis.top
+    if category in ["Study", "Work", "Daily"] and prob >= threshold:
+        return category
+    return "Others"  # 分类概率低或者类别不在预定义范围内
 
 # 你已有的 predict_and_extract_time() 函数
 def predict_and_extract_time(text):
-    language = detect_language(text)
-    if language == 'zh':
-        doc = nlp_zh(text)
-    elif language == 'en':
-        doc = nlp_en(text)
-    else:
-        # 无法判断语言，默认使用中文模型或返回 Others
-        doc = nlp_zh(text)
-
-    if doc and doc.cats:
-        category = max(doc.cats, key=doc.cats.get)
-    else:
-        category = "Others"
+    analysis = analyze(text)
+    return analysis.top[0], analysis.time
+
+
+# extract_task_title 用到的正则只编译一次
+_TITLE_DATE_RES = [
+    re.compile(r"\d{1,2}(st|nd|rd|th)? of [A-Za-z]+"),  # 英文 23rd of June
+    re.compile(r"\d{4}-\d{1,2}-\d{1,2}"),               # 2025-06-23
+    re.compile(r"\d+月\d+(日|号)?"),                     # 6月23日 / 6月23号
+]
+_TITLE_TIME_WORDS = [
+    "今天", "明天", "后天", "早上", "下午", "晚上", "上午",
+    "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday",
+    "morning", "afternoon", "evening", "tonight", "tomorrow", "today"
+]
+_TITLE_AFFIX_RES = [
+    re.compile(r"^(请)?(帮我)?(把)?(我要)?(删除|取消|移除)", re.IGNORECASE),          # 中文
+    re.compile(r"^(please )?(help me )?(delete|remove|cancel|erase|clear)( the memo of| the)?", re.IGNORECASE),  # 英文
+    re.compile(r"(的)?(任务|事情|安排|行程|memo|note|schedule|event)?(删掉|删除|取消)?$", re.IGNORECASE),
+]
 
-    time = parse_time(text)
-    return category, time
 
 def extract_task_title(text):
-    import re
-
     # 1. 清除日期表达式（中英文格式）
-    text = re.sub(r"\d{1,2}(st|nd|rd|th)? of [A-Za-z]+", "", text)  # 英文 23rd of June
-    text = re.sub(r"\d{4}-\d{1,2}-\d{1,2}", "", text)               # 2025-06-23
-    text = re.sub(r"\d+月\d+(日|号)?", "", text)                     # 6月23日 / 6月23号
+    for pattern in _TITLE_DATE_RES:
+        text = pattern.sub("", text)
 
     # 2. 去除中英文模糊时间词（今天、明天、下午等）
-    time_words = [
-        "今天", "明天", "后天", "早上", "下午", "晚上", "上午",
-        "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday",
-        "morning", "afternoon", "evening", "tonight", "tomorrow", "today"
-    ]
-    for word in time_words:
+    for word in _TITLE_TIME_WORDS:
         text = text.replace(word, "")
 
     # 3. 去除常见前缀指令（中英文删除/取消表达）
-    prefix_patterns = [
-        r"^(请)?(帮我)?(把)?(我要)?(删除|取消|移除)",          # 中文
-        r"^(please )?(help me )?(delete|remove|cancel|erase|clear)( the memo of| the)?",  # 英文
-    ]
-    for pattern in prefix_patterns:
-        text = re.sub(pattern, "", text, flags=re.IGNORECASE)
-
     # 4. 去除结尾修饰词（中英文“的任务”、“的事情”、“的行程”...）
-    suffix_patterns = [
-        r"(的)?(任务|事情|安排|行程|memo|note|schedule|event)?(删掉|删除|取消)?$",
-    ]
-    for pattern in suffix_patterns:
-        text = re.sub(pattern, "", text, flags=re.IGNORECASE)
+    for pattern in _TITLE_AFFIX_RES:
+        text = pattern.sub("", text)
 
     # 5. 去除多余空格
     return text.strip()
 
 
+# ---------------- 单次文本分析 ----------------
+# analyze(text) 返回一个 TextAnalysis：语言、spaCy Doc 与各类别概率、解析出的时间、任务标题、
+# 删除 / 查询意图都在首次访问时计算并缓存。同一请求内对同一文本的多次调用返回同一个对象
+# （缓存在 g 上），/transcribe、/classify 及上面的辅助函数都从这里取结果，不再重复跑模型和正则。
+DELETE_CATEGORIES = ("Delete_Specific", "Delete_All")
+
+
+class TextAnalysis:
+    def __init__(self, text):
+        self.text = text
+
+    @functools.cached_property
+    def language(self):
+        # 'zh' / 'en' / None（没有可判断的文字）
+        return detect_language(self.text)
+
+    @property
+    def model_language(self):
+        # 无法判断语言时默认使用中文模型
+        return "en" if self.language == "en" else "zh"
+
+    @functools.cached_property
+    def doc(self):
+        with cpu_stage("textcat"):
+            return get_nlp(self.model_language)(self.text)
+
+    @functools.cached_property
+    def cats(self):
+        if CLASSIFIER_ENGINE == "numpy":
+            with cpu_stage("textcat"):
+                return predict_cats(self.model_language, [self.text])[0]
+        return self.doc.cats
+
+    @functools.cached_property
+    def top(self):
+        # (概率最高的类别, 概率)
+        if not self.cats:
+            return "Others", 0.0
+        return max(self.cats.items(), key=lambda item: item[1])
+
+    @functools.cached_property
+    def time(self):
+        with cpu_stage("parse_time"):
+            return parse_time(self.text)
+
+    @functools.cached_property
+    def task_title(self):
+        return extract_task_title(self.text)
+
+    @property
+    def intent(self):
+        # 'delete' / 'query' / 'memo'
+        category = self.top[0]
+        if category in DELETE_CATEGORIES:
+            return "delete"
+        if category.startswith("Query_"):
+            return "query"
+        return "memo"
+
+    def classification(self, threshold=0.5):
+        # /classify 的结果；无法判断语言时不跑模型，直接归为 Others
+        if self.language is None:
+            return {"category": "Others", "category_id": 4}
+        return classify_cats(self.cats, threshold)
+
+
+def analyze(text):
+    if not has_app_context():
+        return TextAnalysis(text)
+    analyses = g.setdefault("analyses", {})
+    analysis = analyses.get(text)
+    if analysis is None:
+        analysis = analyses[text] = TextAnalysis(text)
+    return analysis
+
+
 def query_tasks_by_date(date_str):
-    # 假设你有 Memo 表，timestamp字段是 ISO格式字符串
-    tasks = Memo.query.filter(Memo.timestamp.like(f"{date_str}%")).all()
-    return [{"text": t.text, "category": t.category, "timestamp": t.timestamp} for t in tasks]
+    start, end = day_range(parse_memo_timestamp(date_str))
+    tasks = Memo.query.filter(Memo.timestamp >= start, Memo.timestamp < end).all()
+    return [{"text": t.text, "category": t.category, "timestamp": format_memo_timestamp(t.timestamp)} for t in tasks]
+
+
+# ---------------- 备忘录分页 / 增量同步 ----------------
+# 游标是 (时间, id) 的不透明编码：列表按 (timestamp, id) 倒序做 keyset 分页。
+# 增量同步在 SQLite 上按 memo_change.seq 正序返回 since 之后修改过的备忘录（memos）和删除的 id（deleted），
+# 令牌是 seq 的不透明编码；其他数据库没有 memo_change 触发器，按 (updated_at, id) 正序，不报告删除。
+MEMO_PAGE_SIZE = int(os.environ.get("MEMO_PAGE_SIZE", 50))
+MEMO_PAGE_MAX = 500
+_MEMO_COLUMNS = (Memo.id, Memo.text, Memo.category, Memo.timestamp)
+
+
+def encode_cursor(dt, memo_id):
+    return base64.urlsafe_b64encode(f"{dt.isoformat()}|{memo_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        dt, memo_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(dt), int(memo_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def memo_row_to_dict(row):
+    return {
+        "id": row.id,
+        "text": row.text,
+        "category": row.category,
+        "timestamp": format_memo_timestamp(row.timestamp)
+    }
+
+
+def list_memos_page(user_id, cursor=None, limit=MEMO_PAGE_SIZE):
+    # 只取需要的列，不构造 ORM 对象；多取一行判断是否还有下一页
+    query = db.select(*_MEMO_COLUMNS).where(Memo.userID == user_id)
+    if cursor:
+        query = query.where(db.tuple_(Memo.timestamp, Memo.id) < cursor)
+    rows = db.session.execute(
+        query.order_by(Memo.timestamp.desc(), Memo.id.desc()).limit(limit + 1)
+    ).all()
+    next_cursor = encode_cursor(rows[limit - 1].timestamp, rows[limit - 1].id) if len(rows) > limit else None
+    return [memo_row_to_dict(row) for row in rows[:limit]], next_cursor
+
+
+_MEMO_CHANGES_SQL = db.text(
+    "SELECT memo_change.memo_id AS id, memo.text, memo.category, memo.timestamp, memo_change.seq, memo_change.deleted "
+    "FROM memo_change LEFT JOIN memo ON memo.id = memo_change.memo_id AND memo_change.deleted = 0 "
+    "WHERE memo_change.userID = :user_id AND memo_change.seq > :since "
+    "AND (memo_change.deleted = 0 OR :since > 0) ORDER BY memo_change.seq LIMIT :limit"
+).columns(*_MEMO_COLUMNS, db.column("seq", db.Integer), db.column("deleted", db.Integer))
+
+
+def decode_sync_token(token):
+    if db.engine.dialect.name != "sqlite":
+        return decode_cursor(token)
+    try:
+        value = base64.urlsafe_b64decode(token.encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if value.isdigit():
+        return int(value)
+    # 改用 seq 之前发出的 (updated_at, id) 令牌：从头全量同步一次
+    return 0 if decode_cursor(token) else None
+
+
+def list_memos_changed_since(user_id, since, limit=MEMO_PAGE_SIZE):
+    # 返回 (修改过的备忘录, 已删除的 id, sync_token, has_more)
+    if db.engine.dialect.name == "sqlite":
+        rows = db.session.execute(_MEMO_CHANGES_SQL, {"user_id": user_id, "since": since or 0, "limit": limit + 1}).all()
+        page = rows[:limit]
+        sync_token = base64.urlsafe_b64encode(str(page[-1].seq).encode()).decode() if page else None
+        memos = [memo_row_to_dict(row) for row in page if not row.deleted]
+        return memos, [row.id for row in page if row.deleted], sync_token, len(rows) > limit
+
+    query = db.select(*_MEMO_COLUMNS, Memo.updated_at).where(Memo.userID == user_id)
+    if since:
+        query = query.where(db.tuple_(Memo.updated_at, Memo.id) > since)
+    rows = db.session.execute(
+        query.order_by(Memo.updated_at, Memo.id).limit(limit + 1)
+    ).all()
+    page = rows[:limit]
+    sync_token = encode_cursor(page[-1].updated_at, page[-1].id) if page else None
+    return [memo_row_to_dict(row) for row in page], [], sync_token, len(rows) > limit
+
+
+def memo_list_etag(user_id):
+    count, last_update = db.session.execute(
+        db.select(db.func.count(Memo.id), db.func.max(Memo.updated_at)).where(Memo.userID == user_id)
+    ).one()
+    return f"{user_id}-{count}-{last_update.timestamp() if last_update else 0}"
+
+
+@app.route("/memos", methods=["GET"])
+def list_memos():
+    user_id = request.args.get("userID", type=int)
+    if not user_id:
+        return jsonify({'success': False, 'error': 'Missing userID'}), 400
+    limit = max(1, min(request.args.get("limit", MEMO_PAGE_SIZE, type=int), MEMO_PAGE_MAX))
+
+    # 列表未变化 ➜ 304，客户端直接用本地缓存
+    etag = memo_list_etag(user_id)
+    if request.if_none_match.contains_weak(etag):
+        response = app.make_response(("", 304))
+        response.set_etag(etag, weak=True)
+        return response
+
+    if "since" in request.args:
+        # since 为空表示首次同步，返回全部；之后带上一次返回的 sync_token
+        since = decode_sync_token(request.args["since"]) if request.args["since"] else None
+        if request.args["since"] and since is None:
+            return jsonify({'success': False, 'error': 'Invalid since token'}), 400
+        memos, deleted, sync_token, has_more = list_memos_changed_since(user_id, since, limit)
+        body = {'success': True, 'memos': memos, 'deleted': deleted,
+                'sync_token': sync_token or request.args["since"], 'has_more': has_more}
+    else:
+        cursor = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        if request.args.get("cursor") and cursor is None:
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+        memos, next_cursor = list_memos_page(user_id, cursor, limit)
+        body = {'success': True, 'memos': memos, 'next_cursor': next_cursor}
+
+    response = jsonify(body)
+    response.set_etag(etag, weak=True)
+    return response
+
+def request_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------- 批量删除 ----------------
+# /transcribe 对 Delete_* 只返回 pending_delete（时间范围 + 可选关键词），用户确认后由客户端提交到这里，
+# 用一条 DELETE 语句完成：(userID, timestamp) 索引上的范围条件 + memo_fts 全文索引上的关键词匹配，
+# 只返回影响行数，不把备忘录读进 Python；memo_change 上的触发器为每条被删的备忘录留下墓碑，供增量同步下发。
+def memo_match_conditions(user_id, start, end, keyword=None):
+    conditions = [Memo.userID == user_id, Memo.timestamp >= start, Memo.timestamp < end]
+    if keyword:
+        if memo_fts_enabled():
+            sync_memo_fts()
+            matches = db.text("SELECT rowid FROM memo_fts WHERE memo_fts MATCH :fts_query")
+            conditions.append(Memo.id.in_(
+                matches.bindparams(fts_query=memo_fts_query(user_id, keyword)).columns(db.column("rowid"))
+            ))
+        else:
+            conditions.append(Memo.text.contains(keyword, autoescape=True))
+    return conditions
+
+
+def delete_memos(user_id, start, end, keyword=None, dry_run=False):
+    conditions = memo_match_conditions(user_id, start, end, keyword)
+    if dry_run:
+        return db.session.execute(db.select(db.func.count()).select_from(Memo).where(*conditions)).scalar()
+    result = db.session.execute(Memo.__table__.delete().where(*conditions))
+    db.session.commit()
+    return result.rowcount
+
+
+@app.route("/memos/delete", methods=["POST"])
+def delete_memos_route():
+    data = request.get_json(silent=True) or {}
+    user_id = request_int(data.get("userID"))
+    pending = data.get("pending_delete")
+    if not user_id or not isinstance(pending, dict):
+        return jsonify({'success': False, 'error': 'Missing userID or pending_delete'}), 400
+
+    start = parse_memo_timestamp(pending.get("start_time"))
+    end = parse_memo_timestamp(pending.get("end_time"))
+    if start is None or end is None:
+        return jsonify({'success': False, 'error': 'Invalid start_time or end_time'}), 400
+    # Delete_All 忽略关键词：旧版 /transcribe 会把整句话当作关键词下发，按它匹配永远删不到
+    keyword = None if pending.get("category") == "Delete_All" else pending.get("keyword")
+    keyword = (keyword.strip() if isinstance(keyword, str) else keyword) or None
+    if keyword is not None and (not isinstance(keyword, str) or memo_fts_query(user_id, keyword) is None):
+        return jsonify({'success': False, 'error': 'Invalid keyword'}), 400
+
+    # end_time 是包含在内的（如 23:59:59），换成开区间
+    end += timedelta(seconds=1)
+    dry_run = bool(data.get("dry_run"))
+    with trace_stage("db_delete"):
+        count = delete_memos(user_id, start, end, keyword, dry_run)
+    log_event(logging.INFO, "memos_deleted", user_id=user_id, category=pending.get("category"),
+              keyword=keyword is not None, dry_run=dry_run, count=count)
+    return jsonify({'success': True, 'matched' if dry_run else 'deleted': count})
+
+
+# ---------------- 备忘录搜索 ----------------
+# 在 memo_fts 上按 bm25 排序；没有 FTS5 时退回按词 LIKE 匹配、按时间倒序
+SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", 20))
+_SEARCH_SQL = db.text(
+    "SELECT memo.id, memo.text, memo.category, memo.timestamp, bm25(memo_fts) AS score "
+    "FROM memo_fts JOIN memo ON memo.id = memo_fts.rowid "
+    "WHERE memo_fts MATCH :fts_query ORDER BY score, memo.timestamp DESC LIMIT :limit OFFSET :offset"
+).columns(*_MEMO_COLUMNS, db.column("score", db.Float))
+
+
+def search_memos(user_id, query, limit=SEARCH_PAGE_SIZE, offset=0):
+    if memo_fts_enabled():
+        fts_query = memo_fts_search_query(user_id, query)
+        if fts_query is None:
+            return []
+        sync_memo_fts()
+        rows = db.session.execute(_SEARCH_SQL, {"fts_query": fts_query, "limit": limit, "offset": offset}).all()
+        return [dict(memo_row_to_dict(row), score=round(-row.score, 4)) for row in rows]
+
+    terms = _CJK_RUN_RE.findall(query)
+    if not terms:
+        return []
+    rows = db.session.execute(
+        db.select(*_MEMO_COLUMNS)
+        .where(Memo.userID == user_id, db.or_(*(Memo.text.contains(term, autoescape=True) for term in terms)))
+        .order_by(Memo.timestamp.desc(), Memo.id.desc()).limit(limit).offset(offset)
+    ).all()
+    return [memo_row_to_dict(row) for row in rows]
+
+
+@app.route("/search", methods=["GET"])
+def search():
+    user_id = request.args.get("userID", type=int)
+    query = request.args.get("q", "").strip()
+    if not user_id or not query:
+        return jsonify({'success': False, 'error': 'Missing userID or q'}), 400
+    limit = max(1, min(request.args.get("limit", SEARCH_PAGE_SIZE, type=int), MEMO_PAGE_MAX))
+    offset = max(request.args.get("offset", 0, type=int), 0)
+
+    with trace_stage("db_search"):
+        memos = search_memos(user_id, query, limit, offset)
+    return jsonify({'success': True, 'memos': memos,
+                    'next_offset': offset + limit if len(memos) == limit else None})
+
+
+# ---------------- 时间解析 ----------------
+# 常见说法（X月Y号、June 23、今天/明天/后天/today/tomorrow + 晚上N点、单独的晚上N点）用预编译正则直接解析，
+# 只有都不匹配时才调用 dateparser；其 zh/en 语言数据在启动时预加载（见 _warm_up_dateparser）。
+_MONTHS = "January|February|March|April|May|June|July|August|September|October|November|December"
+_ZH_DATE_RE = re.compile(r"(\d{1,2})月(\d{1,2})[号日]?")
+_EN_DATE_RE = re.compile(
+    rf"(?:(\d{{1,2}})(?:st|nd|rd|th)?\s+({_MONTHS})|"  # 24 June
+    rf"({_MONTHS})\s+(\d{{1,2}})(?:st|nd|rd|th)?)",
+    re.IGNORECASE
+)
+_HOUR_RE = re.compile(r"(晚上|下午)?(\d{1,2})点")
+_EXPLICIT_DATE_RE = re.compile(r"(\d{1,2})月(\d{1,2})[号日]?|today|tomorrow|[0-9]{1,2} [A-Za-z]+|明天|后天")
+_RELATIVE_DAY_RE = re.compile(r"今天|明天|后天|today|tomorrow", re.IGNORECASE)
+_RELATIVE_DAY_OFFSET = {"今天": 0, "today": 0, "明天": 1, "tomorrow": 1, "后天": 2}
+_FAST_HOUR_RE = re.compile(r"(早上|上午|中午|下午|晚上)?\d{1,2}点")
+_BARE_HOUR_RE = re.compile(r"(早上|上午|下午|晚上)(\d{1,2})点(?!半)")
+# 出现这些词时交给 dateparser（星期、其他相对日期、英文时刻等）
+_FAST_PATH_BLOCKER_RE = re.compile(
+    r"\d|[零一二两三四五六七八九十]点|点半|大后天|前天|昨天|周|星期|礼拜|月|年|下个|上个|下周|上周|凌晨|早上|上午|中午|下午|晚上|今晚|"
+    r"\b(?:next|last|after|before|ago|yesterday|week|month|year|am|pm|noon|midnight|morning|afternoon|evening|night|tonight|"
+    r"o'?clock|monday|tuesday|wednesday|thursday|friday|saturday|sunday|at|in)\b",
+    re.IGNORECASE
+)
+
+
+# dateparser 按 settings 缓存各语言的切分正则：settings 里带每次都不同的 RELATIVE_BASE 会让缓存失效，
+# 每次调用都为全部 200 多种语言重建正则（不限语言的 dateparser.parse 一次约 75 ms）。
+# 不传 RELATIVE_BASE 时 dateparser 以调用时刻为基准，与 now 只差几微秒。
+_DATEPARSER_SETTINGS = {'PREFER_DATES_FROM': 'future'}
+
+
+def _warm_up_dateparser():
+    # 首次调用 dateparser 会加载语言数据并编译切分正则，在启动时用请求里相同的 settings 完成；
+    # 不含日期的文本会让不限语言的 parse 检查全部语言，把所有语言都加载一遍（约 2~3 秒）
+    search_dates("明天下午3点 tomorrow", languages=['zh', 'en'], settings=_DATEPARSER_SETTINGS)
+    dateparser.parse("tomorrow", settings=_DATEPARSER_SETTINGS)
+    dateparser.parse("写周报", settings=_DATEPARSER_SETTINGS)
+    return True
+
+
+_model_loaders["dateparser"] = _warm_up_dateparser
+
+
+def _parse_relative_day(text, text_cleaned, now):
+    # 只含一个 今天/明天/后天/today/tomorrow（可带“晚上N点”）时直接计算，与 search_dates 结果一致
+    days = _RELATIVE_DAY_RE.findall(text_cleaned)
+    if len(days) != 1:
+        return None
+    if _FAST_PATH_BLOCKER_RE.search(_FAST_HOUR_RE.sub("", text_cleaned)):
+        return None
+
+    dt = now + timedelta(days=_RELATIVE_DAY_OFFSET[days[0].lower()])
+    hour_match = _HOUR_RE.search(text)
+    if hour_match:
+        hour = int(hour_match.group(2))
+        if hour < 12 and hour_match.group(1) in ["晚上", "下午"]:
+            hour += 12
+        if hour > 23:
+            return None
+        dt = dt.replace(hour=hour, minute=0, second=0, microsecond=0)
+    return dt
+
+
+def _parse_bare_hour(text_cleaned, now):
+    # 没有日期、只有一个“早上/上午/下午/晚上N点”时：取今天这个钟点，已经过去则取明天，
+    # 与 search_dates 分支对无明确日期的处理一致
+    matches = _BARE_HOUR_RE.findall(text_cleaned)
+    if len(matches) != 1 or _RELATIVE_DAY_RE.search(text_cleaned):
+        return None
+    if _FAST_PATH_BLOCKER_RE.search(_BARE_HOUR_RE.sub("", text_cleaned)):
+        return None
+
+    period, hour = matches[0]
+    hour = int(hour)
+    if hour < 12 and period in ["晚上", "下午"]:
+        hour += 12
+    if hour > 23:
+        return None
+    dt = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if dt < now:
+        dt += timedelta(days=1)
+    return dt
+
 
 # 解析中文或英文时间表达
 def parse_time(text, only_date=False):
     now = datetime.now()
+    fmt = "%Y-%m-%d" if only_date else "%Y-%m-%d %H:%M:%S"
     try:
         text_cleaned = text.replace("號", "号").replace("日", "号")
 
         # 优先判断有没有用户明确说出“几月几日”或“几号”
-        zh_date_match = re.search(r"(\d{1,2})月(\d{1,2})[号日]?", text_cleaned)
+        zh_date_match = _ZH_DATE_RE.search(text_cleaned)
         if zh_date_match:
-            print("✅ 明确中文日期:", zh_date_match.group(0))
+            log_event(logging.DEBUG, "parse_time", path="zh_date", match=zh_date_match.group(0))
             month = int(zh_date_match.group(1))
             day = int(zh_date_match.group(2))
             year = now.year
@@ -201,17 +1441,12 @@ def parse_time(text, only_date=False):
             if parsed < now and allow_next_year:
                 parsed = parsed.replace(year=year + 1)
 
-            return parsed.strftime("%Y-%m-%d") if only_date else parsed.strftime("%Y-%m-%d %H:%M:%S")
+            return parsed.strftime(fmt)
 
         # 手动检测英文日期格式 like "23 June" or "June 23"
-        en_date_match = re.search(
-            r'(?:(\d{1,2})(?:st|nd|rd|th)?\s+(January|February|March|April|May|June|July|August|September|October|November|December)|'  # 24 June
-            r'(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(?:st|nd|rd|th)?)',
-            text,
-            re.IGNORECASE
-        )
+        en_date_match = _EN_DATE_RE.search(text)
         if en_date_match:
-            print("📝 手动匹配英文日期:", en_date_match.group(0))
+            log_event(logging.DEBUG, "parse_time", path="en_date", match=en_date_match.group(0))
             if en_date_match.group(1) and en_date_match.group(2):  # case: 24 June
                 day = int(en_date_match.group(1))
                 month_str = en_date_match.group(2)
@@ -229,21 +1464,23 @@ def parse_time(text, only_date=False):
             if parsed < now and not is_delete:
                 parsed = parsed.replace(year=year + 1)
 
-            return parsed.strftime("%Y-%m-%d") if only_date else parsed.strftime("%Y-%m-%d %H:%M:%S")
+            return parsed.strftime(fmt)
 
+        # ⚡ 今天/明天/后天 + 可选“N点”，或只有“晚上N点”之类：不经过 dateparser
+        relative_dt = _parse_relative_day(text, text_cleaned, now) or _parse_bare_hour(text_cleaned, now)
+        if relative_dt:
+            return relative_dt.strftime(fmt)
 
         # ✅ 使用 search_dates 解析
-        parsed_result = search_dates(text_cleaned, languages=['zh', 'en'], settings={
-            'PREFER_DATES_FROM': 'future',
-            'RELATIVE_BASE': now
-        })
-        print("🧠 search_dates解析:", parsed_result)
+        get_model("dateparser")
+        parsed_result = search_dates(text_cleaned, languages=['zh', 'en'], settings=_DATEPARSER_SETTINGS)
+        log_event(logging.DEBUG, "parse_time", path="search_dates", result=parsed_result)
 
         if parsed_result:
             matched_text, dt = parsed_result[0]
 
             # ✅ 新增：识别“几点”并手动修正时间
-            hour_match = re.search(r"(晚上|下午)?(\d{1,2})点", text)
+            hour_match = _HOUR_RE.search(text)
             if hour_match:
                 hour = int(hour_match.group(2))
                 if hour < 12 and hour_match.group(1) in ["晚上", "下午"]:
@@ -252,10 +1489,7 @@ def parse_time(text, only_date=False):
 
             is_delete = any(word in text.lower() for word in ["delete", "刪除", "删除"])
             # 如果没明确日期，就用今天 +1 推理；否则用原解析时间
-            has_explicit_date = bool(re.search(
-                r"(\d{1,2})月(\d{1,2})[号日]?|today|tomorrow|[0-9]{1,2} [A-Za-z]+|明天|后天",
-                matched_text.lower()
-            ))
+            has_explicit_date = bool(_EXPLICIT_DATE_RE.search(matched_text.lower()))
             if not has_explicit_date:
                 dt = dt.replace(year=now.year, month=now.month, day=now.day)
                 if dt < now and "今天" not in text and "today" not in text.lower():
@@ -263,292 +1497,1554 @@ def parse_time(text, only_date=False):
             elif not is_delete and dt < now:
                 dt = dt.replace(year=now.year + 1)
 
-            return dt.strftime("%Y-%m-%d") if only_date else dt.strftime("%Y-%m-%d %H:%M:%S")
+            return dt.strftime(fmt)
 
         # 🔁 fallback：dateparser 处理马来文或其他
-        fallback_dt = dateparser.parse(text_cleaned, settings={
-            'PREFER_DATES_FROM': 'future',
-            'RELATIVE_BASE': now
-        })
+        fallback_dt = dateparser.parse(text_cleaned, settings=_DATEPARSER_SETTINGS)
         if fallback_dt:
-            print("📦 fallback dateparser解析:", fallback_dt)
-            return fallback_dt.strftime("%Y-%m-%d") if only_date else fallback_dt.strftime("%Y-%m-%d %H:%M:%S")
+            log_event(logging.DEBUG, "parse_time", path="dateparser", result=fallback_dt)
+            return fallback_dt.strftime(fmt)
 
     except Exception as e:
-        print("❌ parse_time error:", str(e))
+        log_event(logging.WARNING, "parse_time_error", error=str(e))
 
     return None
 
-def to_simplified(text):
-    replacements = {
-        "讀": "读",
-        "學": "学",
-        "寫": "写",
-        "說": "说",
-        "會議": "会议",
-        "備忘錄": "备忘录",
-        "開會": "开会",
-        "聽": "听",
-        "訊息": "信息",
-        "電腦": "电脑",
-        "報告": "报告",
-        "設計": "设计",
-        "書": "书",
-        "請": "请",
-        "刪除": "删除",
-        "取消": "取消",
-        "安排": "安排",
-        "事情": "事情",
-        "行程": "行程",
-        "活動": "活动",
-        "聯絡": "联络",
-        "討論": "讨论",
-        "報名": "报名",
-        "練習": "练习",
-        "報到": "报到",
-        "系統": "系统",
-        "頁面": "页面",
-        "功能": "功能",
-        "分類": "分类",
-        "訊號": "信号",
-        "開始": "开始",
-        "結束": "结束",
-        "備份": "备份",
-        "簡報": "简报",
-        "提醒": "提醒",
-        "紀錄": "记录",
-        "備註": "备注",
-        "檔案": "文件",
-        "選項": "选项",
-        "設定": "设置",
-        "日曆": "日历",
-        "標題": "标题",
-        "檢查": "检查",
-        "號": "号",
-        "報": "报",
-        "點": "点",
-        "郵件": "邮件",
-        "客戶": "客户",
-        "任務": "任务"
-        # 👉 你可以继续加常用词
-    }
-    for traditional, simplified in replacements.items():
-        text = text.replace(traditional, simplified)
-    return text
-# 音频转录功能
-@app.route("/transcribe", methods=["POST"])
-def transcribe():
-    user_id = request.form.get('user_id')  # 从 FormData 获取
-    if not user_id:
-        return jsonify({"error": "Missing user_id"}), 400
+# ---------------- 繁体 ➜ 简体 ----------------
+# 词表见 data/t2s/（OpenCC 字表 + 词表 + 项目自定义），首次调用时编译一次：
+# 字级映射逐字一对一（位置不变）；多字词编译成前缀树形式的正则做最长匹配，命中处用词表结果覆盖。
+# 短文本直接用 str.translate + 正则扫描；长文本改为 NumPy 按码位向量化查表，
+# 并用相邻两字的哈希表筛出候选位置，只在候选处调用正则。
+T2S_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "t2s")
+T2S_FILES = ["TSCharacters.txt", "TSPhrases.txt", "custom.txt"]  # 后面的文件覆盖前面的
+
+_t2s_converter = None
+_t2s_lock = threading.Lock()
+
+
+def load_t2s_table(data_dir=T2S_DATA_DIR, files=T2S_FILES):
+    table = {}
+    for name in files:
+        path = os.path.join(data_dir, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                traditional, _, simplified = line.rstrip("\n").partition("\t")
+                if simplified:
+                    table[traditional] = simplified.split(" ")[0]
+    return table
+
+
+def _trie_pattern(words):
+    # ["會議", "會計"] ➜ 會(?:議|計)；前缀本身也是词时子树变为可选，贪婪匹配即最长匹配
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return body + "?" if len(branches) == 1 and len(branches[0]) == 1 else "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+_T2S_HASH_BITS = 16
+_T2S_VECTORIZE_MIN_CHARS = 200  # 低于此长度时 NumPy 调用开销大于收益
+
+
+def _bigram_hash(first, second):
+    # first/second 为码位（int 或 uint32 数组，数组乘法按 32 位回绕，低位结果与 int 一致）
+    return ((first * 2654435761) ^ second) & ((1 << _T2S_HASH_BITS) - 1)
+
+
+def build_t2s_converter(table):
+    chars = {ord(k): ord(v) for k, v in table.items() if len(k) == 1 and len(v) == 1}
+    code_table = np.arange(max(chars, default=0) + 1, dtype=np.uint32)
+    code_table[list(chars)] = list(chars.values())
+    phrases = {k: v for k, v in table.items() if len(k) > 1}
+    phrase_pattern = re.compile(_trie_pattern(phrases)) if phrases else None
+    # 多字词前两个字的哈希；哈希未命中的位置不可能是词的开头
+    phrase_heads = np.zeros(1 << _T2S_HASH_BITS, dtype=bool)
+    for k in phrases:
+        phrase_heads[_bigram_hash(ord(k[0]), ord(k[1]))] = True
+
+    def convert_short(text):
+        converted = text.translate(chars)
+        if phrase_pattern is None:
+            return converted
+        pieces = []
+        pos = 0
+        for m in phrase_pattern.finditer(text):
+            pieces.append(converted[pos:m.start()])
+            pieces.append(phrases[m.group()])
+            pos = m.end()
+        if not pieces:
+            return converted
+        pieces.append(converted[pos:])
+        return "".join(pieces)
+
+    def convert(text):
+        if len(text) < _T2S_VECTORIZE_MIN_CHARS:
+            return convert_short(text)
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        try:
+            mapped = code_table[codes]
+        except IndexError:  # 超出字表范围的字（如 emoji）保持不变
+            inside = codes < code_table.size
+            mapped = np.where(inside, code_table[np.where(inside, codes, 0)], codes)
+        converted = mapped.tobytes().decode("utf-32-le")
+        if phrase_pattern is None:
+            return converted
+
+        pieces = []
+        pos = 0
+        for start in np.flatnonzero(phrase_heads[_bigram_hash(codes[:-1], codes[1:])]).tolist():
+            if start < pos:
+                continue
+            m = phrase_pattern.match(text, start)
+            if m:
+                pieces.append(converted[pos:start])
+                pieces.append(phrases[m.group()])
+                pos = m.end()
+        if not pieces:
+            return converted
+        pieces.append(converted[pos:])
+        return "".join(pieces)
+
+    return convert
 
-    print("Received request:", request)
-    if "file" not in request.files:
-        print("No file part")
-        return jsonify({"error": "No file part"}), 400
-    file = request.files["file"]
-    print("Received file:", file.filename)
-
-    if file.filename == "":
-        return jsonify({"error": "No selected file"}), 400
 
+def to_simplified(text):
+    global _t2s_converter
+    if _t2s_converter is None:
+        with _t2s_lock:
+            if _t2s_converter is None:
+                _t2s_converter = build_t2s_converter(load_t2s_table())
+    return _t2s_converter(text)
+
+
+# ---------------- 结果缓存 ----------------
+# 两级缓存：进程内 LRU + 可选的 SQLite 文件（WAL 模式，多个 gunicorn worker 共享）。
+# 两级都按条目数上限和存活时间淘汰；值以 JSON 保存。
+class ResultCache:
+    def __init__(self, name, size, ttl, disk_path=None, disk_max_entries=10000):
+        self.name = name
+        self.size = size
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()  # key ➜ (过期时间, 值)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def _connect(self):
+        # 每个线程各自一个连接；fork 后的子进程不能沿用父进程的连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.disk_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, value, expires):
+        with self._lock:
+            self._memory[key] = (expires, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.size:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        if self.disk_path:
+            try:
+                conn = self._connect()
+                row = conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+                if row and row[1] + self.ttl >= now:
+                    conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1] + self.ttl)  # 过期时间仍从写入时刻算起
+                    self._count("disk_hits")
+                    return value
+            except sqlite3.Error as e:
+                log_event(logging.WARNING, "cache_disk_error", cache=self.name, error=str(e))
+
+        self._count("misses")
+        return None
+
+    def put(self, key, value):
+        now = time.time()
+        self._remember(key, value, now + self.ttl)
+        self._count("stores")
+        if not self.disk_path:
+            return
+        try:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(value, ensure_ascii=False), now, now))
+            conn.execute("DELETE FROM cache WHERE created < ?", (now - self.ttl,))
+            conn.execute("DELETE FROM cache WHERE key IN "
+                         "(SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                         (self.disk_max_entries,))
+        except sqlite3.Error as e:
+            log_event(logging.WARNING, "cache_disk_error", cache=self.name, error=str(e))
+
+    def info(self):
+        with self._lock:
+            stats = dict(self.stats)
+            memory_entries = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        hits = lookups - stats["misses"]
+        return {**stats, "memory_entries": memory_entries, "disk": bool(self.disk_path),
+                "hit_rate": round(hits / lookups, 3) if lookups else None}
+
+
+# 转录缓存：键为上传音频字节的 SHA-256 + 模型名 + 后端 + temperature，值为 {"text": Whisper 原始文本,
+# "language": 解码时的语言提示}。键里不含语言提示和提示词：用户的语言画像变得有把握或改变之后，
+# 同一片段的重试仍然命中。客户端重试 / 重复上传同一片段时跳过解码和 Whisper，直接进入分类与时间解析。
+# TRANSCRIBE_CACHE_SIZE：进程内条目数（0 表示不在进程内缓存）；TRANSCRIBE_CACHE_TTL：存活秒数；
+# TRANSCRIBE_CACHE_DB：SQLite 文件路径，设置后启用磁盘层；TRANSCRIBE_CACHE_DISK_MAX：磁盘层条目上限。
+TRANSCRIBE_CACHE_SIZE = int(os.environ.get("TRANSCRIBE_CACHE_SIZE", 256))
+TRANSCRIBE_CACHE_TTL = float(os.environ.get("TRANSCRIBE_CACHE_TTL", 24 * 3600))
+TRANSCRIBE_CACHE_DB = os.environ.get("TRANSCRIBE_CACHE_DB") or None
+TRANSCRIBE_CACHE_DISK_MAX = int(os.environ.get("TRANSCRIBE_CACHE_DISK_MAX", 10000))
+
+transcription_cache = ResultCache("transcription", TRANSCRIBE_CACHE_SIZE, TRANSCRIBE_CACHE_TTL,
+                                  TRANSCRIBE_CACHE_DB, TRANSCRIBE_CACHE_DISK_MAX)
+
+
+def transcription_cache_key(data):
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps({"model": WHISPER_MODEL_NAME, "backend": WHISPER_BACKEND,
+                              "temperature": WHISPER_TEMPERATURES}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def cache_transcription(cache_key, transcription, options):
+    transcription_cache.put(cache_key, {"text": transcription, "language": options.get("language")})
+
+
+# 日视图缓存：Query_Today / Query_Tomorrow / Query_Custom 查询某个用户某一天的任务，是最常见的语音查询。
+# 读穿缓存，键为 (userID, 日期, memo_day_version 中该天的版本号)：先按主键读一行版本号，命中即返回，
+# 否则查 memo 后写入。保存 / 删除由触发器递增对应那天的版本号，精确失效，其他用户和日期不受影响。
+# DAY_VIEW_CACHE_SIZE：进程内条目数；DAY_VIEW_CACHE_DB：SQLite 文件路径，设置后各 worker 共享；
+# 非 SQLite 数据库没有版本表，直接查库。
+DAY_VIEW_CACHE_SIZE = int(os.environ.get("DAY_VIEW_CACHE_SIZE", 2048))
+DAY_VIEW_CACHE_TTL = float(os.environ.get("DAY_VIEW_CACHE_TTL", 3600))
+DAY_VIEW_CACHE_DB = os.environ.get("DAY_VIEW_CACHE_DB") or None
+DAY_VIEW_CACHE_DISK_MAX = int(os.environ.get("DAY_VIEW_CACHE_DISK_MAX", 10000))
+
+day_view_cache = ResultCache("day_view", DAY_VIEW_CACHE_SIZE, DAY_VIEW_CACHE_TTL,
+                             DAY_VIEW_CACHE_DB, DAY_VIEW_CACHE_DISK_MAX)
+
+
+def query_day_tasks(user_id, day):
+    start, end = day_range(day)
+    rows = db.session.execute(
+        db.select(Memo.text, Memo.category, Memo.timestamp)
+        .where(Memo.userID == user_id, Memo.timestamp >= start, Memo.timestamp < end)
+        .order_by(Memo.timestamp, Memo.id)
+    ).all()
+    return [{"text": row.text, "category": row.category, "timestamp": format_memo_timestamp(row.timestamp)}
+            for row in rows]
+
+
+def day_tasks(user_id, day):
+    user_key = request_int(user_id)
+    if user_key is None or db.engine.dialect.name != "sqlite":
+        return query_day_tasks(user_id, day)
+    day_str = day.strftime("%Y-%m-%d")
+    version = db.session.execute(
+        db.text("SELECT version FROM memo_day_version WHERE userID = :user_id AND day = :day"),
+        {"user_id": user_key, "day": day_str}
+    ).scalar() or 0
+    key = f"{user_key}|{day_str}|{version}"
+    tasks = day_view_cache.get(key)
+    if tasks is None:
+        tasks = query_day_tasks(user_key, day)
+        day_view_cache.put(key, tasks)
+    return tasks
+
+
+# Whisper 需要 16 kHz 单声道 float32
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+
+
+def _decode_wav_native(data):
+    # 已是 16 kHz 的 PCM WAV ➜ 直接转 NumPy，不启动 ffmpeg；其他情况返回 None
     try:
-        # 保存上传音频
-        original_ext = file.filename.split('.')[-1]
-        original_filename = f"{uuid.uuid4()}.{original_ext}"
-        original_path = os.path.join(UPLOAD_FOLDER, original_filename)
-        file.save(original_path)
-        print(f"Uploaded file saved as: {original_path}")
-
-        # 转为 WAV 格式
-        if original_ext.lower() != 'wav':
-            audio = AudioSegment.from_file(original_path)
-            wav_filename = f"{uuid.uuid4()}.wav"
-            wav_path = os.path.join(UPLOAD_FOLDER, wav_filename)
-            audio.export(wav_path, format="wav")
-            print(f"Converted to WAV: {wav_path}")
-        else:
-            wav_path = original_path
+        with wave.open(io.BytesIO(data)) as wav:
+            if wav.getframerate() != SAMPLE_RATE or wav.getsampwidth() != 2:
+                return None
+            channels = wav.getnchannels()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    audio = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    return audio
+
+
+def _decode_with_ffmpeg(data, ext):
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+           "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError:
+        # moov 在文件末尾的 m4a/mp4 无法从管道读取 ➜ 退回临时文件，解码后立即删除
+        with tempfile.NamedTemporaryFile(suffix=f".{ext}") as tmp:
+            tmp.write(data)
+            tmp.flush()
+            cmd[cmd.index("pipe:0")] = tmp.name
+            out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(out, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def decode_audio(data, ext):
+    audio = _decode_wav_native(data) if ext.lower() == "wav" else None
+    if audio is None:
+        audio = _decode_with_ffmpeg(data, ext)
+    return audio
+
+
+def _keep_upload_files(data, ext, audio):
+    base = str(uuid.uuid4())
+    original_path = os.path.join(UPLOAD_FOLDER, f"{base}.{ext}")
+    with open(original_path, "wb") as f:
+        f.write(data)
+    wav_path = os.path.join(UPLOAD_FOLDER, f"{base}.16k.wav")
+    with wave.open(wav_path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+    log_event(logging.DEBUG, "upload_kept", original=original_path, decoded=wav_path)
+
+
+def read_upload(file):
+    ext = file.filename.split('.')[-1]
+    with trace_stage("upload"):
+        data = file.read()
+    return data, ext
+
+
+# 上传音频 ➜ 16 kHz 单声道 float32 数组（全程不落盘）
+def decode_upload(data, ext):
+    with trace_stage("decode"):
+        audio = decode_audio(data, ext)
+    if KEEP_UPLOADS:
+        with trace_stage("upload_save"):
+            _keep_upload_files(data, ext, audio)
+    return audio
+
+
+# ---------------- 语音活动检测（VAD） ----------------
+# 解码后、送入 Whisper 前，按 30 ms 帧计算能量（dBFS）和过零率：能量明显高于底噪的帧，
+# 以及能量略高但过零率高的帧（清辅音）视为语音；去掉过短的杂音后向两侧各扩展 VAD_PADDING_MS，
+# 只保留这些区间并拼接起来。整段都没有语音时直接返回 422，不调用 Whisper。
+# 平稳噪声（白噪声、电源哼声、空调声）各帧能量几乎相同，底噪本身就超过阈值，所以先看能量起伏：
+# 最响的 VAD_MIN_SPEECH_MS 与底噪相差不到 VAD_MIN_SPREAD_DB 时整段视为无语音。
+# 语音即使连续不断，音节、停顿之间的起伏也远大于此；信噪比低于这个值的录音同样会被拒绝。
+# 静音越少，Whisper 解码越快，也越不容易在静音上“幻听”出文字。VAD=0 关闭。
+VAD_ENABLED = os.environ.get("VAD", "1") != "0"
+VAD_FRAME_MS = 30
+VAD_PADDING_MS = int(os.environ.get("VAD_PADDING_MS", 200))
+VAD_MIN_SPEECH_MS = int(os.environ.get("VAD_MIN_SPEECH_MS", 250))
+VAD_MIN_DB = -50.0       # 低于此能量一律视为静音
+VAD_ABOVE_FLOOR_DB = 12.0  # 相对底噪（能量第 10 百分位）
+VAD_BELOW_PEAK_DB = 20.0   # 持续说话时底噪即语音，阈值不高于峰值以下 20 dB
+VAD_ZCR_MIN = 0.25
+VAD_MIN_SPREAD_DB = float(os.environ.get("VAD_MIN_SPREAD_DB", 6))
+
+_vad_stats = {"clips": 0, "rejected": 0, "audio_seconds": 0.0, "speech_seconds": 0.0,
+              "decode_saved_seconds_est": 0.0}
+_vad_stats_lock = threading.Lock()  # gthread 下多个请求线程同时累加
+
+
+def _mask_runs(mask):
+    # 连续 True 的区间 [start, end)
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+
+def detect_speech(audio):
+    # 返回语音区间（样本下标）列表
+    frame = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    n = len(audio) // frame
+    if n == 0:
+        return []
+    frames = audio[:n * frame].reshape(n, frame)
+    energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    zcr = np.mean(np.abs(np.diff(np.signbit(frames), axis=1)), axis=1)
+
+    floor = np.percentile(energy, 10)
+    min_frames = max(1, VAD_MIN_SPEECH_MS // VAD_FRAME_MS)
+    k = min(n, min_frames)
+    if np.partition(energy, n - k)[n - k] - floor < VAD_MIN_SPREAD_DB:
+        return []
+    threshold = max(min(floor + VAD_ABOVE_FLOOR_DB, energy.max() - VAD_BELOW_PEAK_DB), VAD_MIN_DB)
+    # 过零率高的弱帧（清辅音）也要高出底噪，否则白噪声这类过零率本来就高的底噪会整段算作语音
+    weak_floor = max(threshold - VAD_ABOVE_FLOOR_DB / 2, floor + VAD_MIN_SPREAD_DB / 2, VAD_MIN_DB)
+    speech = (energy > threshold) | ((energy > weak_floor) & (zcr > VAD_ZCR_MIN))
+
+    for start, end in _mask_runs(speech):
+        if end - start < min_frames:
+            speech[start:end] = False
+    if not speech.any():
+        return []
+
+    pad = VAD_PADDING_MS // VAD_FRAME_MS
+    if pad:
+        speech = np.convolve(speech, np.ones(2 * pad + 1), mode="same") > 0
+    return [(int(start) * frame, min(int(end) * frame, len(audio))) for start, end in _mask_runs(speech)]
+
+
+def trim_silence(audio):
+    """返回 (裁剪后的音频 或 None（无语音）, 报告)。"""
+    audio_seconds = len(audio) / SAMPLE_RATE
+    if not VAD_ENABLED:
+        return audio, None
+    with trace_stage("vad"):
+        segments = detect_speech(audio)
+    speech = np.concatenate([audio[start:end] for start, end in segments]) if segments else None
+    speech_seconds = len(speech) / SAMPLE_RATE if speech is not None else 0.0
+
+    with _vad_stats_lock:
+        _vad_stats["clips"] += 1
+        _vad_stats["audio_seconds"] += audio_seconds
+        _vad_stats["speech_seconds"] += speech_seconds
+        if speech is None:
+            _vad_stats["rejected"] += 1
+    report = {
+        "audio_seconds": round(audio_seconds, 2),
+        "speech_seconds": round(speech_seconds, 2),
+        "segments": len(segments),
+        "trimmed_ratio": round(1 - speech_seconds / audio_seconds, 3) if audio_seconds else 0.0,
+    }
+    log_event(logging.DEBUG, "vad", **report)
+    return speech, report
+
+
+def estimate_vad_savings(report, whisper_seconds):
+    # 按本次解码的每秒耗时估算被裁掉的音频本来要花的解码时间
+    if not report or not report["speech_seconds"]:
+        return
+    trimmed_seconds = report["audio_seconds"] - report["speech_seconds"]
+    saved = whisper_seconds / report["speech_seconds"] * trimmed_seconds
+    report["decode_saved_ms_est"] = round(saved * 1000, 1)
+    with _vad_stats_lock:
+        _vad_stats["decode_saved_seconds_est"] += saved
+
+
+def vad_stats():
+    with _vad_stats_lock:
+        stats = dict(_vad_stats)
+    audio_seconds = stats["audio_seconds"]
+    return {
+        "enabled": VAD_ENABLED,
+        **{k: round(v, 2) if isinstance(v, float) else v for k, v in stats.items()},
+        "trimmed_ratio": round(1 - stats["speech_seconds"] / audio_seconds, 3) if audio_seconds else None,
+    }
 
-        # 使用 Whisper 识别语音
-        result = model.transcribe(wav_path)
-        transcription = result["text"].strip()
-        print("Transcription result:", transcription)
-        # ✅ 繁体转简体（一定要在分类模型之前做）
-        transcription = to_simplified(transcription)
-        print("✅ Simplified transcription:", transcription)
 
+# ---------------- Whisper 解码参数 ----------------
+# 用户基本固定说普通话或英语：按 user_id 记录最近几次识别结果的语言（detect_language 判定的文本语言），
+# 同一语言占比足够高时直接传 language=，跳过 Whisper 自带的语言检测，并附上该语言的备忘录指令示例
+# 作为 initial_prompt（用词、标点和简体输出更稳定）。没有把握时不传语言，也不加提示词。
+# temperature 回退（输出重复或置信度低时升温重解）最多 len(WHISPER_TEMPERATURES) - 1 次，原版默认最多 5 次。
+# fp16 由 Torch 后端固定为 False（CPU 上不支持，只会告警后回退）；CTranslate2 后端不接受 fp16 参数。
+# 画像只保存在当前进程内存中，各 worker 分别学习。
+WHISPER_TEMPERATURES = tuple(float(t) for t in os.environ.get("WHISPER_TEMPERATURES", "0.0,0.4").split(","))
+WHISPER_LANG_HISTORY = int(os.environ.get("WHISPER_LANG_HISTORY", 10))
+WHISPER_LANG_MIN_SAMPLES = int(os.environ.get("WHISPER_LANG_MIN_SAMPLES", 3))
+WHISPER_LANG_CONFIDENCE = float(os.environ.get("WHISPER_LANG_CONFIDENCE", 0.8))
+WHISPER_LANG_USERS = int(os.environ.get("WHISPER_LANG_USERS", 10000))
+WHISPER_PROMPTS = {
+    "zh": "以下是普通话的备忘录指令。明天下午三点开会。删除6月20号的任务。今天有什么安排？",
+    "en": "Memo commands. Remind me to call mom tomorrow at 3 pm. Delete the memo of June 23rd. What do I have today?",
+} if os.environ.get("WHISPER_PROMPT", "1") != "0" else {}
+
+
+class LanguageProfiles:
+    # user_id ➜ 最近 history 次识别的语言，按最近使用保留至多 max_users 个用户
+    def __init__(self, history=WHISPER_LANG_HISTORY, max_users=WHISPER_LANG_USERS):
+        self.history = history
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, user_id, language):
+        if not user_id or language not in ("zh", "en"):
+            return
+        with self._lock:
+            recent = self._users.pop(str(user_id), [])
+            self._users[str(user_id)] = (recent + [language])[-self.history:]
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def hint(self, user_id):
+        with self._lock:
+            recent = self._users.get(str(user_id), [])
+        return self._confident_language(recent)
+
+    @staticmethod
+    def _confident_language(recent):
+        if len(recent) < WHISPER_LANG_MIN_SAMPLES:
+            return None
+        language = max(set(recent), key=recent.count)
+        return language if recent.count(language) / len(recent) >= WHISPER_LANG_CONFIDENCE else None
+
+    def info(self):
+        with self._lock:
+            profiles = list(self._users.values())
+        return {"users": len(profiles), "confident": sum(1 for r in profiles if self._confident_language(r))}
+
+
+language_profiles = LanguageProfiles()
+# 有 / 无语言提示两组的解码耗时，按音频秒数归一化后比较
+_decode_stats = {hinted: {"clips": 0, "audio_seconds": 0.0, "decode_seconds": 0.0} for hinted in ("hinted", "unhinted")}
+_decode_stats_lock = threading.Lock()
+
+
+def whisper_options(language=None):
+    options = {"temperature": WHISPER_TEMPERATURES}
+    if language:
+        options["language"] = language
+        if language in WHISPER_PROMPTS:
+            options["initial_prompt"] = WHISPER_PROMPTS[language]
+    return options
+
+
+def record_decode(options, audio_seconds, decode_seconds):
+    stats = _decode_stats["hinted" if options.get("language") else "unhinted"]
+    with _decode_stats_lock:
+        stats["clips"] += 1
+        stats["audio_seconds"] += audio_seconds
+        stats["decode_seconds"] += decode_seconds
+
+
+def whisper_options_stats():
+    groups = {}
+    with _decode_stats_lock:
+        snapshot = {name: dict(stats) for name, stats in _decode_stats.items()}
+    for name, stats in snapshot.items():
+        rtf = stats["decode_seconds"] / stats["audio_seconds"] if stats["audio_seconds"] else None
+        groups[name] = {"clips": stats["clips"], "audio_seconds": round(stats["audio_seconds"], 1),
+                        "decode_seconds": round(stats["decode_seconds"], 2),
+                        "rtf": round(rtf, 4) if rtf is not None else None}
+    hinted, unhinted = groups["hinted"]["rtf"], groups["unhinted"]["rtf"]
+    return {
+        "temperatures": list(WHISPER_TEMPERATURES),
+        "prompts": sorted(WHISPER_PROMPTS),
+        "profiles": language_profiles.info(),
+        **groups,
+        # 按无提示组的 RTF 估算有提示的片段省下的解码时间
+        "decode_saved_seconds_est": round((unhinted - hinted) * groups["hinted"]["audio_seconds"], 2)
+        if hinted is not None and unhinted is not None else None,
+    }
 
-        # NLP模型分类（自动检测语种）
-        if re.search(r"[a-zA-Z]", transcription):  # 含有英文字母
-            doc = nlp_en(transcription)
-            print("🧠 使用英文模型")
-        else:
-            doc = nlp_zh(transcription)
-            print("🧠 使用中文模型")
 
-        print("Text category probabilities:", doc.cats)
-        category, prob = max(doc.cats.items(), key=lambda item: item[1])
-        print(f"Predicted category: {category}, Probability: {prob}")
-        # 删除类指令处理
-        if category == "Delete_Specific" or category == "Delete_All":
-            memo_time = parse_time(transcription)
-            print(f"🗑️ Delete request | Type: {category} | Time: {memo_time}")
-            print(f"[DEBUG] parse_time output: {memo_time}")
+# ---------------- Whisper 微批处理 ----------------
+# WHISPER_BATCH_WINDOW_MS：收集并发请求的时间窗口（毫秒），0 表示关闭
+# WHISPER_BATCH_MAX：单批最多片段数
+# 只有 ≤30 秒的片段参与批处理；更长的录音仍走 model.transcribe 的分段解码。
+# 同一进程内需要有并发请求（gunicorn --threads）才会凑成批次。
+WHISPER_BATCH_WINDOW_MS = float(os.environ.get("WHISPER_BATCH_WINDOW_MS", 0))
+WHISPER_BATCH_MAX = int(os.environ.get("WHISPER_BATCH_MAX", 8))
+
+# Whisper 解码会在模型上挂 kv-cache hook，同一模型不能被多个线程同时使用
+_whisper_lock = threading.Lock()
+_batch_queue = queue.Queue()
+_batch_thread = None
+_batch_thread_lock = threading.Lock()
+_batch_stats = {"batches": 0, "clips": 0, "size_histogram": {}, "added_latency_ms": []}
+_batch_stats_lock = threading.Lock()
+
+
+def _whisper_decode(audio, options):
+    # 返回 (文本, 解码秒数)；解码耗时只计拿到模型锁之后的部分，不含排队等锁
+    backend = get_model("whisper")
+    with _whisper_lock:
+        started = time.perf_counter()
+        result = backend.transcribe(audio, **options)
+        return result["text"], time.perf_counter() - started
+
+
+def _run_whisper_batch(items):
+    # 同一批的片段语言提示相同（见 _whisper_batch_loop），共用第一个片段的参数
+    # 返回 (各片段文本, 整批解码秒数)
+    backend = get_model("whisper")
+    # 和 run_whisper 一样先锁后占 CPU 名额：批处理线程的解码同样用满 WHISPER_THREADS，也要计入限流
+    with _whisper_lock, cpu_limiter.slot():
+        started = time.perf_counter()
+        texts = backend.decode_batch([item["audio"] for item in items], **items[0]["options"])
+        return texts, time.perf_counter() - started
+
+
+def _whisper_batch_loop():
+    window = WHISPER_BATCH_WINDOW_MS / 1000.0
+    while True:
+        items = [_batch_queue.get()]
+        deadline = time.monotonic() + window
+        while len(items) < WHISPER_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(_batch_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        started = time.monotonic()
+        # DecodingOptions 对整批生效，语言提示不同的片段分开解码
+        groups = {}
+        for item in items:
+            groups.setdefault(item["options"].get("language"), []).append(item)
+        for group in groups.values():
+            try:
+                texts, seconds = _run_whisper_batch(group)
+            except Exception as e:
+                texts, seconds = [e] * len(group), 0.0
+            # 整批的解码时间按音频长度分摊到各片段
+            total_samples = sum(len(item["audio"]) for item in group) or 1
+            for item, text in zip(group, texts):
+                item["result"] = text
+                item["decode_seconds"] = seconds * len(item["audio"]) / total_samples
+
+        size = len(items)
+        with _batch_stats_lock:
+            _batch_stats["batches"] += 1
+            _batch_stats["clips"] += size
+            _batch_stats["size_histogram"][size] = _batch_stats["size_histogram"].get(size, 0) + 1
+            latencies = _batch_stats["added_latency_ms"]
+            latencies.extend((started - item["enqueued"]) * 1000 for item in items)
+            del latencies[:-1000]  # 只保留最近 1000 个样本
+
+        for item in items:
+            item["done"].set()
+
+
+def _batched_whisper_decode(audio, options):
+    global _batch_thread
+    with _batch_thread_lock:
+        if _batch_thread is None:
+            _batch_thread = threading.Thread(target=_whisper_batch_loop, name="whisper-batcher", daemon=True)
+            _batch_thread.start()
+    item = {"audio": audio, "options": options, "enqueued": time.monotonic(), "done": threading.Event(),
+            "result": None, "decode_seconds": 0.0}
+    _batch_queue.put(item)
+    item["done"].wait()
+    if isinstance(item["result"], Exception):
+        raise item["result"]
+    return item["result"], item["decode_seconds"]
+
+
+def whisper_batch_stats():
+    with _batch_stats_lock:
+        latencies = sorted(_batch_stats["added_latency_ms"])
+        batches, clips = _batch_stats["batches"], _batch_stats["clips"]
+        histogram = dict(sorted(_batch_stats["size_histogram"].items()))
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2) if latencies else None
+    return {
+        "window_ms": WHISPER_BATCH_WINDOW_MS,
+        "max_batch": WHISPER_BATCH_MAX,
+        "batches": batches,
+        "clips": clips,
+        "size_histogram": histogram,
+        "added_latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": latencies[-1] if latencies else None},
+    }
 
-            keyword = extract_task_title(transcription) if category == "Delete_Specific" else None
 
-            if memo_time:
-                try:
-                    date_obj = datetime.strptime(memo_time, "%Y-%m-%d %H:%M:%S")
-                except:
-                    try:
-                        date_obj = datetime.strptime(memo_time, "%Y-%m-%d")
-                    except:
-                        date_obj = None
-            else:
-                date_obj = None
+# 使用 Whisper 识别语音，返回原始文本
+# vad：trim_silence 的报告，按本次解码耗时补上节省时间的估计
+def run_whisper(audio, options=None, vad=None):
+    options = options or whisper_options()
+    if WHISPER_BATCH_WINDOW_MS > 0 and len(audio) <= whisper.audio.N_SAMPLES:
+        # 解码在批处理线程里进行，请求线程只是等待结果，不占 CPU 名额
+        with trace_stage("whisper"):
+            transcription, decode_seconds = _batched_whisper_decode(audio, options)
+    else:
+        backend = get_model("whisper")
+        # 先等模型锁再占 CPU 名额：排队等锁的解码不占名额，不会挡住 textcat / 时间解析这些轻阶段
+        with _whisper_lock, cpu_stage("whisper"):
+            started = time.perf_counter()
+            transcription = backend.transcribe(audio, **options)["text"]
+            decode_seconds = time.perf_counter() - started
+    # 只用持锁后的解码时间：排队等锁、等 CPU 名额的时间不算进 RTF 和 VAD 节省估计
+    record_decode(options, len(audio) / SAMPLE_RATE, decode_seconds)
+    estimate_vad_savings(vad, decode_seconds)
+    transcription = transcription.strip()
+    log_event(logging.DEBUG, "whisper_result", text=transcription)
+    return transcription
+
+
+# 识别结果 ➜ 与 /transcribe 同步接口相同的 JSON（payload, status）
+# observe_language：是否计入用户的语言画像；缓存命中（客户端重试）不计，避免同一段录音反复计数
+def build_transcription_response(transcription, user_id, observe_language=True):
+    # ✅ 繁体转简体（一定要在分类模型之前做）
+    with trace_stage("to_simplified"):
+        transcription = to_simplified(transcription)
 
-            if date_obj:
-                start_datetime = date_obj.replace(hour=0, minute=0, second=0)
-                end_datetime = date_obj.replace(hour=23, minute=59, second=59)
-                keyword_for_php = None  # ✅ 如果有明确时间 ➜ 不传 keyword
-            else:
-                print("⚠️ 未识别出日期 ➜ 将使用关键词删除（全时间范围）")
-                start_datetime = datetime(2000, 1, 1)
-                end_datetime = datetime(2100, 12, 31)
-                keyword_for_php = keyword or transcription  # ✅ fallback 使用原句
-
-            print(f"🗑️ Delete time range: {start_datetime} to {end_datetime}")
-            print(f"🗑️ Keyword for PHP: {keyword_for_php}")
-
-            return jsonify({
-                "transcription": transcription,
-                "category": category,
-                "category_id": 0,
-                "is_query": False,
-                "need_confirm": True,
-                "pending_delete": {
-                    "start_time": start_datetime.strftime("%Y-%m-%d %H:%M:%S"),
-                    "end_time": end_datetime.strftime("%Y-%m-%d %H:%M:%S"),
-                    "keyword": keyword_for_php,
-                    "category": category
-                }
-            })
+    # NLP模型分类（自动检测语种）
+    analysis = analyze(transcription)
+    if observe_language:
+        language_profiles.observe(user_id, analysis.language)
+    category, prob = analysis.top
+    log_event(logging.DEBUG, "textcat", text=transcription, language=analysis.language, cats=analysis.cats,
+              category=category, prob=prob)
+    # 删除类指令处理
+    if analysis.intent == "delete":
+        memo_time = analysis.time
 
-        # 查询类问题处理（Query_Today、Query_Tomorrow、Query_Custom）
-        if category.startswith("Query_"):
-            def get_query_date(cat, text):
-                if cat == "Query_Today":
-                    return datetime.now().strftime("%Y-%m-%d")
-                elif cat == "Query_Tomorrow":
-                    return (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-                elif cat == "Query_Custom":
-                    parsed_time = parse_time(text)
-                    print(f"Custom query date from text: {parsed_time}")
-                    return parsed_time if parsed_time else datetime.now().strftime("%Y-%m-%d")
-                else:
-                    return datetime.now().strftime("%Y-%m-%d")
-            print("Original query:", transcription)
-            query_date = get_query_date(category, transcription)
-            print("Parsed query date:", query_date)
-            print(f"Query date resolved as: {query_date}")
-
-            # 查询数据库任务
-            try:
-                query_date_dt = datetime.strptime(query_date, "%Y-%m-%d %H:%M:%S")
-            except:
-                query_date_dt = datetime.now()
-
-            start_datetime = query_date_dt.replace(hour=0, minute=0, second=0)
-            end_datetime = query_date_dt.replace(hour=23, minute=59, second=59)
-
-            tasks = Memo.query.filter(
-                Memo.userID == user_id,
-                Memo.timestamp >= start_datetime,
-                Memo.timestamp <= end_datetime
-            ).all()
-            print("Querying tasks between", start_datetime, "and", end_datetime)
-            print("Tasks found:", tasks)
-            tasks_data = [
-                {"text": t.text, "category": t.category, "timestamp": t.timestamp}
-                for t in tasks
-            ]
-
-            return jsonify({
-                "transcription": transcription,
-                "category": category,
-                "category_id": 0,
-                "is_query": True,
-                "need_confirm": True,
-                "query_date": query_date,
-                "tasks": tasks_data
-            })
-
-        # 普通备忘录分类
-        category_map = {
-            "Study": 1,
-            "Work": 2,
-            "Daily": 3
-        }
-        category_id = category_map.get(category, 4)  # Others 为 4
-        memo_time = parse_time(transcription)
+        keyword = analysis.task_title if category == "Delete_Specific" else None
 
-        # 统一格式化时间（防止前端接收到中文“上午1:35:54”格式）
         if memo_time:
             try:
-                dt = datetime.strptime(memo_time, "%Y-%m-%d %H:%M:%S")
-            except ValueError:
+                date_obj = datetime.strptime(memo_time, "%Y-%m-%d %H:%M:%S")
+            except:
                 try:
-                    dt = datetime.strptime(memo_time, "%Y-%m-%d")
+                    date_obj = datetime.strptime(memo_time, "%Y-%m-%d")
                 except:
-                    dt = datetime.now()
+                    date_obj = None
+        else:
+            date_obj = None
+
+        if date_obj:
+            start_datetime = date_obj.replace(hour=0, minute=0, second=0)
+            end_datetime = date_obj.replace(hour=23, minute=59, second=59)
+            keyword_for_php = None  # ✅ 如果有明确时间 ➜ 不传 keyword
         else:
-            dt = datetime.now()
+            start_datetime = datetime(2000, 1, 1)
+            end_datetime = datetime(2100, 12, 31)
+            # ✅ Delete_Specific 没提取到任务标题时 fallback 使用原句；Delete_All 不带关键词，删除全部
+            keyword_for_php = None if category == "Delete_All" else keyword or transcription
 
-        formatted_time = dt.strftime("%Y-%m-%d %H:%M:%S")
-        iso_time = dt.isoformat()
+        log_event(logging.DEBUG, "delete_request", category=category, time=memo_time,
+                  start=start_datetime, end=end_datetime, keyword=keyword_for_php)
 
-        return jsonify({
+        return {
             "transcription": transcription,
             "category": category,
-            "category_id": category_id,
+            "category_id": 0,
             "is_query": False,
-            "time": memo_time,
-            "iso_time": iso_time
-        })
+            "need_confirm": True,
+            "pending_delete": {
+                "start_time": start_datetime.strftime("%Y-%m-%d %H:%M:%S"),
+                "end_time": end_datetime.strftime("%Y-%m-%d %H:%M:%S"),
+                "keyword": keyword_for_php,
+                "category": category
+            }
+        }, 200
+
+    # 查询类问题处理（Query_Today、Query_Tomorrow、Query_Custom）
+    if analysis.intent == "query":
+        def get_query_date(cat):
+            if cat == "Query_Today":
+                return datetime.now().strftime("%Y-%m-%d")
+            elif cat == "Query_Tomorrow":
+                return (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+            elif cat == "Query_Custom":
+                parsed_time = analysis.time
+                return parsed_time if parsed_time else datetime.now().strftime("%Y-%m-%d")
+            else:
+                return datetime.now().strftime("%Y-%m-%d")
+        query_date = get_query_date(category)
+
+        # 查询数据库任务（query_date 可能只有日期，也可能带时间）
+        query_date_dt = parse_memo_timestamp(query_date) or datetime.now()
+
+        with trace_stage("db_query"):
+            tasks_data = day_tasks(user_id, query_date_dt)
+        log_event(logging.DEBUG, "query_request", query_date=query_date, tasks=len(tasks_data))
+
+        return {
+            "transcription": transcription,
+            "category": category,
+            "category_id": 0,
+            "is_query": True,
+            "need_confirm": True,
+            "query_date": query_date,
+            "tasks": tasks_data
+        }, 200
+
+    # 普通备忘录分类
+    category_map = {
+        "Study": 1,
+        "Work": 2,
+        "Daily": 3
+    }
+    category_id = category_map.get(category, 4)  # Others 为 4
+    memo_time = analysis.time
+
+    # 统一格式化时间（防止前端接收到中文“上午1:35:54”格式）
+    if memo_time:
+        try:
+            dt = datetime.strptime(memo_time, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            try:
+                dt = datetime.strptime(memo_time, "%Y-%m-%d")
+            except:
+                dt = datetime.now()
+    else:
+        dt = datetime.now()
+
+    formatted_time = dt.strftime("%Y-%m-%d %H:%M:%S")
+    iso_time = dt.isoformat()
+
+    return {
+        "transcription": transcription,
+        "category": category,
+        "category_id": category_id,
+        "is_query": False,
+        "time": memo_time,
+        "iso_time": iso_time
+    }, 200
+
+
+# ---------------- 异步转录任务队列 ----------------
+# TRANSCRIBE_ASYNC=1 时才启用 async=1 请求；关闭时（默认）不创建进程池，每个 worker 不多 fork 子进程
+# TRANSCRIBE_WORKERS：每个 gunicorn worker 的进程池大小（每个进程各自持有已加载的 Whisper 模型）
+# TRANSCRIBE_QUEUE_SIZE：所有 worker 合计最多允许排队/执行中的任务数，超出返回 429
+# TRANSCRIBE_JOB_TTL：已完成任务的结果保留秒数；超过这个时间仍未完成的任务（所在 worker 已退出）一并清理
+# TRANSCRIBE_JOB_DB：任务状态与结果所在的 SQLite 文件，默认放在 instance 目录。
+#   任务由提交它的 worker 执行，但状态存放在这个共享文件里，GET /transcribe/<job_id> 落到任何 worker 都能查到。
+TRANSCRIBE_ASYNC = os.environ.get("TRANSCRIBE_ASYNC", "0").lower() in ("1", "true", "yes")
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", 2))
+TRANSCRIBE_QUEUE_SIZE = int(os.environ.get("TRANSCRIBE_QUEUE_SIZE", 16))
+TRANSCRIBE_JOB_TTL = int(os.environ.get("TRANSCRIBE_JOB_TTL", 600))
+TRANSCRIBE_JOB_DB = os.environ.get("TRANSCRIBE_JOB_DB") or os.path.join(app.instance_path, "transcribe_jobs.db")
+
+
+class TranscribeJobStore:
+    _COLUMNS = ("status", "submitted_at", "started_at", "decoded_at", "finished_at", "result", "http_status")
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connect(self):
+        # 与 ResultCache 相同：每个线程各自一个连接，fork 出的转录子进程重新连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS transcribe_job (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                         "submitted_at REAL NOT NULL, started_at REAL, decoded_at REAL, finished_at REAL, "
+                         "result TEXT, http_status INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_transcribe_job_status ON transcribe_job (status)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _expire(self, conn, now):
+        conn.execute("DELETE FROM transcribe_job WHERE COALESCE(finished_at, submitted_at) < ?", (now - self.ttl,))
+
+    def submit(self, job_id, now, limit):
+        # 在同一个写事务里清理过期任务、检查全局队列深度并登记，多个 worker 同时提交也不会超出上限
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            self._expire(conn, now)
+            depth = conn.execute("SELECT COUNT(*) FROM transcribe_job "
+                                 "WHERE status IN ('queued', 'running')").fetchone()[0]
+            if depth >= limit:
+                return False
+            conn.execute("INSERT INTO transcribe_job (job_id, status, submitted_at) VALUES (?, 'queued', ?)",
+                         (job_id, now))
+            return True
+
+    def add_done(self, job_id, now, result, http_status):
+        conn = self._connect()
+        self._expire(conn, now)
+        conn.execute("INSERT INTO transcribe_job VALUES (?, 'done', ?, ?, ?, ?, ?, ?)",
+                     (job_id, now, now, now, now, json.dumps(result, ensure_ascii=False), http_status))
+
+    def mark_running(self, job_id, started_at):
+        self._connect().execute("UPDATE transcribe_job SET status = 'running', started_at = ? WHERE job_id = ?",
+                                (started_at, job_id))
+
+    def finish(self, job_id, status, result, http_status, started_at=None, decoded_at=None):
+        self._connect().execute(
+            "UPDATE transcribe_job SET status = ?, result = ?, http_status = ?, started_at = COALESCE(?, started_at), "
+            "decoded_at = ?, finished_at = ? WHERE job_id = ?",
+            (status, json.dumps(result, ensure_ascii=False), http_status, started_at, decoded_at, time.time(), job_id))
+
+    def get(self, job_id):
+        row = self._connect().execute(f"SELECT {', '.join(self._COLUMNS)} FROM transcribe_job WHERE job_id = ?",
+                                      (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self._COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def info(self):
+        conn = self._connect()
+        depth = conn.execute("SELECT COUNT(*) FROM transcribe_job WHERE status IN ('queued', 'running')").fetchone()[0]
+        rows = conn.execute(f"SELECT {', '.join(self._COLUMNS)} FROM transcribe_job WHERE finished_at IS NOT NULL "
+                            "ORDER BY finished_at DESC LIMIT 20").fetchall()
+        return depth, [dict(zip(self._COLUMNS, row)) for row in reversed(rows)]
+
+
+transcribe_jobs = TranscribeJobStore(TRANSCRIBE_JOB_DB, TRANSCRIBE_JOB_TTL)
+_transcribe_pool = None
+_transcribe_post_pool = None  # 解码完成后的分类、时间解析、写库，不占用进程池的管理线程
+_transcribe_pool_lock = threading.Lock()
+_transcribe_stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0}  # 本 worker 的计数
+_transcribe_stats_lock = threading.Lock()
+
+
+def _count_transcribe_job(outcome):
+    with _transcribe_stats_lock:
+        _transcribe_stats[outcome] += 1
+
+
+def _transcribe_worker_init():
+    # fork 出来的子进程直接复用父进程里已加载的 model，只需限制线程数避免互相抢 CPU
+    global _whisper_lock
+    _whisper_lock = threading.Lock()  # fork 时锁可能正被批处理线程持有
+    torch.set_num_threads(1)
+
+
+def _transcribe_worker_run(job_id, audio, options):
+    # 子进程里没有批处理线程，直接解码
+    started_at = time.time()
+    transcribe_jobs.mark_running(job_id, started_at)
+    transcription, decode_seconds = _whisper_decode(audio, options)
+    return transcription.strip(), started_at, time.time(), decode_seconds
+
+
+def get_transcribe_pool():
+    # gunicorn 的 post_fork 中调用（见 gunicorn.conf.py），此时 worker 的请求线程还没启动；
+    # fork 方式下 ProcessPoolExecutor 在第一次 submit 时一次性 fork 出全部子进程，
+    # 所以这里立即提交一个空任务，让 fork 发生在单线程阶段，而不是某个请求线程里
+    global _transcribe_pool, _transcribe_post_pool
+    with _transcribe_pool_lock:
+        if _transcribe_pool is None:
+            if MODEL_LOADING == "eager":
+                get_model("whisper")  # 已在 master 中加载，子进程 fork 后直接共享
+            _transcribe_pool = ProcessPoolExecutor(
+                max_workers=TRANSCRIBE_WORKERS,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_transcribe_worker_init,
+            )
+            _transcribe_pool.submit(int).result()
+            _transcribe_post_pool = ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS,
+                                                       thread_name_prefix="transcribe-post")
+    return _transcribe_pool
+
+
+def _on_transcribe_job_done(job_id, user_id, cache_key, options, audio_seconds, vad, submitted_at, future):
+    # 在进程池的管理线程里被调用：这里只转交给后处理线程，管理线程立即回去收结果、派发新任务
+    _transcribe_post_pool.submit(_finish_transcribe_job, job_id, user_id, cache_key, options, audio_seconds, vad,
+                                 submitted_at, future)
+
+
+def _finish_transcribe_job(job_id, user_id, cache_key, options, audio_seconds, vad, submitted_at, future):
+    try:
+        transcription, started_at, decoded_at, decode_seconds = future.result()
+        record_decode(options, audio_seconds, decode_seconds)
+        estimate_vad_savings(vad, decode_seconds)
+        cache_transcription(cache_key, transcription, options)
+        with app.app_context():
+            start_trace("transcribe_async")
+            record_stage("queue_wait", started_at - submitted_at)
+            record_stage("whisper", decoded_at - started_at)
+            payload, status = build_transcription_response(transcription, user_id)
+            if vad:
+                payload["vad"] = vad  # 与同步接口一样附上 VAD 报告（含节省的解码时间估计）
+            log_event(logging.INFO, "transcribe_job_done", job_id=job_id, stages=trace_summary())
+        transcribe_jobs.finish(job_id, "done", payload, status, started_at, decoded_at)
+        _count_transcribe_job("done")
+    except Exception as e:
+        log_event(logging.ERROR, "transcribe_job_failed", job_id=job_id, exc_info=True)
+        try:
+            transcribe_jobs.finish(job_id, "failed", {"error": "Transcription failed."}, 500)
+        except sqlite3.Error:
+            log_event(logging.ERROR, "transcribe_job_store_failed", job_id=job_id, exc_info=True)
+        _count_transcribe_job("failed")
+
+
+def submit_transcribe_job(audio, user_id, cache_key, options, vad=None):
+    now = time.time()
+    job_id = str(uuid.uuid4())
+    if not transcribe_jobs.submit(job_id, now, TRANSCRIBE_QUEUE_SIZE):
+        _count_transcribe_job("rejected")
+        return None
+    _count_transcribe_job("submitted")
+    try:
+        future = get_transcribe_pool().submit(_transcribe_worker_run, job_id, audio, options)
+    except Exception:
+        # 例如 BrokenProcessPool：任务不会再执行，立即标记失败，不再占着全局队列名额
+        transcribe_jobs.finish(job_id, "failed", {"error": "Transcription failed."}, 500)
+        _count_transcribe_job("failed")
+        raise
+    audio_seconds = len(audio) / SAMPLE_RATE
+    vad = dict(vad) if vad else None  # 完成时补上节省估计，不改动已返回给客户端的报告
+    future.add_done_callback(
+        lambda f: _on_transcribe_job_done(job_id, user_id, cache_key, options, audio_seconds, vad, now, f)
+    )
+    return job_id
+
+
+def finish_cached_job(transcription, user_id):
+    # 缓存命中：直接生成一个已完成的任务，客户端照常用 job_id 取结果
+    payload, status = build_transcription_response(transcription, user_id, observe_language=False)
+    job_id = str(uuid.uuid4())
+    transcribe_jobs.add_done(job_id, time.time(), payload, status)
+    return job_id
+
+
+def _job_timing(job):
+    # queue_wait：排队等待；decode：Whisper 解码；total：提交到完成
+    def span(a, b):
+        return round(job[b] - job[a], 3) if job[a] and job[b] else None
+    return {
+        "queue_wait": span("submitted_at", "started_at"),
+        "decode": span("started_at", "decoded_at"),
+        "total": span("submitted_at", "finished_at"),
+    }
+
+
+def _transcribe_stats_snapshot():
+    with _transcribe_stats_lock:
+        return dict(_transcribe_stats)
+
+
+def transcribe_queue_stats():
+    if not TRANSCRIBE_ASYNC:
+        return {"enabled": False}
+    depth, finished = transcribe_jobs.info()
+    return {
+        "enabled": True,
+        "workers": TRANSCRIBE_WORKERS,
+        "queue_size": TRANSCRIBE_QUEUE_SIZE,
+        "depth": depth,
+        **_transcribe_stats_snapshot(),
+        "recent_timing": [_job_timing(job) for job in finished],
+    }
+
+
+# 音频转录功能
+@app.route("/transcribe", methods=["POST"])
+def transcribe():
+    user_id = request.form.get('user_id')  # 从 FormData 获取
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+
+    if "file" not in request.files:
+        return jsonify({"error": "No file part"}), 400
+    file = request.files["file"]
+    log_event(logging.DEBUG, "transcribe_upload", filename=file.filename, user_id=user_id)
+
+    if file.filename == "":
+        return jsonify({"error": "No selected file"}), 400
+
+    # async=1 ➜ 放入任务队列，立即返回 job_id
+    use_async = request.form.get("async", "").lower() in ("1", "true", "yes")
+    if use_async and not TRANSCRIBE_ASYNC:
+        return jsonify({"error": "Async transcription is not enabled."}), 501
+
+    try:
+        data, ext = read_upload(file)
+        cache_key = transcription_cache_key(data)
+        with trace_stage("cache_lookup"):
+            cached = transcription_cache.get(cache_key)
+        transcription = cached["text"] if cached else None
+
+        if use_async and transcription is not None:
+            return jsonify({"job_id": finish_cached_job(transcription, user_id), "status": "done"}), 202
+
+        vad = None
+        if transcription is None:
+            audio, vad = trim_silence(decode_upload(data, ext))
+            if audio is None:
+                return jsonify({"error": "No speech detected.", "vad": vad}), 422
+
+            options = whisper_options(language_profiles.hint(user_id))
+            if use_async:
+                job_id = submit_transcribe_job(audio, user_id, cache_key, options, vad)
+                if job_id is None:
+                    return jsonify({"error": "Transcription queue is full, retry later."}), 429
+                return jsonify({"job_id": job_id, "status": "queued", "vad": vad}), 202
+
+            transcription = run_whisper(audio, options, vad)
+            cache_transcription(cache_key, transcription, options)
+
+        payload, status = build_transcription_response(transcription, user_id, observe_language=cached is None)
+        if vad:
+            payload["vad"] = vad
+        return jsonify(payload), status
 
     except Exception as e:
-        print("Transcription failed:", str(e))
+        log_event(logging.ERROR, "transcribe_failed", exc_info=True)
         return jsonify({"error": "Transcription failed."}), 500
 
 
+# 查询异步转录任务状态；完成后返回与同步接口相同的 JSON
+@app.route("/transcribe/<job_id>", methods=["GET"])
+def transcribe_job_status(job_id):
+    job = transcribe_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id"}), 404
+
+    if job["result"] is None:
+        return jsonify({"job_id": job_id, "status": job["status"], "timing": _job_timing(job)}), 202
+
+    return jsonify({**job["result"], "job_id": job_id, "status": job["status"],
+                    "timing": _job_timing(job)}), job["http_status"]
+
+
+# ---------------- 流式转录 ----------------
+# POST /transcribe/stream?user_id=..&format=..，请求体为音频流（可用 chunked 传输边录边传）。
+# 音频经 ffmpeg 管道实时解码（format=pcm 表示 16 kHz 单声道 s16le，直接读取），每攒满一个
+# 30 秒窗口就交给 Whisper：窗口末尾 STREAM_OVERLAP_SECONDS 内结束的片段先不确认，连同剩余音频
+# 留到下一个窗口重新识别，避免把一句话切成两半。已确认的文本以 SSE 的 partial 事件推送，
+# 录音结束后对拼接好的全文做分类和时间解析（result 事件，内容与 /transcribe 相同）。
+# 内存中最多只保留一个窗口的音频，与录音总长度无关。
+# 容器需要支持顺序读取（wav / webm / ogg / mp3 / aac / 分片 mp4），普通 m4a 请走 /transcribe。
+STREAM_WINDOW_SECONDS = whisper.audio.CHUNK_LENGTH
+STREAM_OVERLAP_SECONDS = float(os.environ.get("STREAM_OVERLAP_SECONDS", 5))
+STREAM_READ_BYTES = 64 * 1024
+STREAM_PROMPT_CHARS = 200  # 上一窗口已确认文本的末尾作为下一窗口的 initial_prompt
+
+
+def _pcm_chunks(read):
+    # 按块读取 s16le 字节流，奇数字节留到下一块
+    leftover = b""
+    while True:
+        data = read(STREAM_READ_BYTES)
+        if not data:
+            break
+        data = leftover + data
+        usable = len(data) - len(data) % 2
+        leftover = data[usable:]
+        if usable:
+            yield np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def iter_stream_audio(stream, fmt):
+    # 上传流 ➜ 逐块产出 16 kHz 单声道 float32
+    if fmt == "pcm":
+        yield from _pcm_chunks(stream.read)
+        return
+
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+           "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def feed():
+        try:
+            while True:
+                data = stream.read(STREAM_READ_BYTES)
+                if not data:
+                    break
+                proc.stdin.write(data)
+        except (OSError, ValueError):
+            pass  # ffmpeg 已退出或客户端断开
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="stream-feeder", daemon=True)
+    feeder.start()
+    try:
+        yield from _pcm_chunks(proc.stdout.read)
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with {proc.returncode}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        feeder.join(timeout=1)
+
+
+def _transcribe_window(audio, prompt, options):
+    # 上一窗口的文本代替领域提示词作为 initial_prompt
+    backend = get_model("whisper")
+    options = {**options, "initial_prompt": prompt or options.get("initial_prompt")}
+    with _whisper_lock, cpu_stage("whisper"):  # 先锁后占名额，理由同 run_whisper
+        started = time.perf_counter()
+        result = backend.transcribe(audio, condition_on_previous_text=False, **options)
+        decode_seconds = time.perf_counter() - started
+    record_decode(options, len(audio) / SAMPLE_RATE, decode_seconds)
+    return result["segments"]
+
+
+def stream_transcribe(chunks, options=None):
+    # 逐个产出 (新确认的文本, 已确认到的音频秒数)
+    options = options or whisper_options()
+    window = int(STREAM_WINDOW_SECONDS * SAMPLE_RATE)
+    commit_limit = window - int(STREAM_OVERLAP_SECONDS * SAMPLE_RATE)
+    buffer = np.zeros(0, dtype=np.float32)
+    committed_samples = 0
+    prompt = ""
+
+    def decode(audio, final):
+        segments = _transcribe_window(audio, prompt, options)
+        if final:
+            return segments, len(audio)
+        keep = [seg for seg in segments if seg["end"] * SAMPLE_RATE <= commit_limit] or segments[:1]
+        consumed = int(keep[-1]["end"] * SAMPLE_RATE) if keep else commit_limit
+        return keep, min(max(consumed, SAMPLE_RATE), window)  # 每个窗口至少前进 1 秒
+
+    for chunk in chunks:
+        buffer = np.concatenate([buffer, chunk])
+        while len(buffer) >= window:
+            segments, consumed = decode(buffer[:window], final=False)
+            buffer = buffer[consumed:]
+            committed_samples += consumed
+            text = "".join(seg["text"] for seg in segments)
+            prompt = (prompt + text)[-STREAM_PROMPT_CHARS:]
+            yield text, committed_samples / SAMPLE_RATE
+
+    if len(buffer) >= SAMPLE_RATE // 10:
+        segments, consumed = decode(buffer, final=True)
+        yield "".join(seg["text"] for seg in segments), (committed_samples + consumed) / SAMPLE_RATE
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route("/transcribe/stream", methods=["POST"])
+def transcribe_stream():
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+    fmt = request.args.get("format", "").lower()
+    chunks = iter_stream_audio(request.stream, fmt)
+    options = whisper_options(language_profiles.hint(user_id))
+
+    def events():
+        pieces = []
+        audio_seconds = 0.0
+        try:
+            for text, audio_seconds in stream_transcribe(chunks, options):
+                pieces.append(text)
+                yield _sse("partial", {"text": text.strip(), "transcription": "".join(pieces).strip(),
+                                       "audio_seconds": round(audio_seconds, 2)})
+            payload, status = build_transcription_response("".join(pieces).strip(), user_id)
+            yield _sse("result", {**payload, "status": status})
+        except Exception:
+            log_event(logging.ERROR, "transcribe_stream_failed", exc_info=True)
+            yield _sse("error", {"error": "Transcription failed."})
+        finally:
+            chunks.close()
+            log_event(logging.INFO, "transcribe_stream_done", audio_seconds=round(audio_seconds, 2),
+                      windows=len(pieces), stages=trace_summary())
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# 运行状态：队列深度、拒绝数、每个任务的耗时
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "startup": _startup_report,
+        "memory_mb": memory_usage_mb(),
+        "transcribe_queue": transcribe_queue_stats(),
+        "whisper_batching": whisper_batch_stats(),
+        "language_cache": detect_language.cache_info()._asdict(),
+        "auth": {**auth_client.stats, "breaker": auth_client.breaker_state()},
+        "transcription_cache": transcription_cache.info(),
+        "day_view_cache": day_view_cache.info(),
+        "vad": vad_stats(),
+        "whisper_options": whisper_options_stats(),
+        "classifier": {"engine": CLASSIFIER_ENGINE, **classifier_cache.info()},
+        "cpu_limiter": cpu_limiter.info(),
+    })
+
+
+def _metric(name, kind, documentation, samples):
+    # samples: [(标签 dict, 值)]
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+        lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+    return lines
+
+
+# Prometheus 抓取入口：各阶段 / 整体请求耗时直方图，以及 /stats 中的主要计数器
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+    queue_stats = transcribe_queue_stats()
+    if queue_stats["enabled"]:
+        lines += _metric("whisper_app_transcribe_queue_depth", "gauge", "Queued or running async transcriptions.",
+                         [({}, queue_stats["depth"])])
+        lines += _metric("whisper_app_transcribe_jobs_total", "counter", "Async transcription jobs by outcome.",
+                         [({"outcome": k}, queue_stats[k]) for k in ("submitted", "rejected", "done", "failed")])
+    lines += _metric("whisper_app_whisper_batches_total", "counter", "Micro-batches decoded.",
+                     [({}, _batch_stats["batches"])])
+    lines += _metric("whisper_app_whisper_batched_clips_total", "counter", "Clips decoded in micro-batches.",
+                     [({}, _batch_stats["clips"])])
+    cache = detect_language.cache_info()
+    lines += _metric("whisper_app_language_cache_total", "counter", "Language detection cache lookups.",
+                     [({"result": "hit"}, cache.hits), ({"result": "miss"}, cache.misses)])
+    cache_stats = transcription_cache.stats
+    lines += _metric("whisper_app_transcription_cache_total", "counter", "Transcription cache lookups.",
+                     [({"result": "memory_hit"}, cache_stats["memory_hits"]),
+                      ({"result": "disk_hit"}, cache_stats["disk_hits"]),
+                      ({"result": "miss"}, cache_stats["misses"])])
+    day_stats = day_view_cache.stats
+    lines += _metric("whisper_app_day_view_cache_total", "counter", "Day view cache lookups.",
+                     [({"result": "memory_hit"}, day_stats["memory_hits"]),
+                      ({"result": "disk_hit"}, day_stats["disk_hits"]),
+                      ({"result": "miss"}, day_stats["misses"])])
+    lines += _metric("whisper_app_vad_clips_total", "counter", "Clips checked by VAD.",
+                     [({"outcome": "speech"}, _vad_stats["clips"] - _vad_stats["rejected"]),
+                      ({"outcome": "rejected"}, _vad_stats["rejected"])])
+    lines += _metric("whisper_app_vad_audio_seconds_total", "counter", "Audio seconds before and after VAD.",
+                     [({"kind": "input"}, round(_vad_stats["audio_seconds"], 3)),
+                      ({"kind": "speech"}, round(_vad_stats["speech_seconds"], 3))])
+    lines += _metric("whisper_app_vad_decode_saved_seconds_total", "counter",
+                     "Estimated Whisper decode time saved by VAD.",
+                     [({}, round(_vad_stats["decode_saved_seconds_est"], 3))])
+    lines += _metric("whisper_app_auth_total", "counter", "Login proxy outcomes.",
+                     [({"outcome": k}, v) for k, v in auth_client.stats.items()])
+    lines += _metric("whisper_app_auth_breaker_open", "gauge", "1 while the auth circuit breaker is open.",
+                     [({}, int(auth_client.breaker_state() == "open"))])
+    cpu = cpu_limiter.info()
+    lines += _metric("whisper_app_cpu_slots", "gauge", "CPU stage slots by state.",
+                     [({"state": "total"}, cpu["slots"]), ({"state": "in_use"}, cpu["in_use"]),
+                      ({"state": "waiting"}, cpu["waiting"])])
+    lines += _metric("whisper_app_cpu_wait_seconds_total", "counter", "Time spent waiting for a CPU stage slot.",
+                     [({}, cpu["wait_seconds"])])
+    lines += _metric("whisper_app_memory_mb", "gauge", "Process memory from smaps_rollup.",
+                     [({"kind": k}, v) for k, v in memory_usage_mb().items()])
+    return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+# ---------------- NumPy 分类引擎 ----------------
+# CLASSIFIER_ENGINE=numpy 时，textcat 不再逐层跑 thinc，而是把已训练的 TextCatEnsemble 权重
+# （BOW 稀疏线性层 + HashEmbed/Maxout 窗口编码 + 注意力池化 + 输出层）直接取成 NumPy 数组，
+# 整批文本一次性向量化计算；分词和特征 ID 仍用 spaCy 的 tokenizer 与 Doc.to_array，结果与 spaCy 一致
+# （校验见 benchmarks/check_textcat_parity.py）。预测按“规范化文本”缓存在 LRU 中，
+# 用户反复说的固定指令直接命中。默认 spacy，作为参考实现。
+CLASSIFIER_ENGINE = os.environ.get("CLASSIFIER_ENGINE", "spacy")
+CLASSIFIER_CACHE_SIZE = int(os.environ.get("CLASSIFIER_CACHE_SIZE", 4096))
+
+_MURMUR_C1 = np.uint32(0xcc9e2d51)
+_MURMUR_C2 = np.uint32(0x1b873593)
+
+
+def _rotl32(x, r):
+    return (x << np.uint32(r)) | (x >> np.uint32(32 - r))
+
+
+def murmurhash3_32_uint64(keys, seed):
+    # 与 thinc sparselinear 中的 MurmurHash3_x86_32_uint64 相同，对 uint64 数组逐元素计算
+    keys = np.asarray(keys, dtype=np.uint64)
+    h = np.full(keys.shape, seed, dtype=np.uint32)
+    for half in ((keys & np.uint64(0xffffffff)).astype(np.uint32), (keys >> np.uint64(32)).astype(np.uint32)):
+        k = _rotl32(half * _MURMUR_C1, 15) * _MURMUR_C2
+        h = _rotl32(h ^ k, 13) * np.uint32(5) + np.uint32(0xe6546b64)
+    h ^= np.uint32(8)
+    h ^= h >> np.uint32(16)
+    h *= np.uint32(0x85ebca6b)
+    h ^= h >> np.uint32(13)
+    h *= np.uint32(0xc2b2ae35)
+    h ^= h >> np.uint32(16)
+    return h
+
+
+class NumpyTextcat:
+    """spacy.TextCatEnsemble.v2（TextCatBOW.v3 + Tok2Vec.v2）的 NumPy 前向计算。"""
+
+    WINDOW_PAD = 2  # 与 MaxoutWindowEncoder 的 with_array(pad=2) 一致
+
+    def __init__(self, nlp, component="textcat_multilabel"):
+        from thinc.api import NumpyOps
+
+        pipe = nlp.get_pipe(component)
+        self.labels = list(pipe.labels)
+        self.make_doc = nlp.make_doc
+        self._hash = NumpyOps().hash
+
+        layers = {}
+        for layer in pipe.model.walk(order="dfs_pre"):
+            layers.setdefault(layer.name, []).append(layer)
+        try:
+            ngrams = layers["extract_ngrams"][0]
+            sparse = layers["sparse_linear"][0]
+            features = layers["extract_features"][0]
+            embeds = layers["hashembed"]
+            maxouts = layers["maxout"]
+            norms = layers["layernorm"]
+            windows = layers["expand_window"]
+            attention = layers["para-attn"][0]
+            output = layers["linear"][-1]
+        except (KeyError, IndexError):
+            raise ValueError(f"unsupported textcat architecture: {pipe.model.name}")
+        if ngrams.attrs["ngram_size"] != 1 or sparse.attrs.get("v1_indexing") or len(maxouts) != len(windows) + 2:
+            raise ValueError(f"unsupported textcat architecture: {pipe.model.name}")
+
+        self.bow_attr = ngrams.attrs["attr"]
+        self.bow_length = sparse.get_dim("length")
+        self.bow_W = sparse.get_param("W").reshape(len(self.labels), self.bow_length)
+        self.bow_b = sparse.get_param("b")
+        self.feature_columns = features.attrs["columns"]
+        self.embeds = [(layer.attrs["column"], layer.attrs["seed"], layer.get_param("E")) for layer in embeds]
+        # maxout 权重 (nO, nP, nI) 重排成 (nI, nP*nO)：X @ W 后每个 piece 是连续的一段列，逐段取最大值
+        self.maxouts = [
+            (m.get_param("W").transpose(1, 0, 2).reshape(-1, m.get_dim("nI")).T.copy(),
+             m.get_param("b").T.ravel(), m.get_dim("nP"), n.get_param("G"), n.get_param("b"))
+            for m, n in zip(maxouts, norms)
+        ]
+        self.window_size = windows[0].attrs["window_size"]
+        self.attention_Q = attention.get_param("Q")
+        self.output_W = output.get_param("W").T.copy()
+        self.output_b = output.get_param("b")
+
+    @staticmethod
+    def _maxout_norm(X, layer):
+        W, b, pieces, G, beta = layer
+        Y = X @ W + b
+        Y = np.maximum.reduce(np.split(Y, pieces, axis=1))
+        mu = Y.mean(axis=1, keepdims=True)
+        var = Y.var(axis=1, keepdims=True) + 1e-08
+        return (Y - mu) * var ** -0.5 * G + beta
+
+    def _seq2col(self, X):
+        nW = self.window_size
+        padded = np.pad(X, ((nW, nW), (0, 0)))
+        return np.hstack([padded[i:i + len(X)] for i in range(2 * nW + 1)])
+
+    def predict(self, texts):
+        docs = [self.make_doc(text) for text in texts]
+        lengths = np.array([len(doc) for doc in docs])
+        if not lengths.any():
+            return np.zeros((len(docs), len(self.labels)), dtype=np.float32)
+
+        ids = np.vstack([doc.to_array([self.bow_attr, *self.feature_columns]).reshape(len(doc), -1)
+                         for doc in docs if len(doc)]).astype(np.uint64)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        nonempty = lengths > 0
+
+        # BOW：每个 ORTH 经两次 murmur 哈希落到稀疏权重上，按文档求和（同一词出现几次就加几次）
+        keys = ids[:, 0]
+        weights = sum(self.bow_W[:, murmurhash3_32_uint64(keys, seed) % np.uint32(self.bow_length)] for seed in (0, 1))
+        bow = np.tile(self.bow_b, (len(docs), 1))
+        bow[nonempty] += np.add.reduceat(weights, starts[nonempty], axis=1).T
+        bow = 1 / (1 + np.exp(-bow))
+
+        # Tok2Vec：所有文档的 token 拼在一起计算嵌入
+        ids = ids[:, 1:]
+        embedded = np.hstack([E[self._hash(np.ascontiguousarray(ids[:, column]), seed) % len(E)].sum(axis=1)
+                              for column, seed, E in self.embeds])
+        X = self._maxout_norm(embedded, self.maxouts[0])
+
+        # 窗口编码：每个文档前后各补 WINDOW_PAD 行零，与 thinc 的批处理方式完全一致
+        pad = self.WINDOW_PAD
+        padded_starts = starts + pad * (np.arange(len(docs)) + 1)
+        flat = np.zeros((len(X) + pad * (len(docs) + 1), X.shape[1]), dtype=X.dtype)
+        rows = np.concatenate([np.arange(s, s + n) for s, n in zip(padded_starts, lengths)])
+        flat[rows] = X
+        for layer in self.maxouts[1:-1]:
+            flat = flat + self._maxout_norm(self._seq2col(flat), layer)
+        X = flat[rows]
+
+        # 注意力池化 + 求和
+        attention = np.exp(np.clip(X @ self.attention_Q, -20.0, 20.0))
+        pooled = np.zeros((len(docs), X.shape[1]), dtype=X.dtype)
+        totals = np.add.reduceat(attention, starts[nonempty])
+        weights = attention / np.repeat(totals, lengths[nonempty])
+        pooled[nonempty] = np.add.reduceat(X * weights[:, None], starts[nonempty], axis=0)
+        pooled = pooled + self._maxout_norm(pooled, self.maxouts[-1])
+
+        scores = np.hstack([bow, pooled]) @ self.output_W + self.output_b
+        return 1 / (1 + np.exp(-scores))
+
+    def __call__(self, texts):
+        return [dict(zip(self.labels, map(float, row))) for row in self.predict(texts)]
+
+
+def _load_numpy_textcat(language):
+    return lambda: NumpyTextcat(get_nlp(language))
+
+
+if CLASSIFIER_ENGINE == "numpy":
+    _model_loaders["textcat_zh"] = _load_numpy_textcat("zh")
+    _model_loaders["textcat_en"] = _load_numpy_textcat("en")
+
+classifier_cache = ResultCache("classifier", CLASSIFIER_CACHE_SIZE, float("inf"))
+
+
+def normalize_classifier_text(text):
+    return " ".join(text.split())
+
+
+def predict_cats(language, texts):
+    # language: 'zh' / 'en'；返回与 doc.cats 相同的 {类别: 概率} 列表，未命中缓存的一批一起算
+    texts = [normalize_classifier_text(text) for text in texts]
+    results = [classifier_cache.get((language, text)) for text in texts]
+    missing = sorted({text for text, cats in zip(texts, results) if cats is None})
+    if missing:
+        predicted = dict(zip(missing, get_model(f"textcat_{language}")(missing)))
+        for text, cats in predicted.items():
+            classifier_cache.put((language, text), cats)
+        results = [cats if cats is not None else predicted[text] for text, cats in zip(texts, results)]
+    return results
+
+
 # 这是修改后的 classify_text 函数
-def classify_text(text, threshold=0.5):
-    language = detect_language(text)
+CLASSIFY_CATEGORY_MAP = {
+    "Study": 1,
+    "Work": 2,
+    "Daily": 3,
+    "Others": 4
+}
 
-    if language == 'zh':
-        doc = nlp_zh(text)
-    elif language == 'en':
-        doc = nlp_en(text)
-    else:
-        return {"category": "Others", "category_id": 4}
 
-    category_map = {
-        "Study": 1,
-        "Work": 2,
-        "Daily": 3,
-        "Others": 4
-    }
-    reverse_map = {v: k for k, v in category_map.items()}
+def classify_doc(doc, threshold=0.5):
+    return classify_cats(doc.cats if doc else None, threshold)
+
 
-    if doc and doc.cats:
-        print("Text category probabilities:", doc.cats)
-        category, prob = max(doc.cats.items(), key=lambda item: item[1])
-        print(f"Predicted category: {category}, Probability: {prob}")
+def classify_cats(cats, threshold=0.5):
+    if cats:
+        category, prob = max(cats.items(), key=lambda item: item[1])
+        log_event(logging.DEBUG, "textcat", cats=cats, category=category, prob=prob)
 
         # 如果预测类别不在 map 中，则归为 Others
-        if category not in category_map:
+        if category not in CLASSIFY_CATEGORY_MAP:
             category = "Others"
 
         # 如果预测类别概率低于阈值，也归为 Others
@@ -557,22 +3053,79 @@ def classify_text(text, threshold=0.5):
 
         return {
             "category": category,
-            "category_id": category_map.get(category, 4)
+            "category_id": CLASSIFY_CATEGORY_MAP.get(category, 4)
         }
 
     return {"category": "Others", "category_id": 4}
 
 
+def classify_text(text, threshold=0.5):
+    return analyze(text).classification(threshold)
+
+
+# 批量分类：按语言分组后走 nlp.pipe，结果按输入顺序返回
+# CLASSIFY_BATCH_SIZE 默认使用模型 config.cfg 里的 [nlp] batch_size
+CLASSIFY_BATCH_SIZE = int(os.environ.get("CLASSIFY_BATCH_SIZE", 0)) or None
+
+
+def classify_texts(texts, threshold=0.5):
+    results = [{"category": "Others", "category_id": 4} for _ in texts]
+    groups = {"zh": [], "en": []}
+    for i, text in enumerate(texts):
+        language = detect_language(text)
+        if language in groups:
+            groups[language].append(i)
+
+    for language, indices in groups.items():
+        if not indices:
+            continue
+        with cpu_stage("textcat"):
+            if CLASSIFIER_ENGINE == "numpy":
+                for i, cats in zip(indices, predict_cats(language, [texts[i] for i in indices])):
+                    results[i] = classify_cats(cats, threshold)
+                continue
+            nlp = get_nlp(language)
+            batch_size = CLASSIFY_BATCH_SIZE or nlp.batch_size
+            docs = nlp.pipe((texts[i] for i in indices), batch_size=batch_size)
+            for i, doc in zip(indices, docs):
+                results[i] = classify_doc(doc, threshold)
+    return results
+
+
 # 修改后的 classify 路由
 @app.route('/classify', methods=['POST'])
 def classify():
     text = request.json.get('text', '')
-    print(f"Received text: {text}")  # 打印收到的文本
     result = classify_text(text)
-    print(f"Classify result: {result}")  # 打印分类结果
+    log_event(logging.DEBUG, "classify", text=text, **result)
     return jsonify(result)  # 返回 JSON 格式的结果
 
 
+@app.route('/classify_batch', methods=['POST'])
+def classify_batch():
+    texts = (request.get_json(silent=True) or {}).get('texts')
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({"error": "texts must be a list of strings"}), 400
+    log_event(logging.DEBUG, "classify_batch", texts=len(texts))
+    return jsonify({"results": classify_texts(texts)})
+
+
+# 标题必须是不超过 500 字的字符串（memo.text 列长度），分类 ID 是整数或数字字符串；不合法时返回 None
+MEMO_TITLE_MAX = Memo.text.type.length
+
+
+def memo_title(value):
+    return value if isinstance(value, str) and value.strip() and len(value) <= MEMO_TITLE_MAX else None
+
+
+def memo_category(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, str) and value.strip().isdecimal():
+        return value.strip()
+    return None
+
+
 @app.route("/save_memo", methods=["POST"])
 def save_memo():
     try:
@@ -584,6 +3137,13 @@ def save_memo():
 
         if not user_id or not title or not category_id:
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+        title, category_id = memo_title(title), memo_category(category_id)
+        if title is None or category_id is None:
+            return jsonify({'success': False, 'error': 'Invalid title or category_id'}), 400
+
+        time = parse_memo_timestamp(time)
+        if time is None:
+            return jsonify({'success': False, 'error': 'Invalid time'}), 400
 
         new_memo = Memo(
             text=title,
@@ -597,8 +3157,8 @@ def save_memo():
         return jsonify({'success': True, 'message': 'Memo saved successfully'}), 200
 
     except Exception as e:
-        print("Error saving memo:", str(e))
-        return jsonify({'success': False, 'error': str(e)}), 500
+        log_event(logging.ERROR, "save_memo_failed", exc_info=True)
+        return jsonify({'success': False, 'error': 'Failed to save memo'}), 500
 
 @app.route("/save_and_list_memos", methods=["POST"])
 def save_and_list_memos():
@@ -611,6 +3171,13 @@ def save_and_list_memos():
 
         if not user_id or not title or not category_id:
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+        title, category_id = memo_title(title), memo_category(category_id)
+        if title is None or category_id is None:
+            return jsonify({'success': False, 'error': 'Invalid title or category_id'}), 400
+
+        time = parse_memo_timestamp(time)
+        if time is None:
+            return jsonify({'success': False, 'error': 'Invalid time'}), 400
 
         new_memo = Memo(
             userID=user_id,
@@ -621,21 +3188,60 @@ def save_and_list_memos():
         db.session.add(new_memo)
         db.session.commit()
 
-        # 查询当前用户所有备忘录
-        memos = Memo.query.filter_by(userID=user_id).order_by(Memo.timestamp.desc()).all()
-        memo_list = [{
-            "id": m.id,
-            "text": m.text,
-            "category": m.category,
-            "timestamp": m.timestamp
-        } for m in memos]
-
-        return jsonify({'success': True, 'memos': memo_list}), 200
+        # 只返回新建的这一条；cursor 指向它在列表中的位置，其余通过 GET /memos 分页或增量同步获取
+        return jsonify({
+            'success': True,
+            'memo': memo_row_to_dict(new_memo),
+            'cursor': encode_cursor(new_memo.timestamp, new_memo.id)
+        }), 200
 
     except Exception as e:
-        print("Error saving/listing memos:", str(e))
-        return jsonify({'success': False, 'error': str(e)}), 500
+        log_event(logging.ERROR, "save_and_list_memos_failed", exc_info=True)
+        return jsonify({'success': False, 'error': 'Failed to save memo'}), 500
+
+
+# 一次请求写入多条备忘录：全部校验通过后在同一个事务里用 executemany 插入，任一条无效则整批不写
+MEMO_BULK_MAX = int(os.environ.get("MEMO_BULK_MAX", 1000))
+
+
+@app.route("/save_memos_bulk", methods=["POST"])
+def save_memos_bulk():
+    data = request.get_json(silent=True) or {}
+    user_id = request_int(data.get('userID'))
+    memos = data.get('memos')
+    if not user_id or not isinstance(memos, list) or not memos:
+        return jsonify({'success': False, 'error': 'Missing userID or memos'}), 400
+    if len(memos) > MEMO_BULK_MAX:
+        return jsonify({'success': False, 'error': f'At most {MEMO_BULK_MAX} memos per request'}), 413
+
+    now = datetime.now()
+    rows = []
+    for index, memo in enumerate(memos):
+        memo = memo if isinstance(memo, dict) else {}
+        title = memo_title(memo.get('title'))
+        category_id = memo_category(memo.get('category_id'))
+        time = parse_memo_timestamp(memo.get('time')) if memo.get('time') else now
+        if title is None or category_id is None or time is None:
+            return jsonify({'success': False, 'error': 'Invalid memo', 'index': index}), 400
+        rows.append({"userID": user_id, "text": title, "category": category_id,
+                     "timestamp": time, "updated_at": now})
+
+    try:
+        with trace_stage("db_insert"):
+            db.session.execute(Memo.__table__.insert(), rows)
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        log_event(logging.ERROR, "save_memos_bulk_failed", exc_info=True, memos=len(rows))
+        return jsonify({'success': False, 'error': 'Failed to save memos'}), 500
+    log_event(logging.INFO, "memos_saved", user_id=user_id, memos=len(rows))
+    return jsonify({'success': True, 'saved': len(rows)}), 200
 #successpls
+
+# 所有 _model_loaders 注册完毕后再统一预加载
+if MODEL_LOADING != "lazy":
+    load_all_models()
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(debug=False, host="0.0.0.0", port=port)
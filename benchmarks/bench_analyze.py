@@ -0,0 +1,143 @@
+"""单次文本分析基准：每个辅助函数各自判定语言、跑 spaCy、解析时间（旧做法）与共享一个 analyze() 结果对比 CPU 时间。
+
+一次“请求”依次取 /transcribe 和 /classify 需要的全部信息：类别概率、categorize_text、
+predict_and_extract_time、parse_time、extract_task_title、classify_text。
+旧做法里每一步都重新跑模型 / 正则；新做法在同一请求上下文中只计算一次。
+
+用法：python benchmarks/bench_analyze.py [--repeat 20]
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_analyze_'), 'memo.db')}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+os.environ.setdefault("LOG_LEVEL", "OFF")
+
+import app  # noqa: E402
+
+PHRASES = [
+    "明天下午3点开会",
+    "后天交报告",
+    "今天要去买菜",
+    "删除6月20号的任务",
+    "明天有什么安排",
+    "星期五下午交作业",
+    "remind me to call mom tomorrow",
+    "submit the report on June 23",
+    "delete the memo of 23rd of June",
+    "what do I have today",
+    "read a book",
+]
+
+
+def legacy_doc(text):
+    language = app.detect_language(text)
+    return app.get_nlp("en" if language == "en" else "zh")(text)
+
+
+def legacy_categorize_text(text, threshold=0.5):
+    if app.detect_language(text) is None:
+        return "Others"
+    doc = legacy_doc(text)
+    category, prob = max(doc.cats.items(), key=lambda item: item[1])
+    if category in ["Study", "Work", "Daily"] and prob >= threshold:
+        return category
+    return "Others"
+
+
+def legacy_predict_and_extract_time(text):
+    doc = legacy_doc(text)
+    category = max(doc.cats, key=doc.cats.get) if doc.cats else "Others"
+    return category, app.parse_time(text)
+
+
+def legacy_extract_task_title(text):
+    text = re.sub(r"\d{1,2}(st|nd|rd|th)? of [A-Za-z]+", "", text)
+    text = re.sub(r"\d{4}-\d{1,2}-\d{1,2}", "", text)
+    text = re.sub(r"\d+月\d+(日|号)?", "", text)
+    for word in ["今天", "明天", "后天", "早上", "下午", "晚上", "上午",
+                 "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday",
+                 "morning", "afternoon", "evening", "tonight", "tomorrow", "today"]:
+        text = text.replace(word, "")
+    text = re.sub(r"^(请)?(帮我)?(把)?(我要)?(删除|取消|移除)", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"^(please )?(help me )?(delete|remove|cancel|erase|clear)( the memo of| the)?", "", text,
+                  flags=re.IGNORECASE)
+    text = re.sub(r"(的)?(任务|事情|安排|行程|memo|note|schedule|event)?(删掉|删除|取消)?$", "", text,
+                  flags=re.IGNORECASE)
+    return text.strip()
+
+
+def legacy_request(text):
+    cats = legacy_doc(text).cats
+    result = (
+        max(cats.items(), key=lambda item: item[1]),
+        legacy_categorize_text(text),
+        legacy_predict_and_extract_time(text),
+        app.parse_time(text),
+        legacy_extract_task_title(text),
+        app.classify_doc(legacy_doc(text)) if app.detect_language(text) else None,
+    )
+    return result
+
+
+def new_request(text):
+    with app.app.test_request_context():
+        analysis = app.analyze(text)
+        return (
+            analysis.top,
+            app.categorize_text(text),
+            app.predict_and_extract_time(text),
+            analysis.time,
+            analysis.task_title,
+            app.classify_text(text) if analysis.language else None,
+        )
+
+
+def cpu_ms(fn, text, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.process_time()
+        fn(text)
+        runs.append((time.process_time() - started) * 1000)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for name in ("nlp_zh", "nlp_en", "langdetect", "dateparser"):
+        app.get_model(name)
+    for phrase in PHRASES:  # 预热语言缓存、dateparser 内部缓存
+        legacy_request(phrase)
+        new_request(phrase)
+
+    legacy_total, new_total, mismatches = 0.0, 0.0, []
+    print(f"{'phrase':<36} {'legacy cpu ms':>14} {'analyze cpu ms':>15}")
+    for phrase in PHRASES:
+        legacy = cpu_ms(legacy_request, phrase, args.repeat)
+        new = cpu_ms(new_request, phrase, args.repeat)
+        legacy_total += legacy
+        new_total += new
+        print(f"{phrase:<36} {legacy:>14.2f} {new:>15.2f}")
+        old, ours = legacy_request(phrase), new_request(phrase)
+        # 时间里含当前秒数，只比较类别、标题和 /classify 结果
+        if (old[1], old[2][0], old[4], old[5]) != (ours[1], ours[2][0], ours[4], ours[5]):
+            mismatches.append(phrase)
+
+    print()
+    print(f"mean per request: legacy {legacy_total / len(PHRASES):.2f} ms, "
+          f"analyze {new_total / len(PHRASES):.2f} ms "
+          f"({(1 - new_total / legacy_total) * 100:.0f}% less CPU)")
+    print(f"result mismatches: {mismatches or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
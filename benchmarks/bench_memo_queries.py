@@ -0,0 +1,118 @@
+"""Memo 查询基准：旧表结构（VARCHAR 时间、无索引）与迁移后（DateTime + (userID, timestamp) 索引）对比。
+
+依次测量 /transcribe 的 Query_* 当天查询、query_tasks_by_date 以及 save_and_list_memos 的列表排序。
+
+用法：python benchmarks/bench_memo_queries.py [--memos 1000000] [--users 1000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_memo.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+LEGACY_SCHEMA = """
+CREATE TABLE memo (
+    id INTEGER NOT NULL,
+    text VARCHAR(500) NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    timestamp VARCHAR(100) NOT NULL,
+    "userID" INTEGER,
+    PRIMARY KEY (id)
+)
+"""
+
+
+def seed_legacy(conn, memos, users):
+    # 与线上旧数据一样混合两种格式：只有日期 / 日期 + 时间
+    conn.execute("DROP TABLE IF EXISTS memo")
+    conn.execute(LEGACY_SCHEMA)
+    base = datetime(2024, 1, 1)
+    rng = random.Random(0)
+
+    def rows():
+        for i in range(1, memos + 1):
+            dt = base + timedelta(minutes=rng.randrange(0, 2 * 365 * 24 * 60))
+            ts = dt.strftime("%Y-%m-%d") if i % 3 == 0 else dt.strftime("%Y-%m-%d %H:%M:%S")
+            yield i, f"memo {i}", str(rng.randint(1, 4)), ts, rng.randint(1, users)
+
+    conn.executemany("INSERT INTO memo VALUES (?, ?, ?, ?, ?)", rows())
+    conn.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run_queries(conn, user_ids, day, typed):
+    start = datetime(day.year, day.month, day.day)
+    end = start + timedelta(days=1)
+    if typed:
+        # SQLAlchemy 在 SQLite 中把 DateTime 存成 'YYYY-MM-DD HH:MM:SS.ffffff'
+        s, e = start.strftime("%Y-%m-%d %H:%M:%S.000000"), end.strftime("%Y-%m-%d %H:%M:%S.000000")
+        day_sql = 'SELECT text, category, timestamp FROM memo WHERE "userID" = ? AND timestamp >= ? AND timestamp < ?'
+        date_sql = "SELECT text, category, timestamp FROM memo WHERE timestamp >= ? AND timestamp < ?"
+        date_args = (s, e)
+    else:
+        s, e = start.strftime("%Y-%m-%d %H:%M:%S"), (end - timedelta(seconds=1)).strftime("%Y-%m-%d %H:%M:%S")
+        day_sql = 'SELECT text, category, timestamp FROM memo WHERE "userID" = ? AND timestamp >= ? AND timestamp <= ?'
+        date_sql = "SELECT text, category, timestamp FROM memo WHERE timestamp LIKE ?"
+        date_args = (start.strftime("%Y-%m-%d") + "%",)
+    list_sql = 'SELECT id, text, category, timestamp FROM memo WHERE "userID" = ? ORDER BY timestamp DESC'
+
+    results = {
+        "Query_* day (per user)": timed(lambda: [conn.execute(day_sql, (u, s, e)).fetchall() for u in user_ids], 3) / len(user_ids),
+        "query_tasks_by_date": timed(lambda: conn.execute(date_sql, date_args).fetchall(), 3),
+        "list user memos": timed(lambda: [conn.execute(list_sql, (u,)).fetchall() for u in user_ids], 3) / len(user_ids),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--memos", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DB_PATH)
+    started = time.perf_counter()
+    seed_legacy(conn, args.memos, args.users)
+    print(f"seeded {args.memos} legacy memos in {time.perf_counter() - started:.1f}s ({DB_PATH})")
+
+    user_ids = random.Random(1).sample(range(1, args.users + 1), 20)
+    day = datetime(2024, 6, 23)
+    legacy = run_queries(conn, user_ids, day, typed=False)
+    conn.close()
+
+    started = time.perf_counter()
+    with app.app.app_context():
+        app.ensure_memo_schema()
+    print(f"migration: {time.perf_counter() - started:.1f}s")
+
+    conn = sqlite3.connect(DB_PATH)
+    typed = run_queries(conn, user_ids, day, typed=True)
+    conn.close()
+
+    print()
+    print(f"{'query':<26} {'legacy ms':>10} {'typed+index ms':>15}")
+    for name in legacy:
+        print(f"{name:<26} {legacy[name]:>10.2f} {typed[name]:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
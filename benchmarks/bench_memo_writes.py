@@ -0,0 +1,99 @@
+"""并发写入基准：模拟多个 gunicorn worker 同时保存备忘录，比较 SQLite 调优前后的吞吐和失败数。
+
+每个 worker 是一个独立进程（各自 import app、各自连接池），通过 Flask test client 调用接口，
+所有 worker 导入完成后在同一时刻开始写：
+  single —— 每条备忘录一次 /save_memo（一条一个事务）
+  bulk   —— 每 --batch 条一次 /save_memos_bulk（一批一个事务）
+baseline 为调优前的连接参数（回滚日志、synchronous=FULL、pysqlite 默认 5 秒等待），tuned 为当前默认（WAL 等）。
+
+用法：python benchmarks/bench_memo_writes.py [--workers 4] [--memos 500] [--batch 50]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    "baseline": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_BUSY_TIMEOUT_MS": "5000"},
+    "tuned": {},
+}
+
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    import app
+
+    client = app.app.test_client()
+    memos = [{"title": f"memo {i} 明天开会", "category_id": 1, "time": "2026-06-20 10:00"} for i in range(args.memos)]
+    saved, errors = 0, 0
+    time.sleep(max(0.0, args.start_at - time.time()))
+    if args.endpoint == "single":
+        for memo in memos:
+            response = client.post("/save_memo", json={"userID": args.user_id, **memo})
+            if response.status_code == 200:
+                saved += 1
+            else:
+                errors += 1
+    else:
+        for i in range(0, len(memos), args.batch):
+            batch = memos[i:i + args.batch]
+            response = client.post("/save_memos_bulk", json={"userID": args.user_id, "memos": batch})
+            if response.status_code == 200:
+                saved += len(batch)
+            else:
+                errors += 1
+    print(json.dumps({"saved": saved, "errors": errors, "finished_at": time.time()}))
+
+
+def run(mode, endpoint, args):
+    db_dir = tempfile.mkdtemp(prefix="bench_writes_")
+    env = dict(os.environ, MODEL_LOADING="lazy", LOG_LEVEL="OFF",
+               DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'memo.db')}", **MODES[mode])
+    # 先建好表，避免多个 worker 同时建表
+    subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import app"], env=env, check=True)
+
+    start_at = time.time() + args.import_seconds
+    procs = [
+        subprocess.Popen([sys.executable, __file__, "--worker", "--endpoint", endpoint, "--user-id", str(i + 1),
+                          "--memos", str(args.memos), "--batch", str(args.batch), "--start-at", str(start_at)],
+                         env=env, stdout=subprocess.PIPE, text=True)
+        for i in range(args.workers)
+    ]
+    results = [json.loads(proc.communicate()[0].strip().splitlines()[-1]) for proc in procs]
+    if time.time() < start_at:
+        sys.exit("workers finished before the start time; raise --import-seconds")
+    elapsed = max(r["finished_at"] for r in results) - start_at
+    saved = sum(r["saved"] for r in results)
+    errors = sum(r["errors"] for r in results)
+    return saved, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--memos", type=int, default=500, help="每个 worker 写入的备忘录数")
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--import-seconds", type=float, default=20, help="留给 worker 导入 app 的时间")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", default="single", help=argparse.SUPPRESS)
+    parser.add_argument("--user-id", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+        return
+
+    print(f"{args.workers} workers x {args.memos} memos")
+    print(f"{'mode':<10} {'endpoint':<8} {'saved':>7} {'errors':>7} {'seconds':>8} {'memos/s':>9}")
+    for mode in MODES:
+        for endpoint in ("single", "bulk"):
+            saved, errors, elapsed = run(mode, endpoint, args)
+            print(f"{mode:<10} {endpoint:<8} {saved:>7} {errors:>7} {elapsed:>8.2f} {saved / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
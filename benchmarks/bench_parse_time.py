@@ -0,0 +1,248 @@
+"""时间解析基准：旧版 parse_time（每次都走 search_dates）与预编译快速路径版本对比延迟和结果一致性。
+
+search_dates 不认识“下午3点”“晚上10点”这类说法：单独出现时旧版返回 None，
+前面有明天等日期时也可能整句解析失败。新版对单独的“早上/上午/下午/晚上N点”取下一个这个钟点，
+带今天/明天/后天时取那天的这个钟点；这类说法在旧版为 None 时改与上述规则的期望值比较。计时前两个版本都先把语料跑一遍，排除首次调用的开销。
+
+用法：python benchmarks/bench_parse_time.py [--repeat 20]
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_parse_time_'), 'memo.db')}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+
+import dateparser  # noqa: E402
+from dateparser.search import search_dates  # noqa: E402
+import re  # noqa: E402
+
+import app  # noqa: E402
+
+# 来自真实备忘录的说法（已脱敏）
+PHRASES = [
+    "明天下午3点开会",
+    "明天晚上8点和客户吃饭",
+    "后天交报告",
+    "今天晚上7点健身",
+    "今天要去买菜",
+    "明天早上9点上课",
+    "6月23号去医院",
+    "7月1日提交论文",
+    "删除6月20号的任务",
+    "删除明天的会议",
+    "明天有什么安排",
+    "今天有什么任务",
+    "下周一开组会",
+    "星期五下午交作业",
+    "晚上10点复习英语",
+    "下午3点开会",
+    "早上7点跑步",
+    "上午10点交材料",
+    "晚上10点半睡觉",
+    "remind me to call mom tomorrow",
+    "meeting tomorrow",
+    "submit the report on June 23",
+    "dentist appointment 24 June",
+    "what do I have today",
+    "delete the memo of 23rd of June",
+    "gym tomorrow at 7pm",
+    "buy groceries next Monday",
+    "read a book",
+    "写周报",
+    "买牛奶",
+    "call the plumber",
+]
+HOUR_PHRASE_RE = re.compile(r"^(今天|明天|后天)?(早上|上午|下午|晚上)(\d{1,2})点(?!半)")
+
+
+def legacy_parse_time(text, only_date=False):
+    now = datetime.now()
+    try:
+        text_cleaned = text.replace("號", "号").replace("日", "号")
+
+        # 优先判断有没有用户明确说出“几月几日”或“几号”
+        zh_date_match = re.search(r"(\d{1,2})月(\d{1,2})[号日]?", text_cleaned)
+        if zh_date_match:
+            print("✅ 明确中文日期:", zh_date_match.group(0))
+            month = int(zh_date_match.group(1))
+            day = int(zh_date_match.group(2))
+            year = now.year
+            parsed = datetime(year, month, day)
+
+            # 🚫 删除类任务时不要跳年
+            allow_next_year = not (
+                "delete" in text.lower() or "刪除" in text or "删除" in text
+            )
+
+            if parsed < now and allow_next_year:
+                parsed = parsed.replace(year=year + 1)
+
+            return parsed.strftime("%Y-%m-%d") if only_date else parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+        # 手动检测英文日期格式 like "23 June" or "June 23"
+        en_date_match = re.search(
+            r'(?:(\d{1,2})(?:st|nd|rd|th)?\s+(January|February|March|April|May|June|July|August|September|October|November|December)|'  # 24 June
+            r'(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(?:st|nd|rd|th)?)',
+            text,
+            re.IGNORECASE
+        )
+        if en_date_match:
+            print("📝 手动匹配英文日期:", en_date_match.group(0))
+            if en_date_match.group(1) and en_date_match.group(2):  # case: 24 June
+                day = int(en_date_match.group(1))
+                month_str = en_date_match.group(2)
+            elif en_date_match.group(3) and en_date_match.group(4):  # case: June 24
+                day = int(en_date_match.group(4))
+                month_str = en_date_match.group(3)
+            else:
+                return None
+
+            month = datetime.strptime(month_str[:3], "%b").month
+            year = now.year
+            parsed = datetime(year, month, day)
+
+            is_delete = any(word in text.lower() for word in ["delete", "remove", "清除", "刪除"])
+            if parsed < now and not is_delete:
+                parsed = parsed.replace(year=year + 1)
+
+            return parsed.strftime("%Y-%m-%d") if only_date else parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+        # ✅ 使用 search_dates 解析
+        parsed_result = search_dates(text_cleaned, languages=['zh', 'en'], settings={
+            'PREFER_DATES_FROM': 'future',
+            'RELATIVE_BASE': now
+        })
+        print("🧠 search_dates解析:", parsed_result)
+
+        if parsed_result:
+            matched_text, dt = parsed_result[0]
+
+            # ✅ 新增：识别“几点”并手动修正时间
+            hour_match = re.search(r"(晚上|下午)?(\d{1,2})点", text)
+            if hour_match:
+                hour = int(hour_match.group(2))
+                if hour < 12 and hour_match.group(1) in ["晚上", "下午"]:
+                    hour += 12
+                dt = dt.replace(hour=hour, minute=0, second=0, microsecond=0)
+
+            is_delete = any(word in text.lower() for word in ["delete", "刪除", "删除"])
+            # 如果没明确日期，就用今天 +1 推理；否则用原解析时间
+            has_explicit_date = bool(re.search(
+                r"(\d{1,2})月(\d{1,2})[号日]?|today|tomorrow|[0-9]{1,2} [A-Za-z]+|明天|后天",
+                matched_text.lower()
+            ))
+            if not has_explicit_date:
+                dt = dt.replace(year=now.year, month=now.month, day=now.day)
+                if dt < now and "今天" not in text and "today" not in text.lower():
+                    dt += timedelta(days=1)
+            elif not is_delete and dt < now:
+                dt = dt.replace(year=now.year + 1)
+
+            return dt.strftime("%Y-%m-%d") if only_date else dt.strftime("%Y-%m-%d %H:%M:%S")
+
+        # 🔁 fallback：dateparser 处理马来文或其他
+        fallback_dt = dateparser.parse(text_cleaned, settings={
+            'PREFER_DATES_FROM': 'future',
+            'RELATIVE_BASE': now
+        })
+        if fallback_dt:
+            print("📦 fallback dateparser解析:", fallback_dt)
+            return fallback_dt.strftime("%Y-%m-%d") if only_date else fallback_dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    except Exception as e:
+        print("❌ parse_time error:", str(e))
+
+    return None
+
+
+def quiet(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def to_dt(value):
+    if value is None:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return value
+
+
+def same(a, b):
+    # 结果里可能含“当前时刻”，两次调用之间允许 2 秒误差
+    a, b = to_dt(a), to_dt(b)
+    if isinstance(a, datetime) and isinstance(b, datetime):
+        return abs(a - b) <= timedelta(seconds=2)
+    return a == b
+
+
+def expected_hour(phrase):
+    day, period, hour = HOUR_PHRASE_RE.match(phrase).groups()
+    hour = int(hour) + (12 if period in ("下午", "晚上") and int(hour) < 12 else 0)
+    now = datetime.now()
+    dt = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if day:
+        dt += timedelta(days=["今天", "明天", "后天"].index(day))
+    elif dt < now:
+        dt += timedelta(days=1)
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    app.get_model("dateparser")
+    print(f"dateparser warm-up: {(time.perf_counter() - started) * 1000:.0f} ms (startup, not per request)")
+    print()
+
+    for phrase in PHRASES:
+        quiet(legacy_parse_time, phrase)
+        quiet(app.parse_time, phrase)
+
+    legacy_ms, new_ms, mismatches = [], [], []
+    print(f"{'phrase':<36} {'legacy ms':>10} {'new ms':>8}  result")
+    for phrase in PHRASES:
+        runs_legacy, runs_new = [], []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            old = quiet(legacy_parse_time, phrase)
+            t1 = time.perf_counter()
+            new = quiet(app.parse_time, phrase)
+            t2 = time.perf_counter()
+            runs_legacy.append((t1 - t0) * 1000)
+            runs_new.append((t2 - t1) * 1000)
+        legacy_ms.append(statistics.median(runs_legacy))
+        new_ms.append(statistics.median(runs_new))
+        expected, note = old, ""
+        if old is None and HOUR_PHRASE_RE.match(phrase):
+            expected, note = expected_hour(phrase), "  (legacy None)"
+        ok = same(expected, new)
+        if not ok:
+            mismatches.append((phrase, expected, new))
+        print(f"{phrase:<36} {legacy_ms[-1]:>10.2f} {new_ms[-1]:>8.2f}  {new}{note}{'' if ok else '  ≠ ' + str(expected)}")
+
+    print()
+    print(f"median per phrase: legacy {statistics.median(legacy_ms):.2f} ms, new {statistics.median(new_ms):.2f} ms")
+    print(f"total per pass:    legacy {sum(legacy_ms):.1f} ms, new {sum(new_ms):.1f} ms")
+    print(f"parity: {len(PHRASES) - len(mismatches)}/{len(PHRASES)}")
+    for phrase, old, new in mismatches:
+        print(f"  mismatch: {phrase!r}: expected={old} new={new}")
+
+
+if __name__ == "__main__":
+    main()
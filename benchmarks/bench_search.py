@@ -0,0 +1,110 @@
+"""备忘录搜索基准：在临时 SQLite 库中生成 N 条备忘录（默认 100 万），比较 /search 所用 FTS5 查询与逐行 LIKE 扫描的延迟。
+
+备忘录由若干中英文短语随机拼成，平均分给 --users 个用户，另有一个“重度用户”拥有 --heavy 条；
+查询分别在普通用户和重度用户上执行，输出 p50 / p95 毫秒。写入时 memo 表上的触发器记下待索引的 id，
+随后由 sync_memo_fts() 分词建索引，同时给出写入加建索引的耗时和库大小。
+LIKE 按时间倒序取前 N 条、命中够了就停，不做排序；FTS5 要对该用户全部命中算 bm25，命中率高时两者差距主要在这里。
+
+用法：python benchmarks/bench_search.py [--memos 1000000] [--users 1000] [--heavy 50000] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_db_dir = tempfile.mkdtemp(prefix="bench_search_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'memo.db')}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+os.environ.setdefault("LOG_LEVEL", "OFF")
+
+import app  # noqa: E402
+
+PHRASES = [
+    "明天下午开会", "去超市买菜", "交季度报告", "给妈妈打电话", "预约牙医", "讨论项目预算", "复习数学作业",
+    "晚上跑步", "取快递", "准备周会材料", "read a book", "call mom", "submit the report", "team meeting",
+    "pay the rent", "buy groceries", "gym workout", "review pull requests",
+]
+QUERIES = ["开会", "预算会议", "买菜", "牙医", "report", "call mom", "周会 材料", "作业"]
+HEAVY_USER = 0
+
+
+def generate(rng, count, user_of):
+    base = datetime(2024, 1, 1)
+    for i in range(count):
+        yield {
+            "text": "，".join(rng.sample(PHRASES, rng.randint(1, 3))),
+            "category": str(rng.randint(1, 4)),
+            "timestamp": base + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60)),
+            "updated_at": base,
+            "userID": user_of(i),
+        }
+
+
+def populate(args):
+    rng = random.Random(0)
+    normal = args.memos - args.heavy
+    rows = [*generate(rng, normal, lambda i: 1 + i % args.users),
+            *generate(rng, args.heavy, lambda i: HEAVY_USER)]
+    started = time.perf_counter()
+    with app.db.engine.begin() as conn:
+        for i in range(0, len(rows), 10000):
+            conn.execute(app.Memo.__table__.insert(), rows[i:i + 10000])
+    app.sync_memo_fts()
+    return time.perf_counter() - started
+
+
+def like_search(user_id, query, limit):
+    terms = app._CJK_RUN_RE.findall(query)
+    return app.db.session.execute(
+        app.db.select(*app._MEMO_COLUMNS)
+        .where(app.Memo.userID == user_id,
+               app.db.or_(*(app.Memo.text.contains(term, autoescape=True) for term in terms)))
+        .order_by(app.Memo.timestamp.desc()).limit(limit)
+    ).all()
+
+
+def latency_ms(fn, user_ids, repeat, limit):
+    runs = []
+    for i in range(repeat):
+        query = QUERIES[i % len(QUERIES)]
+        started = time.perf_counter()
+        fn(user_ids[i % len(user_ids)], query, limit)
+        runs.append((time.perf_counter() - started) * 1000)
+    runs.sort()
+    return statistics.median(runs), runs[int(len(runs) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--memos", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--heavy", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=app.SEARCH_PAGE_SIZE)
+    args = parser.parse_args()
+
+    with app.app.app_context():
+        if not app.memo_fts_enabled():
+            sys.exit("SQLite build has no FTS5")
+        build_seconds = populate(args)
+        size_mb = os.path.getsize(os.path.join(_db_dir, "memo.db")) / 2 ** 20
+        print(f"{args.memos} memos inserted and indexed in {build_seconds:.1f} s, db {size_mb:.0f} MB")
+        print()
+
+        rng = random.Random(1)
+        normal_users = [rng.randint(1, args.users) for _ in range(args.repeat)]
+        print(f"{'user':<10} {'engine':<6} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, user_ids in (("normal", normal_users), ("heavy", [HEAVY_USER])):
+            for engine, fn in (("fts5", app.search_memos), ("like", like_search)):
+                fn(user_ids[0], QUERIES[0], args.limit)  # 预热页缓存
+                p50, p95 = latency_ms(fn, user_ids, args.repeat, args.limit)
+                print(f"{label:<10} {engine:<6} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""繁体 ➜ 简体转换基准：旧版逐词 str.replace 与编译后的单遍转换器对比。
+
+legacy 只有 50 个词；legacy(full) 用同样的逐词 replace 跑完整词表，
+用来说明词表扩充后旧算法的开销（与词表大小成正比）。
+
+用法：python benchmarks/bench_to_simplified.py [--repeat 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_to_simplified_'), 'memo.db')}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+
+import app  # noqa: E402
+
+# Whisper 对繁体口音常见的输出片段
+SENTENCES = [
+    "明天下午三點開會討論報告",
+    "請幫我刪除今天的備忘錄",
+    "後天晚上八點和客戶聯絡",
+    "記得把設計檔案寄到郵件",
+    "這週要完成系統頁面的功能測試",
+    "下個月十二號報名考試，還要練習聽力",
+    "幫我紀錄一下這個會議的結論",
+    "今天晚上讀書寫作業",
+]
+
+
+def legacy_to_simplified(text):
+    replacements = {
+        "讀": "读",
+        "學": "学",
+        "寫": "写",
+        "說": "说",
+        "會議": "会议",
+        "備忘錄": "备忘录",
+        "開會": "开会",
+        "聽": "听",
+        "訊息": "信息",
+        "電腦": "电脑",
+        "報告": "报告",
+        "設計": "设计",
+        "書": "书",
+        "請": "请",
+        "刪除": "删除",
+        "取消": "取消",
+        "安排": "安排",
+        "事情": "事情",
+        "行程": "行程",
+        "活動": "活动",
+        "聯絡": "联络",
+        "討論": "讨论",
+        "報名": "报名",
+        "練習": "练习",
+        "報到": "报到",
+        "系統": "系统",
+        "頁面": "页面",
+        "功能": "功能",
+        "分類": "分类",
+        "訊號": "信号",
+        "開始": "开始",
+        "結束": "结束",
+        "備份": "备份",
+        "簡報": "简报",
+        "提醒": "提醒",
+        "紀錄": "记录",
+        "備註": "备注",
+        "檔案": "文件",
+        "選項": "选项",
+        "設定": "设置",
+        "日曆": "日历",
+        "標題": "标题",
+        "檢查": "检查",
+        "號": "号",
+        "報": "报",
+        "點": "点",
+        "郵件": "邮件",
+        "客戶": "客户",
+        "任務": "任务"
+        # 👉 你可以继续加常用词
+    }
+    for traditional, simplified in replacements.items():
+        text = text.replace(traditional, simplified)
+    return text
+
+
+def legacy_full_table(table):
+    items = sorted(table.items(), key=lambda item: -len(item[0]))
+
+    def convert(text):
+        for traditional, simplified in items:
+            text = text.replace(traditional, simplified)
+        return text
+
+    return convert
+
+
+def sample_text(length):
+    text = ""
+    i = 0
+    while len(text) < length:
+        text += SENTENCES[i % len(SENTENCES)] + "，"
+        i += 1
+    return text[:length]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    app.to_simplified("預熱")  # 编译词表不计入耗时
+    legacy_full = legacy_full_table(app.load_t2s_table())
+
+    def per_call_us(fn, text, number):
+        return min(timeit.repeat(lambda: fn(text), number=number, repeat=5)) / number * 1e6
+
+    print(f"{'chars':>6} {'legacy µs':>10} {'legacy(full) µs':>16} {'compiled µs':>12}")
+    for length in (20, 80, 300, 1200):
+        text = sample_text(length)
+        legacy = per_call_us(legacy_to_simplified, text, args.repeat)
+        full = per_call_us(legacy_full, text, max(1, args.repeat // 50))
+        compiled = per_call_us(app.to_simplified, text, args.repeat)
+        print(f"{length:>6} {legacy:>10.1f} {full:>16.1f} {compiled:>12.1f}")
+
+    text = sample_text(80)
+    print()
+    print("legacy:  ", legacy_to_simplified(text))
+    print("compiled:", app.to_simplified(text))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Whisper 推理后端基准：在一组本地录音上比较各后端 / 模型的吞吐和与参考结果的一致性。
+
+每个录音目录下放音频文件（wav / m4a / mp3 ...），可选同名 .txt 作为人工校对的参考文本；
+没有 .txt 时以第一个组合（默认 torch + tiny）的输出为参考。
+一致性用字符错误率（CER，先统一成简体、去掉空白和标点）衡量；吞吐用实时率 RTF（解码耗时 / 音频时长）。
+
+用法：python benchmarks/bench_whisper_backends.py CLIPS_DIR \
+          [--backends torch,torch-int8,ctranslate2] [--models tiny,base] [--threads N] [--repeat 3]
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_whisper_backends_'), 'memo.db')}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+os.environ.setdefault("LOG_LEVEL", "OFF")
+
+import app  # noqa: E402
+
+AUDIO_EXTS = {".wav", ".m4a", ".mp3", ".aac", ".ogg", ".webm", ".flac"}
+_NOISE_RE = re.compile(r"[\s\W_]+")
+
+
+def load_clips(clips_dir):
+    clips = []
+    for name in sorted(os.listdir(clips_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in AUDIO_EXTS:
+            continue
+        with open(os.path.join(clips_dir, name), "rb") as f:
+            audio = app.decode_audio(f.read(), ext[1:])
+        reference = None
+        ref_path = os.path.join(clips_dir, stem + ".txt")
+        if os.path.exists(ref_path):
+            with open(ref_path, encoding="utf-8") as f:
+                reference = f.read()
+        clips.append({"name": name, "audio": audio, "reference": reference})
+    return clips
+
+
+def normalize(text):
+    return _NOISE_RE.sub("", app.to_simplified(text).lower())
+
+
+def cer(reference, hypothesis):
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("clips_dir")
+    parser.add_argument("--backends", default="torch,torch-int8")
+    parser.add_argument("--models", default="tiny,base")
+    parser.add_argument("--threads", type=int, default=app.WHISPER_THREADS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips_dir)
+    if not clips:
+        sys.exit(f"no audio clips in {args.clips_dir}")
+    audio_seconds = sum(len(clip["audio"]) for clip in clips) / app.SAMPLE_RATE
+    print(f"{len(clips)} clips, {audio_seconds:.1f} s audio, {args.threads} threads")
+    print()
+
+    print(f"{'backend':<12} {'model':<8} {'load s':>7} {'decode s':>9} {'RTF':>6} {'CER':>6}")
+    for model_name in args.models.split(","):
+        for backend_name in args.backends.split(","):
+            started = time.perf_counter()
+            try:
+                backend = app.load_whisper_backend(backend_name, model_name, args.threads)
+            except ImportError as e:
+                print(f"{backend_name:<12} {model_name:<8} skipped: {e}")
+                continue
+            load_seconds = time.perf_counter() - started
+            backend.transcribe(clips[0]["audio"])  # 预热
+
+            runs, texts = [], []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                texts = [backend.transcribe(clip["audio"])["text"] for clip in clips]
+                runs.append(time.perf_counter() - started)
+            decode_seconds = statistics.median(runs)
+
+            for clip, text in zip(clips, texts):
+                if clip["reference"] is None:
+                    clip["reference"] = text
+            error = statistics.mean(cer(clip["reference"], text) for clip, text in zip(clips, texts))
+            print(f"{backend_name:<12} {model_name:<8} {load_seconds:>7.1f} {decode_seconds:>9.2f} "
+                  f"{decode_seconds / audio_seconds:>6.3f} {error:>6.3f}")
+            del backend
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Whisper 解码参数基准：比较原版默认参数与 whisper_options()（限制 temperature 回退、按语言提示跳过检测并加提示词）
+在一组本地录音上的解码耗时和字符错误率。
+
+录音目录格式与 bench_whisper_backends.py 相同（音频 + 可选同名 .txt 参考文本）；没有参考文本时以 default 组的输出为参考。
+hinted 组的语言取自参考文本（detect_language），相当于用户画像已经有把握的情形；也可用 --language 统一指定。
+  default   backend.transcribe(audio)，Whisper 自行检测语言，temperature 0.0~1.0 最多回退 5 次
+  capped    whisper_options()：不给语言，只限制回退次数
+  hinted    whisper_options(language)：指定语言 + 领域 initial_prompt
+
+用法：python benchmarks/bench_whisper_options.py CLIPS_DIR [--backend torch] [--model tiny] [--language zh] [--repeat 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_whisper_options_'), 'memo.db')}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+os.environ.setdefault("LOG_LEVEL", "OFF")
+
+import app  # noqa: E402
+from bench_whisper_backends import cer, load_clips  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("clips_dir")
+    parser.add_argument("--backend", default=app.WHISPER_BACKEND)
+    parser.add_argument("--model", default=app.WHISPER_MODEL_NAME)
+    parser.add_argument("--threads", type=int, default=app.WHISPER_THREADS)
+    parser.add_argument("--language", help="所有录音统一使用的语言提示（默认按参考文本判定）")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips_dir)
+    if not clips:
+        sys.exit(f"no audio clips in {args.clips_dir}")
+    audio_seconds = sum(len(clip["audio"]) for clip in clips) / app.SAMPLE_RATE
+    backend = app.load_whisper_backend(args.backend, args.model, args.threads)
+    backend.transcribe(clips[0]["audio"])  # 预热
+
+    def hinted_language(clip):
+        return args.language or app.detect_language(app.to_simplified(clip["reference"] or "")) or None
+
+    configs = {
+        "default": lambda clip: {},
+        "capped": lambda clip: app.whisper_options(),
+        "hinted": lambda clip: app.whisper_options(hinted_language(clip)),
+    }
+    print(f"{len(clips)} clips, {audio_seconds:.1f} s audio, backend {args.backend}, model {args.model}")
+    print()
+    print(f"{'options':<8} {'decode s':>9} {'RTF':>6} {'saved':>7} {'CER':>6}")
+    baseline = None
+    for name, options_for in configs.items():
+        runs, texts = [], []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            texts = [backend.transcribe(clip["audio"], **options_for(clip))["text"] for clip in clips]
+            runs.append(time.perf_counter() - started)
+            if name == "default":
+                # 没有参考文本的录音以默认参数的结果为参考；hinted 组在此之后才确定语言
+                for clip, text in zip(clips, texts):
+                    if clip["reference"] is None:
+                        clip["reference"] = text
+        decode_seconds = statistics.median(runs)
+        baseline = baseline or decode_seconds
+        error = statistics.mean(cer(clip["reference"], text) for clip, text in zip(clips, texts))
+        print(f"{name:<8} {decode_seconds:>9.2f} {decode_seconds / audio_seconds:>6.3f} "
+              f"{1 - decode_seconds / baseline:>7.1%} {error:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""gunicorn worker 类型对比：同样数量的持模型进程，sync（一进程一连接）与 gthread（一进程多线程）能同时服务多少连接。
+
+复用 loadtest.py 的准备步骤（预置 SQLite、本地 PHP 登录替身），对每种 worker 类型各起一次 gunicorn，
+按并发度施压 I/O 为主的接口（登录等 PHP 应答、保存备忘录等 SQLite），也可加上 classify 观察 CPU 阶段限流。
+登录账号默认取自很大的账号池，基本不命中登录缓存，每次都要等 PHP。
+
+用法：python benchmarks/bench_worker_classes.py [--worker-classes sync,gthread] [--threads 8]
+          [--endpoints login,save_and_list_memos] [--concurrency 1,8,32] [--workers 2] [--output FILE]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import loadtest  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker-classes", default="sync,gthread")
+    parser.add_argument("--threads", type=int, default=8, help="gthread 每个 worker 的线程数")
+    parser.add_argument("--endpoints", default="login,save_and_list_memos")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--model-loading", default="lazy")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--memos-per-user", type=int, default=100)
+    parser.add_argument("--login-users", type=int, default=1_000_000)
+    parser.add_argument("--php-latency-ms", type=float, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench_workers_"), "memo.db")
+    loadtest.seed_database(db_path, args.users, args.memos_per_user, args.seed)
+    php, php_url = loadtest.start_php_stub(args.php_latency_ms)
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    results = []
+    print(f"{args.workers} workers, PHP latency {args.php_latency_ms:.0f} ms")
+    print(f"{'worker':<8} {'endpoint':<20} {'conc':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'ok':>6} {'req':>6}")
+    try:
+        for worker_class in args.worker_classes.split(","):
+            # threads > 1 时 gunicorn 会把 sync 自动换成 gthread，sync 需显式设为 1
+            threads = args.threads if worker_class == "gthread" else 1
+            args.gunicorn_args = f"--worker-class {worker_class} --threads {threads}"
+            port = loadtest.free_port()
+            server = loadtest.start_gunicorn(args, db_path, php_url, port)
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                for endpoint in args.endpoints.split(","):
+                    for concurrency in levels:
+                        result = loadtest.run_phase(endpoint, concurrency, base_url, args, [], server.pid)
+                        result["worker_class"] = worker_class
+                        results.append(result)
+                        latency = result["latency_ms"]
+                        print(f"{worker_class:<8} {endpoint:<20} {concurrency:>4} {result['throughput_rps']:>8.1f} "
+                              f"{latency['p50']!s:>8} {latency['p95']!s:>8} {result['ok']:>6} {result['requests']:>6}",
+                              flush=True)
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+    finally:
+        php.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
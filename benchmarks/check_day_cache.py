@@ -0,0 +1,105 @@
+"""日视图缓存校验与基准：在临时 SQLite 库上随机交替“写入 / 删除”与“查询某用户某天的任务”，
+每次查询都把 day_tasks()（走缓存）与原先未缓存的 ORM 查询结果逐项比较，最后给出命中率与两种查询的耗时。
+
+写操作覆盖 /save_memo、/save_and_list_memos、/save_memos_bulk 和 /memos/delete，
+确认任意写入路径都会让受影响的 (用户, 日期) 缓存失效，而不影响其他用户 / 日期。
+
+用法：python benchmarks/check_day_cache.py [--ops 5000] [--users 20] [--days 10] [--write-ratio 0.1]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='check_day_cache_'), 'memo.db')}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+os.environ.setdefault("LOG_LEVEL", "OFF")
+
+import app  # noqa: E402
+
+BASE_DAY = datetime(2026, 6, 20)
+TITLES = ["明天下午开会", "去超市买菜", "交报告", "call mom", "team meeting"]
+
+
+def legacy_day_tasks(user_id, day):
+    # 加缓存之前 transcribe() 查询分支的写法
+    start, end = app.day_range(day)
+    tasks = app.Memo.query.filter(app.Memo.userID == user_id, app.Memo.timestamp >= start,
+                                  app.Memo.timestamp < end).all()
+    return [{"text": t.text, "category": t.category, "timestamp": app.format_memo_timestamp(t.timestamp)}
+            for t in tasks]
+
+
+def random_time(rng, days):
+    day = BASE_DAY + timedelta(days=rng.randrange(days))
+    return (day + timedelta(minutes=rng.randrange(24 * 60))).strftime("%Y-%m-%d %H:%M")
+
+
+def random_write(client, rng, args):
+    user_id = rng.randint(1, args.users)
+    kind = rng.choice(["save_memo", "save_and_list_memos", "bulk", "delete"])
+    if kind == "bulk":
+        memos = [{"title": rng.choice(TITLES), "category_id": 1, "time": random_time(rng, args.days)}
+                 for _ in range(rng.randint(1, 5))]
+        response = client.post("/save_memos_bulk", json={"userID": user_id, "memos": memos})
+    elif kind == "delete":
+        day = BASE_DAY + timedelta(days=rng.randrange(args.days))
+        pending = {"start_time": day.strftime("%Y-%m-%d 00:00:00"), "end_time": day.strftime("%Y-%m-%d 23:59:59"),
+                   "keyword": rng.choice([None, "开会", "mom"]), "category": "Delete_Specific"}
+        response = client.post("/memos/delete", json={"userID": user_id, "pending_delete": pending})
+    else:
+        response = client.post(f"/{kind}", json={"userID": user_id, "title": rng.choice(TITLES),
+                                                  "category_id": 1, "time": random_time(rng, args.days)})
+    if response.status_code != 200:
+        sys.exit(f"{kind} failed: {response.status_code} {response.get_json()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    client = app.app.test_client()
+    for _ in range(args.users * args.days):
+        random_write(client, rng, args)
+
+    mismatches, writes, cached_ms, legacy_ms = 0, 0, [], []
+    for _ in range(args.ops):
+        if rng.random() < args.write_ratio:
+            random_write(client, rng, args)
+            writes += 1
+            continue
+        user_id = str(rng.randint(1, args.users))  # /transcribe 的 user_id 来自表单，是字符串
+        day = BASE_DAY + timedelta(days=rng.randrange(args.days), hours=rng.randrange(24))
+        with app.app.app_context():
+            started = time.perf_counter()
+            cached = app.day_tasks(user_id, day)
+            cached_ms.append((time.perf_counter() - started) * 1000)
+        with app.app.app_context():
+            started = time.perf_counter()
+            expected = legacy_day_tasks(user_id, day)
+            legacy_ms.append((time.perf_counter() - started) * 1000)
+        if cached != expected:
+            mismatches += 1
+            print(f"mismatch user={user_id} day={day:%Y-%m-%d}: cached {len(cached)} vs {len(expected)} tasks")
+
+    info = app.day_view_cache.info()
+    print(f"{args.ops} ops ({writes} writes, {len(cached_ms)} queries), hit rate {info['hit_rate']}")
+    print(f"day_tasks (cached) median {statistics.median(cached_ms):.3f} ms, "
+          f"uncached ORM query median {statistics.median(legacy_ms):.3f} ms")
+    print(f"result mismatches: {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""批量删除校验：在临时 SQLite 库上检查 /transcribe 下发的 pending_delete 提交到 /memos/delete 后删到的正是预期的备忘录。
+
+覆盖：
+- Delete_All（“删除所有备忘录”，没有日期）：由 build_transcription_response 生成 pending_delete，必须匹配该用户全部备忘录；
+- 旧版客户端缓存的 Delete_All（关键词是整句话）：同样匹配全部；
+- Delete_Specific 按关键词、按日期删除；
+- 不经过 app 的 sqlite3 连接直接写 memo 表：写入成功，且 /search 和关键词删除都能找到这条备忘录。
+
+分类模型不参与：直接给 TextAnalysis 填入分类结果。
+用法：python benchmarks/check_delete.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_db_path = os.path.join(tempfile.mkdtemp(prefix="check_delete_"), "memo.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+os.environ.setdefault("LOG_LEVEL", "OFF")
+
+import app  # noqa: E402
+
+USER_ID = 1
+MEMOS = [("开会 1", "2026-06-20 09:00"), ("开会 2", "2026-06-20 15:00"), ("去超市买菜", "2026-06-21 10:00"),
+         ("交报告", "2026-06-22 18:00"), ("call mom", "2026-06-23 20:00")]
+
+
+def pending_from_transcribe(text, cats):
+    # 与 /transcribe 相同的后处理，只是分类结果直接给定
+    with app.app.test_request_context():
+        app.analyze(text).__dict__["cats"] = cats
+        payload, _ = app.build_transcription_response(text, USER_ID, observe_language=False)
+    return payload["pending_delete"]
+
+
+def matched(client, pending):
+    response = client.post("/memos/delete", json={"userID": USER_ID, "pending_delete": pending, "dry_run": True})
+    return response.get_json().get("matched")
+
+
+def main():
+    client = app.app.test_client()
+    for title, time in MEMOS:
+        client.post("/save_memo", json={"userID": USER_ID, "title": title, "category_id": 1, "time": time})
+        client.post("/save_memo", json={"userID": USER_ID + 1, "title": title, "category_id": 1, "time": time})
+
+    # 不注册任何自定义函数的普通 sqlite3 连接（命令行、管理脚本、恢复备份）
+    with sqlite3.connect(_db_path) as conn:
+        conn.execute("INSERT INTO memo (text, category, timestamp, updated_at, userID) "
+                     "VALUES ('外部写入的备忘录', '1', '2026-06-24 08:00:00.000000', '2026-06-24 08:00:00.000000', ?)",
+                     (USER_ID,))
+    conn.close()
+    total = len(MEMOS) + 1
+
+    day = {"start_time": "2026-06-20 00:00:00", "end_time": "2026-06-20 23:59:59"}
+    everything = {"start_time": "2000-01-01 00:00:00", "end_time": "2100-12-31 23:59:59"}
+    cases = [
+        ("Delete_All from /transcribe", pending_from_transcribe("删除所有备忘录", {"Delete_All": 0.99}), total),
+        ("Delete_All with legacy keyword", {**everything, "keyword": "删除所有备忘录", "category": "Delete_All"}, total),
+        ("Delete_Specific keyword", {**everything, "keyword": "开会", "category": "Delete_Specific"}, 2),
+        ("Delete_Specific date", {**day, "keyword": None, "category": "Delete_Specific"}, 2),
+        ("keyword on external write", {**everything, "keyword": "外部写入", "category": "Delete_Specific"}, 1),
+    ]
+    failures = 0
+    print(f"{'case':<32} {'expect':>6} {'matched':>8}  result")
+    for name, pending, expect in cases:
+        count = matched(client, pending)
+        ok = count == expect
+        failures += not ok
+        print(f"{name:<32} {expect:>6} {count!s:>8}  {'ok' if ok else 'FAIL'}")
+
+    ok = cases[0][1]["keyword"] is None
+    failures += not ok
+    print(f"{'Delete_All pending has no keyword':<32} {'None':>6} {cases[0][1]['keyword']!s:>8}  {'ok' if ok else 'FAIL'}")
+
+    found = client.get("/search", query_string={"userID": USER_ID, "q": "外部写入"}).get_json()["memos"]
+    ok = [memo["text"] for memo in found] == ["外部写入的备忘录"]
+    failures += not ok
+    print(f"{'search finds external write':<32} {1:>6} {len(found):>8}  {'ok' if ok else 'FAIL'}")
+
+    deleted = client.post("/memos/delete", json={"userID": USER_ID, "pending_delete": cases[0][1]}).get_json()
+    with app.app.app_context():
+        left = {user_id: app.db.session.query(app.Memo).filter_by(userID=user_id).count()
+                for user_id in (USER_ID, USER_ID + 1)}
+    ok = deleted.get("deleted") == total and left == {USER_ID: 0, USER_ID + 1: len(MEMOS)}
+    failures += not ok
+    print(f"{'Delete_All deletes only the user':<32} {total:>6} {deleted.get('deleted')!s:>8}  {'ok' if ok else 'FAIL'}")
+
+    print(f"failures: {failures}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""NumPy 分类引擎与 spaCy 参考实现的一致性校验和速度对比。
+
+对 models/*_text_categorizer_model 分别用两种实现给同一批文本打分，要求每个类别概率的差异不超过
+--tolerance，且最高类别相同；不一致时以非零状态退出。随后比较单条、整批以及命中缓存时的耗时。
+
+用法：python benchmarks/check_textcat_parity.py [--tolerance 1e-4] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='check_textcat_parity_'), 'memo.db')}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+os.environ.setdefault("LOG_LEVEL", "OFF")
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+
+TEXTS = {
+    "zh": [
+        "明天下午3点开会", "删除今天的备忘录", "明天有什么安排", "今天有什么任务", "后天交报告",
+        "6月23号去医院", "删除6月20号的任务", "晚上10点复习英语", "写周报", "全部删除",
+        "下周一开组会", "星期五下午交作业", "买菜", "", "  明天   开会  ",
+    ],
+    "en": [
+        "delete today's memos", "what do I have tomorrow", "remind me to call mom tomorrow",
+        "submit the report on June 23", "delete the memo of 23rd of June", "gym tomorrow at 7pm",
+        "buy groceries next Monday", "read a book", "what do I have today", "clear everything",
+        "Meeting with the team at 3pm", "", "study for the math exam",
+    ],
+}
+
+
+def random_texts(language, n, seed=0):
+    rng = random.Random(seed)
+    if language == "zh":
+        alphabet = "明天今后下午晚上点开会删除任务安排查询学习工作买菜医院报告作业的了我要" + "0123456789"
+        return ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 30))) for _ in range(n)]
+    words = "delete today tomorrow meeting what do I have study work buy the memo at pm report exam gym".split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(1, 12))) for _ in range(n)]
+
+
+def spacy_scores(nlp, texts):
+    labels = list(nlp.get_pipe("textcat_multilabel").labels)
+    return np.array([[doc.cats[label] for label in labels] for doc in nlp.pipe(texts)]).reshape(len(texts), -1)
+
+
+def median_ms(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - started) * 1000)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    failed = False
+    for language in ("zh", "en"):
+        nlp = app.get_nlp(language)
+        engine = app.NumpyTextcat(nlp)
+        texts = [app.normalize_classifier_text(t) for t in TEXTS[language] + random_texts(language, 300)]
+
+        # 整批与逐条分别对比（spaCy 对空文本单独调用时直接给 0，放在批里时会正常打分）
+        expected = spacy_scores(nlp, texts)
+        actual = engine.predict(texts)
+        expected_single = np.vstack([spacy_scores(nlp, [text]) for text in texts])
+        single = np.vstack([engine.predict([text]) for text in texts])
+        diff = max(np.abs(expected - actual).max(), np.abs(expected_single - single).max())
+        argmax_mismatch = int((expected.argmax(axis=1) != actual.argmax(axis=1)).sum())
+        ok = diff <= args.tolerance and argmax_mismatch == 0
+        failed |= not ok
+        print(f"[{language}] {len(texts)} texts  max |Δp| = {diff:.2e}  argmax mismatches = {argmax_mismatch}  "
+              f"{'OK' if ok else 'FAIL'}")
+
+        phrase = TEXTS[language][0]
+        batch = texts[:64]
+        app.classifier_cache._memory.clear()
+        rows = [
+            ("spaCy, 1 text", median_ms(lambda: nlp(phrase).cats, args.repeat)),
+            ("numpy, 1 text", median_ms(lambda: engine([phrase]), args.repeat)),
+            ("spaCy pipe, 64 texts", median_ms(lambda: list(nlp.pipe(batch)), args.repeat // 5 or 1)),
+            ("numpy, 64 texts", median_ms(lambda: engine(batch), args.repeat // 5 or 1)),
+        ]
+        app._models[f"textcat_{language}"] = engine  # 直接复用上面构建好的引擎
+        app.predict_cats(language, [phrase])
+        rows.append(("cached, 1 text", median_ms(lambda: app.predict_cats(language, [phrase]), args.repeat)))
+        for name, ms in rows:
+            print(f"    {name:<22} {ms:>8.3f} ms")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""VAD 回归检查：只有噪声的录音必须被判为无语音（/transcribe 返回 422，不调用 Whisper），
+带语音的录音必须保留语音部分。
+
+噪声：不同电平的白噪声、50 Hz 电源哼声、哼声加白噪声、幅度缓慢起伏的风扇声、数字静音。
+语音：loadtest.py 的合成语音（浊音音节 + 停顿），分别叠加不同电平的白噪声，以及 10 秒噪声中只有 1 秒语音。
+
+用法：python benchmarks/check_vad.py [--seed 0]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='check_vad_'), 'memo.db')}"
+os.environ.setdefault("MODEL_LOADING", "lazy")
+os.environ.setdefault("LOG_LEVEL", "OFF")
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+import loadtest  # noqa: E402
+
+SR = app.SAMPLE_RATE
+SECONDS = 10
+
+
+def white(rng, dbfs, seconds=SECONDS):
+    return rng.normal(0, 10 ** (dbfs / 20), SR * seconds)
+
+
+def cases(rng):
+    t = np.arange(SR * SECONDS) / SR
+    hum = 0.05 * np.sin(2 * np.pi * 50 * t)
+    noise = {
+        "white -45 dBFS": white(rng, -45),
+        "white -35 dBFS": white(rng, -35),
+        "white -25 dBFS": white(rng, -25),
+        "white -15 dBFS": white(rng, -15),
+        "hum 50 Hz": hum,
+        "hum + white -40 dBFS": hum + white(rng, -40),
+        "fan (4 Hz, 30% AM)": white(rng, -30) * (1 + 0.3 * np.sin(2 * np.pi * 4 * t)),
+        "digital silence": np.zeros(SR * SECONDS),
+    }
+    speech = {
+        "speech": loadtest.synth_speech(5, rng),
+        "speech + white -40 dBFS": loadtest.synth_speech(5, rng) + white(rng, -40, 5),
+        "speech + white -30 dBFS": loadtest.synth_speech(5, rng) + white(rng, -30, 5),
+        "1 s speech in 10 s noise": np.concatenate([white(rng, -35, SECONDS - 1),
+                                                    loadtest.synth_speech(1, rng) + white(rng, -35, 1)]),
+    }
+    return noise, speech
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    noise, speech = cases(np.random.default_rng(args.seed))
+    client = app.app.test_client()
+    failures = 0
+    print(f"{'clip':<26} {'expect':<8} {'speech s':>9} {'HTTP':>5}  result")
+    for expect, clips in (("reject", noise), ("keep", speech)):
+        for name, audio in clips.items():
+            audio = audio.astype(np.float32)
+            segments = app.detect_speech(audio)
+            speech_seconds = sum(end - start for start, end in segments) / SR
+            status = ""
+            if expect == "reject":
+                # 被拒绝的录音不会走到 Whisper，无需模型
+                response = client.post("/transcribe", data={
+                    "user_id": "1", "file": (io.BytesIO(loadtest.wav_bytes(audio)), "noise.wav")})
+                status = response.status_code
+                ok = not segments and status == 422
+            else:
+                ok = speech_seconds > 0
+            failures += not ok
+            print(f"{name:<26} {expect:<8} {speech_seconds:>9.2f} {status!s:>5}  {'ok' if ok else 'FAIL'}")
+    print(f"failures: {failures}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""端到端压测：离线起一个完整的服务（gunicorn + 本地 PHP 登录替身 + 预置数据的 SQLite），按并发度逐个接口施压。
+
+准备：
+  - 录音：--clips-dir 指定目录（wav / m4a / mp3 ...，用 ffmpeg 解码）；不指定时合成不同时长的类语音信号
+    （带抖动的基频谐波 + 音节包络 + 停顿，能通过 VAD，但识别出的文字没有意义，只用于衡量解码开销）。
+    每次请求给音频加一点随机抖动，避免命中识别结果缓存。
+  - 数据库：临时目录里的 SQLite，按 --users / --memos-per-user 预置备忘录（写入走 FTS 触发器）。
+  - PHP 登录：本机线程 HTTP 服务，password == "secret" 时成功，每次应答延迟 --php-latency-ms。
+  - 服务：在仓库根目录用 gunicorn 启动（读取 gunicorn.conf.py），--workers 对应 WEB_CONCURRENCY。
+
+每个 (接口, 并发度) 组合先预热，再持续 --duration 秒，记录吞吐、p50/p95/p99 延迟、状态码分布、
+所有 gunicorn 进程在该阶段消耗的 CPU（折算成每请求毫秒）以及各 worker 的 RSS / PSS。
+结果写到 --output（JSON），便于不同提交之间对比。
+
+用法：python benchmarks/loadtest.py [--endpoints classify,save_and_list_memos,login,transcribe]
+          [--concurrency 1,4,16] [--duration 20] [--workers 2] [--clips-dir DIR] [--output loadtest.json]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_RATE = 16000
+CLIP_SECONDS = (2, 5, 10, 20)
+AUDIO_EXTS = {".wav", ".m4a", ".mp3", ".aac", ".ogg", ".webm", ".flac"}
+PHRASES = [
+    "明天下午3点开会", "后天交报告", "今天要去买菜", "删除6月20号的任务", "明天有什么安排", "星期五下午交作业",
+    "remind me to call mom tomorrow", "submit the report on June 23", "delete the memo of 23rd of June",
+    "what do I have today", "read a book",
+]
+
+
+# ---------------- 准备 ----------------
+def synth_speech(seconds, rng):
+    # 音节：0.15~0.35 秒的浊音段，基频 100~250 Hz 带抖动，前 8 个谐波按 1/k 衰减，汉宁窗包络；音节间 0.05~0.4 秒停顿
+    out, total = [], int(seconds * SAMPLE_RATE)
+    while sum(len(x) for x in out) < total:
+        n = int(rng.uniform(0.15, 0.35) * SAMPLE_RATE)
+        f0 = rng.uniform(100, 250) * (1 + 0.03 * np.sin(np.linspace(0, rng.uniform(2, 6), n)))
+        phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+        syllable = sum(np.sin(k * phase) / k for k in range(1, 9)) * np.hanning(n)
+        out.append(0.3 * syllable)
+        out.append(np.zeros(int(rng.uniform(0.05, 0.4) * SAMPLE_RATE)))
+    audio = np.concatenate(out)[:total]
+    return audio + rng.normal(0, 0.002, total)
+
+
+def wav_bytes(audio):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def decode_clip(path):
+    out = subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-i", path, "-f", "s16le", "-ac", "1",
+                          "-ar", str(SAMPLE_RATE), "-"], capture_output=True, check=True).stdout
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768
+
+
+def load_clips(clips_dir, seed):
+    # 真实录音也先解码成 PCM，发送时统一重新编码为 WAV，才能逐次加抖动
+    if clips_dir:
+        return [{"name": os.path.splitext(name)[0] + ".wav", "pcm": decode_clip(os.path.join(clips_dir, name))}
+                for name in sorted(os.listdir(clips_dir)) if os.path.splitext(name)[1].lower() in AUDIO_EXTS]
+    rng = np.random.default_rng(seed)
+    return [{"name": f"synth_{s}s.wav", "pcm": synth_speech(s, rng)} for s in CLIP_SECONDS]
+
+
+def clip_payload(clip, rng):
+    return clip["name"], wav_bytes(clip["pcm"] + rng.normal(0, 1e-4, len(clip["pcm"])))
+
+
+def seed_database(db_path, users, memos_per_user, seed):
+    # 在子进程里导入 app 建表并写入，避免压测进程本身加载 torch / spaCy
+    script = f"""
+import random, sys
+from datetime import datetime, timedelta
+sys.path.insert(0, {ROOT!r})
+import app
+rng = random.Random({seed})
+phrases = {PHRASES!r}
+base = datetime(2025, 1, 1)
+rows = [{{"userID": u, "text": rng.choice(phrases), "category": str(rng.randint(1, 4)),
+          "timestamp": base + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60)), "updated_at": base}}
+        for u in range(1, {users} + 1) for _ in range({memos_per_user})]
+with app.app.app_context(), app.db.engine.begin() as conn:
+    for i in range(0, len(rows), 10000):
+        conn.execute(app.Memo.__table__.insert(), rows[i:i + 10000])
+"""
+    env = dict(os.environ, MODEL_LOADING="lazy", LOG_LEVEL="OFF", DATABASE_URL=f"sqlite:///{db_path}")
+    subprocess.run([sys.executable, "-c", script], env=env, cwd=ROOT, check=True)
+
+
+class PhpStub(BaseHTTPRequestHandler):
+    latency = 0.05
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+        time.sleep(self.latency)
+        ok = form.get("password", [""])[0] == "secret"
+        body = json.dumps({"success": ok} if ok else {"success": False, "message": "Invalid credentials"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_php_stub(latency_ms):
+    PhpStub.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PhpStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/login.php"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(args, db_path, php_url, port):
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(args.workers), PHP_API_URL=php_url,
+               DATABASE_URL=f"sqlite:///{db_path}", MODEL_LOADING=args.model_loading,
+               TRANSCRIBE_JOB_DB=os.path.join(os.path.dirname(db_path), "transcribe_jobs.db"),
+               LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"))
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", *args.gunicorn_args.split(), "app:app"],
+                            cwd=ROOT, env=env)
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"gunicorn exited with {proc.returncode}")
+        try:
+            ready = requests.get(f"http://127.0.0.1:{port}/stats", timeout=2).ok
+            if ready and len(worker_pids(proc.pid)) >= args.workers:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    sys.exit("gunicorn did not become ready in time")
+
+
+# ---------------- 进程统计（Linux /proc） ----------------
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def worker_pids(master_pid):
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+
+def cpu_seconds(pids):
+    total = 0.0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / _CLK_TCK  # utime + stime
+        except OSError:
+            pass
+    return total
+
+
+def memory_mb(pid):
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    usage[key.lower()] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return usage
+
+
+# ---------------- 请求 ----------------
+def make_request(endpoint, base_url, session, rng, args, clips):
+    user_id = rng.randint(1, args.users)
+    if endpoint == "classify":
+        return session.post(f"{base_url}/classify", json={"text": rng.choice(PHRASES)}, timeout=60)
+    if endpoint == "save_and_list_memos":
+        return session.post(f"{base_url}/save_and_list_memos", timeout=60, json={
+            "userID": user_id, "title": rng.choice(PHRASES), "category_id": rng.randint(1, 4),
+            "time": (datetime(2025, 1, 1) + timedelta(days=rng.randrange(730))).strftime("%Y-%m-%d %H:%M")})
+    if endpoint == "login":
+        # 一部分账号反复登录（命中缓存），一部分是新账号或错误密码（走 PHP）
+        return session.post(f"{base_url}/api/login", timeout=60, json={
+            "username": f"user{rng.randint(1, args.login_users)}",
+            "password": "secret" if rng.random() < 0.9 else "wrong"})
+    if endpoint == "memos":
+        return session.get(f"{base_url}/memos", params={"userID": user_id}, timeout=60)
+    if endpoint == "search":
+        return session.get(f"{base_url}/search", params={"userID": user_id, "q": rng.choice(PHRASES)[:4]},
+                           timeout=60)
+    if endpoint == "transcribe":
+        name, data = clip_payload(rng.choice(clips), np.random.default_rng(rng.getrandbits(32)))
+        return session.post(f"{base_url}/transcribe", data={"user_id": str(user_id)},
+                            files={"file": (name, data)}, timeout=600)
+    raise ValueError(endpoint)
+
+
+def run_phase(endpoint, concurrency, base_url, args, clips, master_pid):
+    latencies, statuses, lock = [], {}, threading.Lock()
+
+    def loop(seed, deadline, record):
+        rng = random.Random(seed)
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = make_request(endpoint, base_url, session, rng, args, clips).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if record:
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    def run(seconds, record, seed):
+        deadline = time.perf_counter() + seconds
+        threads = [threading.Thread(target=loop, args=(seed + i, deadline, record)) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    run(args.warmup, False, args.seed)
+    pids = [master_pid, *worker_pids(master_pid)]
+    cpu_before, started = cpu_seconds(pids), time.perf_counter()
+    run(args.duration, True, args.seed + 1000)
+    wall = time.perf_counter() - started
+    cpu = cpu_seconds(pids) - cpu_before
+
+    count = len(latencies)
+    ordered = sorted(latencies)
+    pct = (lambda q: round(ordered[min(count - 1, int(q * count))] * 1000, 2)) if count else (lambda q: None)
+    ok = sum(n for status, n in statuses.items() if status.startswith("2"))
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": count,
+        "ok": ok,
+        "statuses": statuses,
+        "seconds": round(wall, 2),
+        "throughput_rps": round(count / wall, 2),
+        "latency_ms": {"mean": round(statistics.mean(latencies) * 1000, 2) if count else None,
+                       "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99)},
+        "cpu_ms_per_request": round(cpu * 1000 / count, 2) if count else None,
+        "workers_memory_mb": {str(pid): memory_mb(pid) for pid in worker_pids(master_pid)},
+    }
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "app.py"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoints", default="classify,save_and_list_memos,login,transcribe",
+                        help="逗号分隔：classify, save_and_list_memos, login, transcribe, memos, search")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--gunicorn-args", default="", help="额外的 gunicorn 参数，如 \"--timeout 300\"")
+    parser.add_argument("--model-loading", default="eager")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--memos-per-user", type=int, default=1000)
+    parser.add_argument("--login-users", type=int, default=200)
+    parser.add_argument("--php-latency-ms", type=float, default=50)
+    parser.add_argument("--clips-dir")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest.json")
+    args = parser.parse_args()
+
+    endpoints = args.endpoints.split(",")
+    levels = [int(c) for c in args.concurrency.split(",")]
+    clips = load_clips(args.clips_dir, args.seed) if "transcribe" in endpoints else []
+
+    db_dir = tempfile.mkdtemp(prefix="loadtest_")
+    db_path = os.path.join(db_dir, "memo.db")
+    started = time.perf_counter()
+    seed_database(db_path, args.users, args.memos_per_user, args.seed)
+    print(f"seeded {args.users * args.memos_per_user} memos in {time.perf_counter() - started:.1f} s", flush=True)
+
+    php, php_url = start_php_stub(args.php_latency_ms)
+    port = free_port()
+    started = time.perf_counter()
+    server = start_gunicorn(args, db_path, php_url, port)
+    startup_seconds = time.perf_counter() - started
+    base_url = f"http://127.0.0.1:{port}"
+
+    results = []
+    try:
+        print(f"{'endpoint':<20} {'conc':>4} {'req':>6} {'ok':>6} {'rps':>8} "
+              f"{'p50':>8} {'p95':>8} {'p99':>8} {'cpu ms':>8}", flush=True)
+        for endpoint in endpoints:
+            for concurrency in levels:
+                result = run_phase(endpoint, concurrency, base_url, args, clips, server.pid)
+                results.append(result)
+                latency = result["latency_ms"]
+                print(f"{endpoint:<20} {concurrency:>4} {result['requests']:>6} {result['ok']:>6} "
+                      f"{result['throughput_rps']:>8.1f} {latency['p50']!s:>8} {latency['p95']!s:>8} "
+                      f"{latency['p99']!s:>8} {result['cpu_ms_per_request']!s:>8}", flush=True)
+        stats = requests.get(f"{base_url}/stats", timeout=10).json()
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+        php.shutdown()
+
+    report = {
+        "revision": git_revision(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": {k: v for k, v in vars(args).items()},
+        "clips": [c["name"] for c in clips],
+        "startup_seconds": round(startup_seconds, 2),
+        "results": results,
+        "server_stats": stats,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# gunicorn 默认会读取当前目录下的 gunicorn.conf.py
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+# 每个 worker 进程用多个线程接请求：等 PHP 登录、等数据库这类 I/O 只占一个线程，
+# 少量持有模型的进程就能同时服务大量轻请求；CPU 密集阶段在 app.py 中由 CPU_SLOTS 限流
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+# app.py 按同一个 WEB_CONCURRENCY 把 CPU 核数平分给各 worker 作为 Whisper 推理线程数（可用 WHISPER_THREADS 覆盖）
+
+# 在 master 中导入 app（MODEL_LOADING=eager 时即加载全部模型），
+# fork 后各 worker 以写时复制方式共享 Whisper / spaCy 权重
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # 把 master 中已有对象移出 GC 跟踪，避免 worker 的 GC 扫描触碰共享页面导致复制
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app as whisper_app
+
+    # SQLite 连接不能跨进程共享，每个 worker 重新建立
+    with whisper_app.app.app_context():
+        whisper_app.db.engine.dispose()
+
+    # 异步转录进程池在请求线程启动前 fork，子进程里不会残留其他线程持有的锁；未启用异步转录时不创建
+    if whisper_app.TRANSCRIBE_ASYNC:
+        whisper_app.get_transcribe_pool()
+
+    report = whisper_app._startup_report
+    report["pid"] = os.getpid()
+    report["worker_memory_mb_at_fork"] = whisper_app.memory_usage_mb()
+    server.log.info("worker %s memory after fork: %s", worker.pid, report["worker_memory_mb_at_fork"])
+
+
+def when_ready(server):
+    import app as whisper_app
+
+    server.log.info("models loaded in master: %s", whisper_app._startup_report)